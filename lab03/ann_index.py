@@ -0,0 +1,161 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import scipy.sparse as sp
+from user_index import UserSimilarityIndex
+
+
+class LSHUserIndex:
+    """
+    Приближённый поиск похожих пользователей через LSH на случайных гиперплоскостях.
+
+    Пользователи представлены векторами оценок, центрированными по своему среднему. В каждой
+    из n_tables таблиц код пользователя — знаки проекций на n_bits случайных гиперплоскостей.
+    Кандидаты берутся из корзин с кодом запроса (и соседних по расстоянию Хэмминга при
+    probes > 0) и ранжируются точной корреляцией Пирсона из UserSimilarityIndex.
+    Больше таблиц и проб — выше полнота и медленнее запрос, больше бит — меньше кандидатов.
+    """
+
+    def __init__(self, exact: UserSimilarityIndex, n_tables: int = 16, n_bits: int = 10,
+                 probes: int = 1, seed: int = 0) -> None:
+        """
+        Построение индекса.
+
+        :param exact: Точный индекс пользователей для ранжирования кандидатов
+        :param n_tables: Количество хэш-таблиц, defaults to 16
+        :param n_bits: Количество бит в коде (не больше 62), defaults to 10
+        :param probes: Радиус Хэмминга при поиске корзин (0 или 1), defaults to 1
+        :param seed: Зерно генератора гиперплоскостей, defaults to 0
+        """
+        self.exact = exact
+        self.n_tables = n_tables
+        self.n_bits = min(max(1, n_bits), 62)
+        self.probes = probes
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((len(exact.movie_ids), n_tables * self.n_bits)).astype(np.float32)
+        self.codes, self.order = self._build_tables()
+
+    @property
+    def params(self) -> Dict:
+        """
+        Параметры индекса для проверки сохранённой копии.
+        """
+        return {"n_tables": self.n_tables, "n_bits": self.n_bits, "n_users": len(self.exact.user_ids),
+                "n_movies": len(self.exact.movie_ids)}
+
+    def _centered(self) -> sp.csr_matrix:
+        """
+        Матрица оценок пользователей, центрированных по среднему каждого пользователя.
+        """
+        R = self.exact.R
+        counts = np.diff(R.indptr)
+        means = np.asarray(R.sum(axis=1)).ravel() / np.maximum(counts, 1)
+        centered = R.copy()
+        centered.data = centered.data - np.repeat(means, counts)
+        return centered
+
+    def _hash(self, projections: np.ndarray) -> np.ndarray:
+        """
+        Коды корзин по проекциям на гиперплоскости.
+
+        :param projections: Массив (n, n_tables * n_bits)
+        :return: Массив кодов (n, n_tables)
+        """
+        bits = (projections > 0).reshape(len(projections), self.n_tables, self.n_bits).astype(np.int64)
+        return (bits << np.arange(self.n_bits, dtype=np.int64)).sum(axis=2)
+
+    def _build_tables(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Хэширование всех пользователей и сортировка по кодам в каждой таблице.
+
+        :return: Кортеж (отсортированные коды, порядок строк) размером (n_tables, n_users)
+        """
+        codes = self._hash(np.asarray(self._centered() @ self.planes))
+        order = np.argsort(codes, axis=0, kind='stable').T
+        return np.take_along_axis(codes.T, order, axis=1), order
+
+    def candidates(self, ratings: Dict[int, float]) -> np.ndarray:
+        """
+        Строки точного индекса из корзин запроса.
+
+        :param ratings: Оценки локального пользователя {movie_id: rating}
+        :return: Массив уникальных строк-кандидатов
+        """
+        query = self.exact.query_vector(ratings)
+        rated = query != 0
+        if not rated.any():
+            return np.zeros(0, dtype=np.int64)
+        query[rated] -= query[rated].mean()
+        codes = self._hash((query.astype(np.float32) @ self.planes)[None, :])[0]
+
+        found = []
+        flips = [0] + ([1 << bit for bit in range(self.n_bits)] if self.probes > 0 else [])
+        for table in range(self.n_tables):
+            probe_codes = codes[table] ^ np.array(flips, dtype=np.int64)
+            left = np.searchsorted(self.codes[table], probe_codes, side='left')
+            right = np.searchsorted(self.codes[table], probe_codes, side='right')
+            for start, stop in zip(left, right):
+                found.append(self.order[table, start:stop])
+        return np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.int64)
+
+    def most_similar(self, ratings: Dict[int, float], min_common: int, top_n: int) -> List[Tuple[int, float]]:
+        """
+        Приближённый поиск наиболее похожих пользователей.
+
+        :param ratings: Оценки локального пользователя {movie_id: rating}
+        :param min_common: Минимальное количество общих фильмов
+        :param top_n: Количество пользователей в результате
+        :return: Список кортежей (user_id, similarity) по убыванию сходства
+        """
+        if not ratings:
+            return []
+        rows = self.candidates(ratings)
+        if len(rows) == 0:
+            return []
+        sims = self.exact.similarities(ratings, min_common, rows=rows)
+        return self.exact.rank(sims, rows, top_n)
+
+    def save(self, path: Path, meta: Dict) -> None:
+        """
+        Атомарное сохранение таблиц индекса.
+
+        :param path: Путь к файлу .npz
+        :param meta: Отпечаток датасета и параметры для проверки при загрузке
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp.npz")
+        try:
+            np.savez(tmp_path, planes=self.planes, codes=self.codes, order=self.order,
+                     meta=np.array(json.dumps({**meta, **self.params}, sort_keys=True)))
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    @classmethod
+    def load(cls, path: Path, exact: UserSimilarityIndex, meta: Dict, n_tables: int, n_bits: int,
+             probes: int) -> Optional["LSHUserIndex"]:
+        """
+        Загрузка сохранённого индекса, если он построен по тем же данным и параметрам.
+
+        :param path: Путь к файлу .npz
+        :param exact: Точный индекс пользователей
+        :param meta: Ожидаемый отпечаток датасета
+        :param n_tables: Количество хэш-таблиц
+        :param n_bits: Количество бит в коде
+        :param probes: Радиус Хэмминга при поиске корзин
+        :return: Индекс или None если файла нет или он устарел
+        """
+        path = Path(path)
+        if not path.exists():
+            return None
+        with np.load(path) as stored:
+            index = cls.__new__(cls)
+            index.exact, index.n_tables, index.n_bits, index.probes = exact, n_tables, min(max(1, n_bits), 62), probes
+            if json.loads(str(stored["meta"])) != {**meta, **index.params}:
+                return None
+            index.planes, index.codes, index.order = stored["planes"], stored["codes"], stored["order"]
+        return index
@@ -0,0 +1,186 @@
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+# Формат файла: MAGIC, версия и длина заголовка (uint32 little-endian), JSON-заголовок,
+# затем выровненные по ALIGNMENT байт массивы
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct("<8sII")
+
+
+def _aligned(offset: int) -> int:
+    """
+    Смещение, выровненное вверх до ALIGNMENT байт.
+    """
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _header(specs: Dict[str, Tuple[np.dtype, int]], meta: Dict) -> Tuple[bytes, Dict]:
+    """
+    JSON-заголовок файла и расположение массивов.
+
+    :param specs: Тип и длина массивов по именам
+    :param meta: Параметры и отпечатки данных
+    :return: Кортеж (заголовок, {имя: {"offset", "dtype", "length"}})
+    """
+    layout = {}
+    header = {"meta": meta, "arrays": layout}
+    # Смещения зависят от длины заголовка, поэтому он пересчитывается до совпадения
+    header_bytes = b""
+    while True:
+        offset = _aligned(_PREFIX.size + len(header_bytes))
+        for name, (dtype, length) in specs.items():
+            layout[name] = {"offset": offset, "dtype": np.dtype(dtype).str, "length": int(length)}
+            offset = _aligned(offset + np.dtype(dtype).itemsize * int(length))
+        encoded = json.dumps(header, sort_keys=True).encode("utf-8")
+        if len(encoded) == len(header_bytes):
+            # Смещения в encoded посчитаны для заголовка той же длины
+            return encoded, layout
+        header_bytes = encoded
+
+
+def save_arrays(path: Path, magic: bytes, arrays: Dict[str, np.ndarray], meta: Dict) -> None:
+    """
+    Атомарная запись набора одномерных массивов в бинарный файл.
+
+    Файл сначала пишется во временный файл рядом с целевым и затем заменяет его через
+    os.replace, поэтому процессы, читающие старую версию, продолжают работать с ней.
+
+    :param path: Путь к файлу
+    :param magic: Сигнатура формата (8 байт)
+    :param arrays: Массивы по именам
+    :param meta: Параметры и отпечатки данных для проверки при загрузке
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {name: np.ascontiguousarray(array).ravel() for name, array in arrays.items()}
+
+    header_bytes, layout = _header({name: (array.dtype, array.size) for name, array in arrays.items()}, meta)
+
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp_path.open("wb") as f:
+            f.write(_PREFIX.pack(magic, FORMAT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for name, array in arrays.items():
+                f.write(b"\0" * (layout[name]["offset"] - f.tell()))
+                f.write(array.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def read_header(path: Path, magic: bytes) -> Optional[Dict]:
+    """
+    Чтение заголовка файла.
+
+    :param path: Путь к файлу
+    :param magic: Ожидаемая сигнатура формата
+    :return: Заголовок или None если файл отсутствует или имеет другой формат/версию
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    with path.open("rb") as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            return None
+        file_magic, version, header_len = _PREFIX.unpack(prefix)
+        if file_magic != magic or version != FORMAT_VERSION:
+            return None
+        return json.loads(f.read(header_len).decode("utf-8"))
+
+
+def load_arrays(path: Path, magic: bytes, expected_meta: Dict) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Открытие массивов через mmap без копирования в память процесса.
+
+    :param path: Путь к файлу
+    :param magic: Ожидаемая сигнатура формата
+    :param expected_meta: Ожидаемые параметры и отпечатки данных
+    :return: Массивы (только для чтения) по именам или None если файл отсутствует или устарел
+    """
+    header = read_header(path, magic)
+    if header is None or header.get("meta") != expected_meta:
+        return None
+
+    with Path(path).open("rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        if spec["length"] == 0:
+            arrays[name] = np.zeros(0, dtype=np.dtype(spec["dtype"]))
+            continue
+        arrays[name] = np.frombuffer(buffer, dtype=np.dtype(spec["dtype"]),
+                                     count=spec["length"], offset=spec["offset"])
+    return arrays
+
+
+class ArrayFileWriter:
+    """
+    Запись массивов заранее известной длины по частям в формате save_arrays.
+
+    Части можно писать в любом порядке; файл пишется во временный файл рядом с целевым
+    и заменяет его в commit(), поэтому незаконченная запись не видна читателям.
+    """
+
+    def __init__(self, path: Path, magic: bytes, specs: Dict[str, Tuple[np.dtype, int]], meta: Dict) -> None:
+        """
+        Создание временного файла с заголовком.
+
+        :param path: Путь к файлу
+        :param magic: Сигнатура формата (8 байт)
+        :param specs: Тип и длина массивов по именам
+        :param meta: Параметры и отпечатки данных для проверки при загрузке
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        header_bytes, self.layout = _header(specs, meta)
+        self.tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        self._file = self.tmp_path.open("wb")
+        self._file.write(_PREFIX.pack(magic, FORMAT_VERSION, len(header_bytes)))
+        self._file.write(header_bytes)
+        end = max((spec["offset"] + np.dtype(spec["dtype"]).itemsize * spec["length"]
+                   for spec in self.layout.values()), default=self._file.tell())
+        self._file.truncate(end)
+
+    def write(self, name: str, start: int, values: np.ndarray) -> None:
+        """
+        Запись части массива.
+
+        :param name: Имя массива
+        :param start: Индекс первого записываемого элемента
+        :param values: Значения (приводятся к типу массива)
+        """
+        spec = self.layout[name]
+        dtype = np.dtype(spec["dtype"])
+        values = np.ascontiguousarray(values, dtype=dtype).ravel()
+        if start < 0 or start + values.size > spec["length"]:
+            raise IndexError(f"Запись [{start}, {start + values.size}) вне массива {name} длины {spec['length']}")
+        self._file.seek(spec["offset"] + start * dtype.itemsize)
+        self._file.write(values.tobytes())
+
+    def commit(self) -> None:
+        """
+        Сброс записанного на диск и атомарная замена целевого файла.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        """
+        Отказ от записи с удалением временного файла.
+        """
+        self._file.close()
+        if self.tmp_path.exists():
+            self.tmp_path.unlink()
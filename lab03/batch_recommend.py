@@ -0,0 +1,280 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from array_store import ArrayFileWriter
+from config import get_config
+from data_handler import DataProcessor
+from collab_filtering import CollaborativeFiltering
+from parallel_similarity import resolve_workers
+from progress import ProgressReporter
+
+# Сигнатура бинарного файла рекомендаций, формат описан в array_store
+MAGIC = b"RECLIST\0"
+FORMATS = ("jsonl", "binary")
+
+# Модель, загруженная в процессе-обработчике (при fork — унаследованная от основного процесса)
+_worker_model: Optional[CollaborativeFiltering] = None
+
+UserRecommendations = List[Tuple[int, List[Tuple[int, float]]]]
+
+
+async def load_model(config: Dict) -> CollaborativeFiltering:
+    """
+    Загрузка датасета и матрицы сходств item_cf (из кэша или построением с сохранением в кэш).
+
+    :param config: Конфигурация в формате get_config()
+    :return: Построенная модель
+    """
+    data_processor = DataProcessor()
+    data_processor.config = config
+    await data_processor.load_data()
+    cf_config = config["cf"]
+    model = CollaborativeFiltering(
+        data_processor, min_common_users=cf_config["min_common_users"], top_k=cf_config["top_k"],
+        cache_path=config["cache_path"], similarity_backend=cf_config["similarity_backend"],
+        block_size=cf_config["block_size"], workers=cf_config["workers"],
+        max_neighbors=cf_config["max_neighbors"], candidates_per_item=cf_config["candidates_per_item"],
+        memory_limit_mb=cf_config["memory_limit_mb"], checkpoint_dir=cf_config["checkpoint_dir"],
+        similar_items=cf_config["similar_items"], similar_path=config["similar_path"])
+    await model.warm_up()
+    return model
+
+
+def _init_worker(config: Dict) -> None:
+    """
+    Подготовка процесса-обработчика: без fork модель загружается заново из снимка и кэша.
+
+    :param config: Конфигурация в формате get_config()
+    """
+    global _worker_model
+    if _worker_model is None:
+        _worker_model = asyncio.run(load_model(config))
+
+
+def recommend_users(model: CollaborativeFiltering, positions: np.ndarray, n: int) -> UserRecommendations:
+    """
+    Рекомендации для пользователей датасета по их оценкам.
+
+    :param model: Построенная модель item_cf
+    :param positions: Позиции пользователей (строки матрицы пользователь x фильм)
+    :param n: Количество рекомендаций на пользователя
+    :return: Список кортежей (user_id, [(movie_id, predicted_rating), ...])
+    """
+    dp = model.dp
+    matrix = dp.user_item_matrix
+    results = []
+    for pos in positions.tolist():
+        start, stop = matrix.indptr[pos], matrix.indptr[pos + 1]
+        ratings = dict(zip(dp.movie_ids[matrix.indices[start:stop]].tolist(), matrix.data[start:stop].tolist()))
+        results.append((int(dp.user_ids[pos]), model.recommend(ratings, n)))
+    return results
+
+
+def _recommend_task(positions: np.ndarray, n: int) -> UserRecommendations:
+    """
+    Рекомендации для части пользователей в процессе-обработчике.
+    """
+    return recommend_users(_worker_model, positions, n)
+
+
+def iter_recommendations(model: CollaborativeFiltering, config: Dict, positions: np.ndarray, n: int,
+                         workers: int = 1, chunk_size: int = 256) -> Iterator[UserRecommendations]:
+    """
+    Рекомендации для пользователей частями по chunk_size, последовательно или в пуле процессов.
+
+    Части возвращаются в порядке positions. При fork процессы-обработчики получают уже
+    загруженную модель без копирования: матрица сходств открыта через mmap, остальное
+    разделяется до первой записи.
+
+    :param model: Построенная модель item_cf
+    :param config: Конфигурация для загрузки модели в процессах без fork
+    :param positions: Позиции пользователей
+    :param n: Количество рекомендаций на пользователя
+    :param workers: Количество процессов, defaults to 1
+    :param chunk_size: Количество пользователей в части, defaults to 256
+    :return: Итератор списков (user_id, рекомендации)
+    """
+    global _worker_model
+    chunks = [positions[start:start + chunk_size] for start in range(0, len(positions), max(1, chunk_size))]
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield recommend_users(model, chunk, n)
+        return None
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    _worker_model = model if context.get_start_method() == "fork" else None
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=context,
+                                 initializer=_init_worker, initargs=(config,)) as pool:
+            # Окно задач ограничивает количество готовых, но ещё не записанных частей
+            window = workers * 4
+            futures = [pool.submit(_recommend_task, chunk, n) for chunk in chunks[:window]]
+            for i in range(len(chunks)):
+                if i + window < len(chunks):
+                    futures.append(pool.submit(_recommend_task, chunks[i + window], n))
+                yield futures[i].result()
+                futures[i] = None
+    finally:
+        _worker_model = None
+
+
+class JsonlWriter:
+    """
+    Запись рекомендаций строками JSON: {"user_id": 1, "items": [[movie_id, rating], ...]}.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Открытие временного файла рядом с целевым.
+
+        :param path: Путь к файлу результатов
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+        self._file = self.tmp_path.open("w", encoding="utf-8")
+
+    def write(self, offset: int, results: UserRecommendations) -> None:
+        """
+        Запись рекомендаций части пользователей.
+
+        :param offset: Номер первого пользователя части в выводе (не используется)
+        :param results: Список (user_id, рекомендации)
+        """
+        self._file.write("".join(
+            json.dumps({"user_id": user_id, "items": [[movie_id, round(score, 4)] for movie_id, score in items]},
+                       separators=(",", ":")) + "\n"
+            for user_id, items in results))
+
+    def commit(self) -> None:
+        """
+        Замена целевого файла записанным.
+        """
+        self._file.close()
+        self.tmp_path.replace(self.path)
+
+    def abort(self) -> None:
+        """
+        Отказ от записи с удалением временного файла.
+        """
+        self._file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+class BinaryWriter:
+    """
+    Запись рекомендаций массивами фиксированной ширины (формат array_store, читается через mmap):
+    user_ids (int32), movie_ids и ratings (int32/float32, n на пользователя, -1 и 0 после конца списка).
+    """
+
+    def __init__(self, path: Path, n_users: int, n: int, meta: Dict) -> None:
+        """
+        Создание временного файла с местом под всех пользователей.
+
+        :param path: Путь к файлу результатов
+        :param n_users: Количество пользователей
+        :param n: Количество рекомендаций на пользователя
+        :param meta: Параметры запуска для заголовка файла
+        """
+        self.n = n
+        self._writer = ArrayFileWriter(path, MAGIC, {"user_ids": (np.int32, n_users),
+                                                     "movie_ids": (np.int32, n_users * n),
+                                                     "ratings": (np.float32, n_users * n)}, {**meta, "n": n})
+        self.path = self._writer.path
+
+    def write(self, offset: int, results: UserRecommendations) -> None:
+        """
+        Запись рекомендаций части пользователей.
+
+        :param offset: Номер первого пользователя части в выводе
+        :param results: Список (user_id, рекомендации)
+        """
+        movie_ids = np.full((len(results), self.n), -1, dtype=np.int32)
+        ratings = np.zeros((len(results), self.n), dtype=np.float32)
+        for row, (_, items) in enumerate(results):
+            items = items[:self.n]
+            movie_ids[row, :len(items)] = [movie_id for movie_id, _ in items]
+            ratings[row, :len(items)] = [score for _, score in items]
+        self._writer.write("user_ids", offset, np.array([user_id for user_id, _ in results], dtype=np.int32))
+        self._writer.write("movie_ids", offset * self.n, movie_ids)
+        self._writer.write("ratings", offset * self.n, ratings)
+
+    def commit(self) -> None:
+        """
+        Атомарная замена целевого файла записанным.
+        """
+        self._writer.commit()
+
+    def abort(self) -> None:
+        """
+        Отказ от записи с удалением временного файла.
+        """
+        self._writer.abort()
+
+
+def main() -> None:
+    config = get_config()
+    parser = argparse.ArgumentParser(description="Пакетная генерация рекомендаций item_cf для пользователей датасета")
+    parser.add_argument("--ratings", default=config["dataset_users_path"], help="Путь к u.data")
+    parser.add_argument("--items", default=config["dataset_films_path"], help="Путь к u.item")
+    parser.add_argument("--output", default="data/recommendations.jsonl", help="Путь к файлу результатов")
+    parser.add_argument("--format", choices=FORMATS, default=None,
+                        help="Формат файла (по умолчанию — по расширению: .jsonl или бинарный)")
+    parser.add_argument("--n", type=int, default=config["cf"]["num_recommendations"] * 2,
+                        help="Количество рекомендаций на пользователя")
+    parser.add_argument("--from-user", type=int, default=None, help="Первый user_id (включительно)")
+    parser.add_argument("--to-user", type=int, default=None, help="Последний user_id (включительно)")
+    parser.add_argument("--workers", type=int, default=0, help="Количество процессов (0 — по числу ядер)")
+    parser.add_argument("--chunk", type=int, default=256, help="Пользователей в одной задаче")
+    args = parser.parse_args()
+    config["dataset_users_path"] = args.ratings
+    config["dataset_films_path"] = args.items
+    output_format = args.format or ("jsonl" if args.output.endswith(".jsonl") else "binary")
+
+    started = time.perf_counter()
+    model = asyncio.run(load_model(config))
+    load_time = time.perf_counter() - started
+
+    user_ids = model.dp.user_ids
+    selected = np.ones(len(user_ids), dtype=bool)
+    if args.from_user is not None:
+        selected &= user_ids >= args.from_user
+    if args.to_user is not None:
+        selected &= user_ids <= args.to_user
+    positions = np.flatnonzero(selected)
+    workers = resolve_workers(args.workers)
+    print(f"Данные и матрица сходств загружены за {load_time:.1f} с; пользователей: {len(positions)}, "
+          f"процессов: {workers}, формат: {output_format}")
+
+    if output_format == "jsonl":
+        writer = JsonlWriter(Path(args.output))
+    else:
+        writer = BinaryWriter(Path(args.output), len(positions), args.n,
+                              {"ratings": str(args.ratings), "from_user": args.from_user, "to_user": args.to_user})
+    progress = ProgressReporter(len(positions), "пользователей")
+    written = 0
+    try:
+        for results in iter_recommendations(model, config, positions, args.n, workers, args.chunk):
+            writer.write(written, results)
+            written += len(results)
+            progress.advance(len(results))
+        writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+
+    elapsed = progress.elapsed
+    print(f"Рекомендации для {written} пользователей записаны в {writer.path} "
+          f"({writer.path.stat().st_size / 2 ** 20:.1f} МБ) за {elapsed:.1f} с: "
+          f"{written / elapsed if elapsed > 0 else 0.0:.0f} пользователей/с; всего {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1210 @@
+import argparse
+import asyncio
+import json
+import pickle
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Tuple
+import pandas as pd
+import numpy as np
+from config import get_config
+from data_handler import CSV_ENGINE, DataProcessor
+from collab_filtering import CollaborativeFiltering
+from neighbor_index import NeighborIndex
+from similarity import ItemRatingMatrix, user_pearson_similarity
+from user_index import UserSimilarityIndex
+from ann_index import LSHUserIndex
+from title_index import TitleIndex, tokenize
+from storage import Storage
+from write_behind import WriteBehindStorage
+from recommendation_cache import RecommendationCache
+from matrix_factorization import MatrixFactorization
+from recommenders import PopularityRecommender, UserBasedRecommender
+from evaluation import SPLIT_METHODS, evaluate_recommender, split_ratings
+from rating_stream import RatingStreamIngester
+from checkpointed_similarity import MANIFEST_NAME
+from similarity_store import load_neighbor_index, save_neighbor_index
+
+
+async def _load(ratings_path: str, items_path: str, snapshot_path: str = "") -> DataProcessor:
+    """
+    Загрузка датасета для замеров.
+
+    :param ratings_path: Путь к u.data
+    :param items_path: Путь к u.item
+    :param snapshot_path: Путь к снимку датасета (пустая строка — без снимка), defaults to ""
+    :return: Обработчик данных с загруженным датасетом
+    """
+    dp = DataProcessor()
+    dp.config["dataset_users_path"] = ratings_path
+    dp.config["dataset_films_path"] = items_path
+    dp.config["snapshot_path"] = snapshot_path
+    await dp.load_data()
+    return dp
+
+
+def _timed_build(dp: DataProcessor, backend: str, args: argparse.Namespace) -> Tuple[NeighborIndex, float]:
+    """
+    Построение матрицы сходств с замером времени.
+
+    :param dp: Обработчик данных
+    :param backend: Способ построения матрицы сходства
+    :param args: Аргументы командной строки
+    :return: Кортеж (индекс соседей, время в секундах)
+    """
+    cf = CollaborativeFiltering(dp, min_common_users=args.min_common, top_k=20, cache_path=args.cache,
+                                similarity_backend=backend, block_size=args.block_size,
+                                workers=getattr(args, "workers", 1),
+                                max_neighbors=getattr(args, "max_neighbors", args.default_max_neighbors))
+    started = time.perf_counter()
+    cf.build_item_similarity()
+    return cf.sim, time.perf_counter() - started
+
+
+def _as_dict(index: NeighborIndex) -> Dict[int, Dict[int, float]]:
+    """
+    Преобразование индекса соседей в словарь {movie_id: {movie_id: similarity}}.
+
+    :param index: Индекс соседей
+    :return: Словарь сходств
+    """
+    result = {}
+    for movie_id in index.item_ids.tolist():
+        neighbor_ids, sims = index.neighbors(movie_id)
+        result[movie_id] = dict(zip(neighbor_ids.tolist(), sims.tolist()))
+    return result
+
+
+def bench_similarity(args: argparse.Namespace) -> None:
+    """
+    Сравнение попарного и разреженного построения матрицы сходств.
+
+    Попарный способ слишком медленный для всего каталога, поэтому он запускается на
+    подвыборке из --sample самых популярных фильмов, а время для полного каталога
+    экстраполируется по числу пар.
+    """
+    dp = asyncio.run(_load(args.ratings, args.items))
+    args.max_neighbors = 0
+    full_sim, sparse_full = _timed_build(dp, "sparse", args)
+    n_items = len(full_sim)
+
+    sample_ids = dp.get_top_popular_movies(args.sample)
+    full_df = dp.ratings_df
+    asyncio.run(dp.set_ratings(full_df[full_df['movie_id'].isin(sample_ids)]))
+    sparse_index, sparse_sample = _timed_build(dp, "sparse", args)
+    pairwise_index, pairwise_sample = _timed_build(dp, "pairwise", args)
+    asyncio.run(dp.set_ratings(full_df))
+    sparse_sim, pairwise_sim = _as_dict(sparse_index), _as_dict(pairwise_index)
+
+    mismatched = 0
+    max_diff = 0.0
+    for item_id in set(sparse_sim) | set(pairwise_sim):
+        a = sparse_sim.get(item_id, {})
+        b = pairwise_sim.get(item_id, {})
+        mismatched += len(set(a) ^ set(b))
+        for other in set(a) & set(b):
+            max_diff = max(max_diff, abs(a[other] - b[other]))
+
+    sample_pairs = max(1, len(sample_ids) * (len(sample_ids) - 1) // 2)
+    full_pairs = n_items * (n_items - 1) // 2
+    pairwise_full = pairwise_sample * full_pairs / sample_pairs
+
+    print(f"\nФильмов: {n_items}, оценок: {len(full_df)}")
+    print(f"Подвыборка {len(sample_ids)} фильмов: pairwise {pairwise_sample:.2f} с, sparse {sparse_sample:.3f} с, "
+          f"ускорение x{pairwise_sample / max(sparse_sample, 1e-9):.0f}")
+    print(f"Расхождения пар: {mismatched}, максимальная разница сходства: {max_diff:.2e}")
+    print(f"Весь каталог: sparse {sparse_full:.2f} с, pairwise ~{pairwise_full:.0f} с (оценка), "
+          f"ускорение ~x{pairwise_full / max(sparse_full, 1e-9):.0f}")
+
+
+def bench_workers(args: argparse.Namespace) -> None:
+    """
+    Замер построения разреженным способом при разном количестве процессов.
+    """
+    dp = asyncio.run(_load(args.ratings, args.items))
+    reference = None
+    for workers in args.counts:
+        args.workers = workers
+        sim, elapsed = _timed_build(dp, "sparse", args)
+        if reference is None:
+            reference, base = sim, elapsed
+        same = all(np.array_equal(getattr(sim, name), getattr(reference, name))
+                   for name in ("item_ids", "indptr", "indices", "data"))
+        print(f"Процессов: {workers:3d} — {elapsed:.2f} с, ускорение x{base / max(elapsed, 1e-9):.1f}, "
+              f"совпадает с первым запуском: {same}")
+
+
+def _dict_neighbors(sim: Dict[int, Dict[int, float]], user_ratings: Dict[int, float],
+                    item_id: int, k: int) -> list:
+    """
+    Отбор соседей для предсказания по словарю сходств (прежний способ).
+    """
+    similarities = []
+    for rated_movie_id, user_rating in user_ratings.items():
+        similarity = sim.get(item_id, {}).get(rated_movie_id)
+        if similarity is not None and similarity > 0:
+            similarities.append((rated_movie_id, similarity, user_rating))
+    similarities.sort(key=lambda x: x[1], reverse=True)
+    return similarities[:k]
+
+
+def _index_neighbors(index: NeighborIndex, user_ratings: Dict[int, float], item_id: int, k: int) -> list:
+    """
+    Отбор соседей для предсказания по индексу соседей (как в predict_rating).
+    """
+    similarities = []
+    neighbor_ids, neighbor_sims = index.neighbors(item_id)
+    for rated_movie_id, similarity in zip(neighbor_ids.tolist(), neighbor_sims.tolist()):
+        if similarity <= 0 or len(similarities) >= k:
+            break
+        user_rating = user_ratings.get(rated_movie_id)
+        if user_rating is not None:
+            similarities.append((rated_movie_id, similarity, user_rating))
+    return similarities
+
+
+def _deep_size(sim: Dict[int, Dict[int, float]]) -> int:
+    """
+    Объём памяти словаря сходств по tracemalloc при его копировании.
+    """
+    tracemalloc.start()
+    copy = {item_id: dict(row) for item_id, row in sim.items()}
+    for row in copy.values():
+        for other in row:
+            row[other] = float(row[other]) + 0.0
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del copy
+    return size
+
+
+def bench_neighbors(args: argparse.Namespace) -> None:
+    """
+    Сравнение памяти и скорости доступа: словарь сходств и индекс соседей.
+    """
+    dp = asyncio.run(_load(args.ratings, args.items))
+    args.max_neighbors = 0
+    full_index, _ = _timed_build(dp, "sparse", args)
+    sim = _as_dict(full_index)
+    pairs = sum(len(row) for row in sim.values())
+
+    print(f"\nСловарь сходств: пар {pairs}, память ~{_deep_size(sim) / 2 ** 20:.1f} МБ, "
+          f"pickle {len(pickle.dumps(sim)) / 2 ** 20:.1f} МБ")
+    rng = random.Random(0)
+    users = dp.get_all_users()
+    queries = []
+    for _ in range(args.queries):
+        user_ratings = dp.get_user_ratings(rng.choice(users))
+        queries.append((user_ratings, rng.choice(full_index.item_ids.tolist())))
+
+    started = time.perf_counter()
+    for user_ratings, item_id in queries:
+        _dict_neighbors(sim, user_ratings, item_id, 20)
+    dict_us = (time.perf_counter() - started) / len(queries) * 1e6
+    print(f"  отбор соседей для предсказания: {dict_us:.1f} мкс")
+
+    for max_neighbors in args.sizes:
+        index = full_index if max_neighbors == 0 else NeighborIndex.from_dict(sim, max_neighbors)
+        started = time.perf_counter()
+        for user_ratings, item_id in queries:
+            _index_neighbors(index, user_ratings, item_id, 20)
+        index_us = (time.perf_counter() - started) / len(queries) * 1e6
+        print(f"Индекс соседей (N={max_neighbors or 'все'}): пар {len(index.data)}, "
+              f"память {index.nbytes / 2 ** 20:.1f} МБ, pickle {len(pickle.dumps(index)) / 2 ** 20:.1f} МБ, "
+              f"отбор соседей: {index_us:.1f} мкс")
+
+
+def bench_scoring(args: argparse.Namespace) -> None:
+    """
+    Сравнение поштучного predict_rating и пакетного predict_ratings по точности и времени.
+    """
+    dp = asyncio.run(_load(args.ratings, args.items))
+    cf = CollaborativeFiltering(dp, min_common_users=args.min_common, top_k=20, cache_path=args.cache,
+                                block_size=args.block_size, max_neighbors=args.default_max_neighbors)
+    cf.build_item_similarity()
+    candidates = dp.get_top_popular_movies(1000)
+    rng = random.Random(0)
+    users = rng.sample(dp.get_all_users(), min(args.users, len(dp.get_all_users())))
+
+    scalar_time = batch_time = 0.0
+    max_diff = 0.0
+    mismatched = 0
+    for uid in users:
+        user_ratings = dp.get_user_ratings(uid)
+        started = time.perf_counter()
+        scalar = [cf.predict_rating(user_ratings, item_id) for item_id in candidates]
+        scalar_time += time.perf_counter() - started
+        started = time.perf_counter()
+        batch = cf.predict_ratings(user_ratings, candidates)
+        batch_time += time.perf_counter() - started
+        for expected, actual in zip(scalar, batch.tolist()):
+            if expected is None or np.isnan(actual):
+                mismatched += (expected is None) != bool(np.isnan(actual))
+            else:
+                max_diff = max(max_diff, abs(expected - actual))
+
+    print(f"\nПользователей: {len(users)}, кандидатов: {len(candidates)}")
+    print(f"predict_rating: {scalar_time / len(users) * 1e3:.1f} мс на пользователя")
+    print(f"predict_ratings: {batch_time / len(users) * 1e3:.2f} мс на пользователя, "
+          f"ускорение x{scalar_time / max(batch_time, 1e-9):.0f}")
+    print(f"Расхождения None/NaN: {mismatched}, максимальная разница предсказаний: {max_diff:.2e}")
+
+
+def bench_candidates(args: argparse.Namespace) -> None:
+    """
+    Сравнение кандидатов из топ-1000 популярных и кандидатов из соседей оценённых фильмов.
+    """
+    dp = asyncio.run(_load(args.ratings, args.items))
+    cf = CollaborativeFiltering(dp, min_common_users=args.min_common, top_k=20, cache_path=args.cache,
+                                block_size=args.block_size, max_neighbors=args.default_max_neighbors,
+                                candidates_per_item=args.per_item)
+    cf.build_item_similarity()
+    popular = dp.get_top_popular_movies(1000)
+    popular_set = set(popular)
+    rng = random.Random(0)
+    users = rng.sample(dp.get_all_users(), min(args.users, len(dp.get_all_users())))
+
+    totals = {"popular": [0, 0, 0.0], "neighbors": [0, 0, 0.0]}
+    long_tail = 0
+    for uid in users:
+        user_ratings = dp.get_user_ratings(uid)
+        started = time.perf_counter()
+        candidates = [m for m in popular if m not in user_ratings]
+        scores = cf.predict_ratings(user_ratings, candidates)
+        totals["popular"][2] += time.perf_counter() - started
+        totals["popular"][0] += len(candidates)
+        totals["popular"][1] += int((~np.isnan(scores)).sum())
+
+        started = time.perf_counter()
+        candidates = cf.candidate_items(user_ratings)
+        scores = cf.predict_ratings(user_ratings, candidates)
+        totals["neighbors"][2] += time.perf_counter() - started
+        totals["neighbors"][0] += len(candidates)
+        totals["neighbors"][1] += int((~np.isnan(scores)).sum())
+        long_tail += sum(1 for m in candidates if m not in popular_set)
+
+    print(f"\nПользователей: {len(users)}, кандидатов от фильма: {args.per_item or 'все'}")
+    for name, (count, scored, elapsed) in totals.items():
+        print(f"{name}: кандидатов {count / len(users):.0f}, с предсказанием {scored / max(count, 1):.0%}, "
+              f"{elapsed / len(users) * 1e3:.2f} мс на пользователя")
+    print(f"Кандидатов вне топ-1000 популярных: {long_tail / len(users):.1f} на пользователя")
+
+
+def _sample_profiles(dp: DataProcessor, count: int, size: int) -> list:
+    """
+    Случайные профили локальных пользователей: подвыборки оценок реальных пользователей.
+    """
+    rng = random.Random(0)
+    users = dp.get_all_users()
+    profiles = []
+    for _ in range(count):
+        ratings = dp.get_user_ratings(rng.choice(users))
+        keys = rng.sample(sorted(ratings), min(size, len(ratings)))
+        profiles.append({movie_id: ratings[movie_id] for movie_id in keys})
+    return profiles
+
+
+def bench_users(args: argparse.Namespace) -> None:
+    """
+    Сравнение перебора пользователей с user_pearson_similarity и UserSimilarityIndex.
+    """
+    dp = asyncio.run(_load(args.ratings, args.items))
+    started = time.perf_counter()
+    index = UserSimilarityIndex(dp.user_ids, dp.movie_ids, dp.user_item_matrix)
+    print(f"\nИндекс пользователей построен за {time.perf_counter() - started:.2f} с")
+    profiles = _sample_profiles(dp, args.queries, args.profile_size)
+
+    scan_time = index_time = 0.0
+    same_uid = 0
+    max_diff = 0.0
+    for profile in profiles:
+        started = time.perf_counter()
+        best_uid, best_sim = None, -1.0
+        for uid in dp.get_all_users():
+            sim = user_pearson_similarity(profile, dp.get_user_ratings(uid), min_common=args.min_common)
+            if sim is not None and sim > best_sim:
+                best_uid, best_sim = uid, sim
+        scan_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        top = index.most_similar(profile, args.min_common, 10)
+        index_time += time.perf_counter() - started
+        if top and best_uid is not None:
+            same_uid += top[0][0] == best_uid
+            max_diff = max(max_diff, abs(top[0][1] - best_sim))
+        else:
+            max_diff = max(max_diff, float(bool(top) != (best_uid is not None)))
+
+    print(f"Запросов: {len(profiles)}, оценок в профиле: {args.profile_size}")
+    print(f"Перебор: {scan_time / len(profiles) * 1e3:.1f} мс, индекс (топ-10): "
+          f"{index_time / len(profiles) * 1e3:.2f} мс, ускорение x{scan_time / max(index_time, 1e-9):.0f}")
+    print(f"Совпадение ID лучшего пользователя: {same_uid}/{len(profiles)}, "
+          f"максимальная разница лучшего сходства: {max_diff:.2e}")
+
+
+def bench_ann(args: argparse.Namespace) -> None:
+    """
+    Полнота recall@10 и время запроса LSH-индекса пользователей относительно точного поиска.
+
+    Из-за равных сходств полнота считается по значениям: найденный пользователь засчитывается,
+    если его сходство не ниже десятого сходства точного поиска.
+    """
+    dp = asyncio.run(_load(args.ratings, args.items))
+    exact = UserSimilarityIndex(dp.user_ids, dp.movie_ids, dp.user_item_matrix)
+    profiles = _sample_profiles(dp, args.queries, args.profile_size)
+
+    started = time.perf_counter()
+    truth = [exact.most_similar(profile, args.min_common, 10) for profile in profiles]
+    exact_ms = (time.perf_counter() - started) / len(profiles) * 1e3
+    print(f"\nПользователей: {len(exact)}, запросов: {len(profiles)}, точный поиск: {exact_ms:.2f} мс")
+
+    for n_tables in args.tables:
+        for n_bits in args.bits:
+            for probes in args.probes:
+                started = time.perf_counter()
+                index = LSHUserIndex(exact, n_tables, n_bits, probes)
+                build_s = time.perf_counter() - started
+                hits = total = candidates = 0
+                started = time.perf_counter()
+                results = [index.most_similar(profile, args.min_common, 10) for profile in profiles]
+                query_ms = (time.perf_counter() - started) / len(profiles) * 1e3
+                for profile, expected, found in zip(profiles, truth, results):
+                    candidates += len(index.candidates(profile))
+                    if expected:
+                        threshold = expected[-1][1] - 1e-9
+                        hits += min(len(expected), sum(1 for _, sim in found if sim >= threshold))
+                        total += len(expected)
+                print(f"таблиц {n_tables:2d}, бит {n_bits:2d}, проб {probes}: recall@10 {hits / max(total, 1):.3f}, "
+                      f"{query_ms:.2f} мс (x{exact_ms / max(query_ms, 1e-9):.1f}), "
+                      f"кандидатов {candidates / len(profiles) / len(exact):.1%}, построение {build_s:.2f} с")
+
+
+def _peak_rss_mb() -> float:
+    """
+    Пиковый объём резидентной памяти текущего процесса в МБ.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _memory_mode(args: argparse.Namespace) -> None:
+    """
+    Загрузка датасета одним способом и вывод пиковой памяти процесса.
+    """
+    started = time.perf_counter()
+    if args.mode == "dense":
+        ratings_df = pd.read_csv(args.ratings, sep='\t', names=['user_id', 'movie_id', 'rating', 'timestamp'])
+        table = ratings_df.pivot_table(index='user_id', columns='movie_id', values='rating', aggfunc='mean').fillna(0)
+        size = table.memory_usage(deep=True).sum()
+    else:
+        dp = asyncio.run(_load(args.ratings, args.items))
+        matrix = dp.user_item_matrix
+        size = matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    print(f"{args.mode}\t{time.perf_counter() - started:.2f}\t{size / 2**20:.1f}\t{_peak_rss_mb():.0f}")
+
+
+def bench_memory(args: argparse.Namespace) -> None:
+    """
+    Сравнение пиковой памяти плотной таблицы pivot_table и разреженной матрицы DataProcessor.
+
+    Каждый способ запускается в отдельном процессе, чтобы пик памяти одного не влиял на другой.
+    """
+    if args.mode:
+        return _memory_mode(args)
+    print(f"{'Способ':<8} {'Загрузка, с':>12} {'Матрица, МБ':>12} {'Пик RSS, МБ':>12}")
+    for mode in args.modes:
+        command = [sys.executable, __file__, "--ratings", args.ratings, "--items", args.items,
+                   "memory", "--mode", mode]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"{mode:<8} ошибка: {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode}")
+            continue
+        name, elapsed, size, rss = result.stdout.strip().splitlines()[-1].split("\t")
+        print(f"{name:<8} {elapsed:>12} {size:>12} {rss:>12}")
+
+
+def bench_ingest(args: argparse.Namespace) -> None:
+    """
+    Сравнение разбора u.data прежним парсером, первой загрузки со снимком и загрузки из снимка.
+    """
+    started = time.perf_counter()
+    pd.read_csv(args.ratings, sep='\t', names=['user_id', 'movie_id', 'rating', 'timestamp'],
+                dtype={'user_id': int, 'movie_id': int, 'rating': float, 'timestamp': int}, engine='python')
+    python_parse = time.perf_counter() - started
+
+    snapshot = Path(args.snapshot)
+    if snapshot.exists():
+        snapshot.unlink()
+    started = time.perf_counter()
+    cold = asyncio.run(_load(args.ratings, args.items, args.snapshot))
+    cold_load = time.perf_counter() - started
+
+    started = time.perf_counter()
+    warm = asyncio.run(_load(args.ratings, args.items, args.snapshot))
+    warm_load = time.perf_counter() - started
+
+    same = ((cold.user_item_matrix != warm.user_item_matrix).nnz == 0
+            and np.array_equal(cold.user_ids, warm.user_ids) and np.array_equal(cold.movie_ids, warm.movie_ids)
+            and cold.movie_titles.equals(warm.movie_titles) and np.array_equal(cold.genre_masks, warm.genre_masks)
+            and cold.ratings_df.equals(warm.ratings_df))
+    print(f"Разбор u.data (engine='python'): {python_parse:.2f} с")
+    print(f"Первая загрузка (engine='{CSV_ENGINE}', матрица, запись снимка): {cold_load:.2f} с")
+    print(f"Загрузка из снимка ({snapshot.stat().st_size / 2**20:.1f} МБ): {warm_load * 1000:.0f} мс")
+    print(f"Данные из снимка совпадают с разобранными: {'да' if same else 'нет'}")
+
+
+def bench_genres(args: argparse.Namespace) -> None:
+    """
+    Сравнение фильтра жанров после ранжирования и при отборе кандидатов.
+    """
+    dp = asyncio.run(_load(args.ratings, args.items))
+    cf = CollaborativeFiltering(dp, min_common_users=args.min_common, top_k=20, cache_path=args.cache,
+                                block_size=args.block_size, max_neighbors=args.default_max_neighbors)
+    cf.build_item_similarity()
+    include = dp.genre_mask(args.genre.split(",")) if args.genre else 0
+    exclude = dp.genre_mask(args.exclude.split(",")) if args.exclude else 0
+    profiles = _sample_profiles(dp, args.users, 20)
+
+    post_count = pre_count = 0
+    post_time = pre_time = 0.0
+    for ratings in profiles:
+        started = time.perf_counter()
+        ranked = asyncio.run(cf.generate_recommendations(ratings, args.n))
+        ids = np.array([movie_id for movie_id, _ in ranked], dtype=np.int64)
+        post_count += int(dp.genre_filter(ids, include, exclude).sum())
+        post_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        filtered = asyncio.run(cf.generate_recommendations(ratings, args.n, include, exclude))
+        pre_time += time.perf_counter() - started
+        pre_count += len(filtered)
+        ids = np.array([movie_id for movie_id, _ in filtered], dtype=np.int64)
+        assert dp.genre_filter(ids, include, exclude).all()
+
+    print(f"\nПрофилей: {len(profiles)}, N = {args.n}, genre={args.genre or '-'}, exclude={args.exclude or '-'}")
+    print(f"Фильтр после ранжирования: {post_count / len(profiles):.1f} фильмов, "
+          f"{post_time / len(profiles) * 1e3:.2f} мс на запрос")
+    print(f"Фильтр при отборе кандидатов: {pre_count / len(profiles):.1f} фильмов, "
+          f"{pre_time / len(profiles) * 1e3:.2f} мс на запрос")
+
+
+def _title_queries(titles: list, count: int) -> list:
+    """
+    Запросы к поиску по названиям: слово, начало слова и слово с пропущенной буквой.
+
+    :return: Список кортежей (вид запроса, запрос, позиция искомого названия)
+    """
+    rng = random.Random(0)
+    queries = []
+    while len(queries) < count:
+        pos = rng.randrange(len(titles))
+        words = [w for w in tokenize(titles[pos]) if len(w) >= 5 and not w.isdigit()]
+        if not words:
+            continue
+        word = rng.choice(words)
+        cut = rng.randrange(1, len(word) - 1)
+        kind = ("слово", "начало слова", "опечатка")[len(queries) % 3]
+        query = {"слово": word, "начало слова": word[:4], "опечатка": word[:cut] + word[cut + 1:]}[kind]
+        queries.append((kind, query, pos))
+    return queries
+
+
+def bench_titles(args: argparse.Namespace) -> None:
+    """
+    Замер получения названия по ID и поиска по названиям на всём каталоге.
+    """
+    dp = asyncio.run(_load(args.ratings, args.items))
+    titles_df = dp.movie_titles
+    titles = titles_df['title'].tolist()
+    movie_ids = titles_df['movie_id'].tolist()
+    rng = random.Random(0)
+    lookups = [rng.choice(movie_ids) for _ in range(args.lookups)]
+
+    started = time.perf_counter()
+    for movie_id in lookups:
+        titles_df[titles_df['movie_id'] == movie_id]['title'].iloc[0]
+    scan_time = (time.perf_counter() - started) / len(lookups)
+    started = time.perf_counter()
+    for movie_id in lookups:
+        dp.get_movie_title(movie_id)
+    dict_time = (time.perf_counter() - started) / len(lookups)
+
+    started = time.perf_counter()
+    index = TitleIndex(titles_df['movie_id'].to_numpy(), titles)
+    build_time = time.perf_counter() - started
+
+    print(f"\nНазваний: {len(titles)}")
+    print(f"Название по ID: перебор DataFrame {scan_time * 1e6:.0f} мкс, словарь {dict_time * 1e6:.2f} мкс")
+    print(f"Индекс: построение {build_time * 1e3:.0f} мс, слов {len(index.tokens)}, триграмм {len(index.trigrams)}, "
+          f"списки {index.nbytes / 2**10:.0f} КБ")
+
+    results = {}
+    for kind, query, pos in _title_queries(titles, args.queries):
+        started = time.perf_counter()
+        found = index.search(query, 10)
+        elapsed = time.perf_counter() - started
+        started = time.perf_counter()
+        [title for title in titles if query in title.lower()]
+        scan = time.perf_counter() - started
+        entry = results.setdefault(kind, {"time": [], "scan": [], "hits": 0})
+        entry["time"].append(elapsed)
+        entry["scan"].append(scan)
+        entry["hits"] += movie_ids[pos] in [movie_id for movie_id, _ in found]
+    for kind, entry in results.items():
+        print(f"{kind}: поиск p50 {np.percentile(entry['time'], 50) * 1e6:.0f} мкс, "
+              f"p95 {np.percentile(entry['time'], 95) * 1e6:.0f} мкс, "
+              f"перебор подстрокой {np.mean(entry['scan']) * 1e6:.0f} мкс, "
+              f"искомый фильм в топ-10: {entry['hits'] / len(entry['time']):.0%}")
+
+
+def bench_storage(args: argparse.Namespace) -> None:
+    """
+    Сравнение перезаписи JSON файла на каждую оценку с записью оценок в SQLite (WAL).
+    """
+    rng = random.Random(0)
+    events = [(rng.randrange(args.users), rng.randrange(1, 1683), float(rng.randint(1, 5)))
+              for _ in range(args.events)]
+    with tempfile.TemporaryDirectory() as tmp:
+        data: Dict[str, Dict[str, float]] = {}
+        json_path = Path(tmp) / "storage.json"
+        started = time.perf_counter()
+        for user_id, movie_id, rating in events:
+            data.setdefault(str(user_id), {})[str(movie_id)] = rating
+            with json_path.open("w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        json_time = time.perf_counter() - started
+
+        single = Storage(str(Path(tmp) / "single.sqlite3"))
+        started = time.perf_counter()
+        for user_id, movie_id, rating in events:
+            single.add_rating(user_id, movie_id, rating)
+        single_time = time.perf_counter() - started
+
+        batched = Storage(str(Path(tmp) / "batched.sqlite3"))
+        started = time.perf_counter()
+        for start in range(0, len(events), args.batch):
+            batched.add_ratings(events[start:start + args.batch])
+        batch_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        log_size = single.compact()
+        json_size = json_path.stat().st_size
+        compact_time = time.perf_counter() - started
+        same = all(single.get_user_ratings(u) == batched.get_user_ratings(u) == {int(k): v for k, v in data.get(str(u), {}).items()}
+                   for u in range(args.users))
+        single.close()
+        batched.close()
+
+    print(f"\nСобытий: {len(events)}, пользователей: {args.users}")
+    print(f"JSON (перезапись файла): {len(events) / json_time:.0f} оценок/с, "
+          f"размер файла в конце {json_size / 2**10:.0f} КБ")
+    print(f"SQLite, транзакция на оценку: {len(events) / single_time:.0f} оценок/с")
+    print(f"SQLite, пакеты по {args.batch}: {len(events) / batch_time:.0f} оценок/с")
+    print(f"Перенос журнала ({log_size / 2**10:.0f} КБ): {compact_time * 1e3:.1f} мс")
+    print(f"Итоговые оценки совпадают: {'да' if same else 'нет'}")
+
+
+async def _simulate_raters(store, users: int, events: int) -> list:
+    """
+    Одновременные пользователи, каждый отправляет events оценок подряд.
+
+    :return: Время подтверждения каждой оценки в секундах
+    """
+    latencies = []
+
+    async def rater(user_id: int) -> None:
+        rng = random.Random(user_id)
+        for _ in range(events):
+            started = time.perf_counter()
+            store.add_rating(user_id, rng.randrange(1, 1683), float(rng.randint(1, 5)))
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(rater(user_id) for user_id in range(users)))
+    return latencies
+
+
+def bench_write_behind(args: argparse.Namespace) -> None:
+    """
+    Сравнение синхронной записи оценок в обработчике и отложенной записи с групповой фиксацией.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        direct = Storage(str(Path(tmp) / "direct.sqlite3"))
+        started = time.perf_counter()
+        direct_latencies = asyncio.run(_simulate_raters(direct, args.users, args.events))
+        direct_time = time.perf_counter() - started
+
+        buffered = Storage(str(Path(tmp) / "buffered.sqlite3"))
+
+        async def run_buffered():
+            store = WriteBehindStorage(buffered, flush_interval=args.interval / 1000, max_batch=args.batch)
+            store.start()
+            latencies = await _simulate_raters(store, args.users, args.events)
+            await store.close()
+            return latencies, store.metrics()
+
+        started = time.perf_counter()
+        buffered_latencies, metrics = asyncio.run(run_buffered())
+        buffered_time = time.perf_counter() - started
+        same = all(direct.get_user_ratings(u) == buffered.get_user_ratings(u) for u in range(args.users))
+        direct.close()
+        buffered.close()
+
+    total = args.users * args.events
+    print(f"\nПользователей: {args.users}, оценок: {total}")
+    for name, latencies, elapsed in (("Синхронно", direct_latencies, direct_time),
+                                     ("Отложенно", buffered_latencies, buffered_time)):
+        print(f"{name}: подтверждение p50 {np.percentile(latencies, 50) * 1e6:.0f} мкс, "
+              f"p99 {np.percentile(latencies, 99) * 1e6:.0f} мкс, {total / elapsed:.0f} оценок/с")
+    print(f"Записей (транзакций): {metrics['flushes']}, событий: {metrics['events_flushed']}, "
+          f"макс. очередь: {metrics['max_queue_depth']}, задержка записи p50 {metrics['flush_ms_p50']:.2f} мс, "
+          f"p95 {metrics['flush_ms_p95']:.2f} мс")
+    print(f"Итоговые оценки совпадают: {'да' if same else 'нет'}")
+
+
+def bench_rec_cache(args: argparse.Namespace) -> None:
+    """
+    Сценарий «N=5, затем N=10, затем ещё страница» с кэшем полного списка и без него.
+
+    После каждого сценария пользователь с вероятностью --rate-prob ставит новую оценку,
+    что сбрасывает его записи в кэше.
+    """
+    dp = asyncio.run(_load(args.ratings, args.items))
+    cf = CollaborativeFiltering(dp, min_common_users=args.min_common, top_k=20, cache_path=args.cache,
+                                block_size=args.block_size, max_neighbors=args.default_max_neighbors)
+    cf.build_item_similarity()
+    users = UserSimilarityIndex(dp.user_ids, dp.movie_ids, dp.user_item_matrix)
+    profiles = _sample_profiles(dp, args.users, 20)
+    requests = [(5, 0), (10, 0), (5, 10)]
+
+    async def uncached(ratings, n, offset):
+        ranked = await cf.generate_recommendations(ratings, offset + n)
+        users.most_similar(ratings, args.min_common, 3)
+        return ranked[offset:offset + n]
+
+    cache = RecommendationCache(args.size, ttl=0)
+    versions: Dict[int, int] = {}
+
+    async def cached(user_id, ratings, n, offset):
+        value = cache.get((user_id,), versions.get(user_id, 0))
+        if value is None:
+            value = (await cf.generate_recommendations(ratings, None), users.most_similar(ratings, args.min_common, 3))
+            cache.put((user_id,), versions.get(user_id, 0), value)
+        return value[0][offset:offset + n]
+
+    async def run():
+        rng = random.Random(0)
+        plain_time = cached_time = 0.0
+        mismatched = 0
+        for _ in range(args.rounds):
+            for user_id, ratings in enumerate(profiles):
+                for n, offset in requests:
+                    started = time.perf_counter()
+                    expected = await uncached(ratings, n, offset)
+                    plain_time += time.perf_counter() - started
+                    started = time.perf_counter()
+                    actual = await cached(user_id, ratings, n, offset)
+                    cached_time += time.perf_counter() - started
+                    mismatched += expected != actual
+                if rng.random() < args.rate_prob:
+                    movie_id = rng.choice(dp.movie_ids.tolist())
+                    ratings[movie_id] = float(rng.randint(1, 5))
+                    versions[user_id] = versions.get(user_id, 0) + 1
+                    cache.invalidate_user(user_id)
+        return plain_time, cached_time, mismatched
+
+    plain_time, cached_time, mismatched = asyncio.run(run())
+    total = args.rounds * len(profiles) * len(requests)
+    stats = cache.stats()
+    print(f"\nЗапросов: {total}, пользователей: {len(profiles)}, вероятность новой оценки: {args.rate_prob}")
+    print(f"Без кэша: {plain_time / total * 1e3:.2f} мс на запрос")
+    print(f"С кэшем: {cached_time / total * 1e3:.2f} мс на запрос, попаданий {stats['hit_rate']:.0%} "
+          f"({stats['hits']}/{stats['hits'] + stats['misses']}), вытеснений {stats['evictions']}")
+    print(f"Расхождений со списками без кэша: {mismatched}")
+
+
+def bench_incremental(args: argparse.Namespace) -> None:
+    """
+    Инкрементальное обновление матрицы сходств по новым и изменённым оценкам
+    в сравнении с полным перестроением по тем же данным.
+    """
+    dp = asyncio.run(_load(args.ratings, args.items))
+    train_df, new_df = split_ratings(dp.ratings_df, "random", args.events / len(dp.ratings_df), args.seed)
+    asyncio.run(dp.set_ratings(train_df))
+    rng = np.random.default_rng(args.seed)
+    changed = train_df.iloc[rng.choice(len(train_df), int(len(new_df) * args.changed), replace=False)].copy()
+    changed['rating'] = rng.integers(1, 6, len(changed)).astype(changed['rating'].dtype)
+    events = pd.concat([new_df, changed]).sample(frac=1.0, random_state=args.seed).reset_index(drop=True)
+
+    cf = CollaborativeFiltering(dp, min_common_users=args.min_common, top_k=20, cache_path=args.cache,
+                                block_size=args.block_size, max_neighbors=args.default_max_neighbors,
+                                incremental=True)
+    started = time.perf_counter()
+    cf.build_item_similarity()
+    build_time = time.perf_counter() - started
+
+    latencies = []
+    for start in range(0, len(events), args.batch):
+        started = time.perf_counter()
+        cf.update_ratings(events.iloc[start:start + args.batch])
+        latencies.append(time.perf_counter() - started)
+
+    full = CollaborativeFiltering(dp, min_common_users=args.min_common, top_k=20, cache_path=args.cache,
+                                  block_size=args.block_size, max_neighbors=args.default_max_neighbors)
+    started = time.perf_counter()
+    full.build_item_similarity()
+    rebuild_time = time.perf_counter() - started
+
+    updated, rebuilt = cf.sim.compacted(), full.sim
+    same_items = np.array_equal(updated.item_ids, rebuilt.item_ids)
+    mismatched_rows, max_diff = 0, 0.0
+    for pos in range(len(rebuilt)):
+        a = slice(updated.indptr[pos], updated.indptr[pos + 1])
+        b = slice(rebuilt.indptr[pos], rebuilt.indptr[pos + 1])
+        if not np.array_equal(updated.indices[a], rebuilt.indices[b]):
+            mismatched_rows += 1
+        else:
+            max_diff = max(max_diff, float(np.max(np.abs(updated.data[a] - rebuilt.data[b]), initial=0.0)))
+
+    stats = cf._incremental.stats
+    print(f"\nОценок в обучении: {len(train_df)}, новых: {len(new_df)}, изменённых: {len(changed)}, "
+          f"пакеты по {args.batch}")
+    print(f"Построение со статистиками пар: {build_time:.2f} с, пар фильмов: {len(stats)}, "
+          f"{stats.nbytes / 2 ** 20:.0f} МБ")
+    print(f"Обновление: {np.sum(latencies) / len(events) * 1e3:.2f} мс на оценку, "
+          f"пакет p50 {np.percentile(latencies, 50) * 1e3:.1f} мс, p99 {np.percentile(latencies, 99) * 1e3:.1f} мс")
+    print(f"Полное перестроение: {rebuild_time:.2f} с")
+    print(f"Фильмы совпадают: {'да' if same_items else 'нет'}, строк с другими соседями: {mismatched_rows} "
+          f"из {len(rebuilt)}, макс. разница сходства: {max_diff:.2e}")
+
+
+def _ratings_by_id(dp: DataProcessor) -> Dict[Tuple[int, int], float]:
+    """
+    Оценки обработчика данных в виде словаря {(user_id, movie_id): rating}.
+    """
+    matrix = dp.user_item_matrix.tocoo()
+    return dict(zip(zip(dp.user_ids[matrix.row].tolist(), dp.movie_ids[matrix.col].tolist()), matrix.data.tolist()))
+
+
+def bench_stream(args: argparse.Namespace) -> None:
+    """
+    Дописывание оценок в копию u.data во время работы RatingStreamIngester и сравнение
+    итоговых данных с полной загрузкой получившегося файла.
+    """
+    with open(args.ratings, "rb") as f:
+        lines = [line for line in f.read().splitlines(keepends=True) if line.strip()]
+    timestamps = np.array([int(line.split(b"\t")[3]) for line in lines])
+    lines = [lines[i] for i in np.argsort(timestamps, kind='stable')]
+    n_base = len(lines) - args.events
+
+    async def run(path: Path):
+        path.write_bytes(b"".join(lines[:n_base]))
+        dp = await _load(str(path), args.items)
+        cf = None
+        if args.incremental:
+            cf = CollaborativeFiltering(dp, min_common_users=args.min_common, top_k=20, cache_path=args.cache,
+                                        block_size=args.block_size, max_neighbors=args.default_max_neighbors,
+                                        incremental=True)
+            cf.build_item_similarity()
+
+        async def refresh(old_matrix, batch):
+            await asyncio.get_running_loop().run_in_executor(None, cf.refresh_similarities, old_matrix, batch)
+
+        ingester = RatingStreamIngester(dp, str(path), offset=dp.ratings_offset, poll_interval=args.interval,
+                                        max_batch=args.batch, on_batch=refresh if cf is not None else None)
+        ingester.start()
+        started = time.perf_counter()
+        with path.open("ab") as f:
+            for start in range(n_base, len(lines), args.chunk):
+                chunk = b"".join(lines[start:start + args.chunk])
+                # Последняя строка порции дописывается в два приёма, как при записи с буферизацией
+                f.write(chunk[:-3])
+                f.flush()
+                await asyncio.sleep(0)
+                f.write(chunk[-3:])
+                f.flush()
+                await asyncio.sleep(args.write_interval)
+        while ingester.metrics()["ingested"] < args.events and time.perf_counter() - started < 600:
+            await asyncio.sleep(args.interval)
+        elapsed = time.perf_counter() - started
+        await ingester.close()
+
+        fresh = await _load(str(path), args.items)
+        same = _ratings_by_id(dp) == _ratings_by_id(fresh)
+        same_popular = dp.get_top_popular_movies(100) == fresh.get_top_popular_movies(100)
+        means = fresh.item_stats.means_for(fresh.movie_ids)
+        same_means = np.allclose(dp.item_stats.means_for(fresh.movie_ids), means)
+        return ingester.metrics(), elapsed, same, same_popular, same_means
+
+    with tempfile.TemporaryDirectory() as tmp:
+        metrics, elapsed, same, same_popular, same_means = asyncio.run(run(Path(tmp) / "u.data"))
+
+    print(f"\nОценок в начальном файле: {n_base}, дописано: {args.events} порциями по {args.chunk} "
+          f"каждые {args.write_interval * 1e3:.0f} мс, пакеты до {args.batch}"
+          + (", с обновлением матрицы сходств" if args.incremental else ""))
+    print(f"Принято: {metrics['ingested']} за {elapsed:.2f} с, пакетов {metrics['batches']}, "
+          f"пропущено строк {metrics['bad_lines']}, ошибок {metrics['errors']}")
+    print(f"Применение: {metrics['ratings_per_s']:.0f} оценок/с, задержка от чтения до применения "
+          f"p50 {metrics['delay_ms_p50']:.1f} мс, p95 {metrics['delay_ms_p95']:.1f} мс, "
+          f"не прочитано в конце {metrics['backlog_bytes']} байт")
+    print(f"Совпадает с полной загрузкой: оценки {'да' if same else 'нет'}, "
+          f"средние {'да' if same_means else 'нет'}, топ-100 популярных {'да' if same_popular else 'нет'}")
+
+
+def bench_similar(args: argparse.Namespace) -> None:
+    """
+    Ответ /similar из заранее отобранных списков в сравнении с отбором по полному индексу соседей
+    и с расчётом корреляции Пирсона со всеми фильмами.
+    """
+    dp = asyncio.run(_load(args.ratings, args.items))
+    cf = CollaborativeFiltering(dp, min_common_users=args.min_common, top_k=20, cache_path=args.cache,
+                                block_size=args.block_size, max_neighbors=args.default_max_neighbors,
+                                similar_items=args.limit)
+    cf.build_item_similarity()
+    rng = random.Random(0)
+    movie_ids = [rng.choice(dp.movie_ids.tolist()) for _ in range(args.queries)]
+
+    def from_index(movie_id: int) -> list:
+        neighbor_ids, sims = cf.sim.neighbors(movie_id)
+        positive = sims > 0
+        return list(zip(neighbor_ids[positive][:args.n].tolist(), sims[positive][:args.n].tolist()))
+
+    started = time.perf_counter()
+    answers = [cf.similar_movies(movie_id, args.n) for movie_id in movie_ids]
+    similar_us = (time.perf_counter() - started) / len(movie_ids) * 1e6
+    started = time.perf_counter()
+    expected = [from_index(movie_id) for movie_id in movie_ids]
+    index_us = (time.perf_counter() - started) / len(movie_ids) * 1e6
+
+    matrix = ItemRatingMatrix(dp.movie_ids, dp.item_user_matrix())
+    sample = movie_ids[:args.pearson_queries]
+    started = time.perf_counter()
+    for movie_id in sample:
+        start = int(dp.movie_positions_for(np.array([movie_id]))[0])
+        matrix.pearson_block(start, start + 1, args.min_common)
+    pearson_ms = (time.perf_counter() - started) / max(len(sample), 1) * 1e3
+
+    print(f"Списки похожих фильмов: до {args.limit} на фильм, {cf.similar.nbytes / 2 ** 20:.2f} МБ "
+          f"(полный индекс соседей {cf.sim.nbytes / 2 ** 20:.2f} МБ)")
+    print(f"/similar N={args.n}: списки {similar_us:.1f} мкс, отбор по индексу соседей {index_us:.1f} мкс, "
+          f"Пирсон со всеми фильмами {pearson_ms:.1f} мс")
+    print(f"Совпадает с отбором по индексу: {'да' if answers == expected else 'нет'}")
+
+
+def _checkpoint_mode(args: argparse.Namespace) -> None:
+    """
+    Построение матрицы сходств одним способом с записью индекса в args.output и выводом
+    времени построения и пиковой памяти процесса до и после построения.
+    """
+    dp = asyncio.run(_load(args.ratings, args.items))
+    loaded_rss = _peak_rss_mb()
+    cf = CollaborativeFiltering(dp, min_common_users=args.min_common, top_k=20, cache_path=args.cache,
+                                similarity_backend=args.mode, block_size=args.block_size, workers=args.workers,
+                                max_neighbors=args.default_max_neighbors, memory_limit_mb=args.memory_limit,
+                                checkpoint_dir=args.dir)
+    started = time.perf_counter()
+    cf.build_item_similarity()
+    elapsed = time.perf_counter() - started
+    save_neighbor_index(Path(args.output), cf.sim, {})
+    print(f"{elapsed:.2f}\t{loaded_rss:.0f}\t{_peak_rss_mb():.0f}")
+
+
+def bench_checkpoint(args: argparse.Namespace) -> None:
+    """
+    Построение out_of_core с прерыванием и продолжением в сравнении с построением в памяти.
+
+    Каждое построение идёт в отдельном процессе. Процесс out_of_core убивается (SIGKILL), как только
+    в манифесте записано args.interrupt от числа блоков, и построение запускается заново с тем же
+    каталогом. Итоговые индексы сравниваются с индексом способа "sparse".
+    """
+    if args.mode:
+        return _checkpoint_mode(args)
+
+    def command(mode: str, directory: Path, output: Path) -> list:
+        return [sys.executable, __file__, "--ratings", args.ratings, "--items", args.items,
+                "--min-common", str(args.min_common), "--block-size", str(args.block_size),
+                "checkpoint", "--mode", mode, "--dir", str(directory), "--output", str(output),
+                "--workers", str(args.workers), "--memory-limit", str(args.memory_limit)]
+
+    def run(mode: str, directory: Path, output: Path) -> Tuple[float, float, float]:
+        result = subprocess.run(command(mode, directory, output), capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode)
+        elapsed, loaded, peak = result.stdout.strip().splitlines()[-1].split("\t")
+        return float(elapsed), float(loaded), float(peak)
+
+    def completed_blocks(directory: Path) -> int:
+        try:
+            with open(directory / MANIFEST_NAME, encoding="utf-8") as f:
+                return len(json.load(f)["blocks"])
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        results = {"sparse": run("sparse", tmp / "unused", tmp / "sparse.bin"),
+                   "out_of_core": run("out_of_core", tmp / "fresh", tmp / "fresh.bin")}
+        n_blocks = len(list((tmp / "fresh").glob("block_*.bin")))
+
+        # Прерывание: процесс убивается после записи части блоков
+        process = subprocess.Popen(command("out_of_core", tmp / "resumed", tmp / "resumed.bin"),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        target = max(1, int(n_blocks * args.interrupt))
+        while process.poll() is None and completed_blocks(tmp / "resumed") < target:
+            time.sleep(0.01)
+        process.kill()
+        process.wait()
+        done_before = completed_blocks(tmp / "resumed")
+        results["после прерывания"] = run("out_of_core", tmp / "resumed", tmp / "resumed.bin")
+
+        reference = load_neighbor_index(tmp / "sparse.bin", {})
+        same = {}
+        for name in ("fresh", "resumed"):
+            index = load_neighbor_index(tmp / f"{name}.bin", {})
+            same[name] = all(np.array_equal(getattr(reference, array), getattr(index, array))
+                             for array in ("item_ids", "indptr", "indices", "data"))
+
+    print(f"\nБлоков out_of_core: {n_blocks}, ограничение памяти {args.memory_limit:.0f} МБ, "
+          f"процессов {args.workers}; прервано после {done_before} блоков")
+    print(f"{'Способ':<17} {'Построение, с':>14} {'RSS после загрузки, МБ':>23} {'Пик RSS, МБ':>12}")
+    for name, (elapsed, loaded, peak) in results.items():
+        print(f"{name:<17} {elapsed:>14.2f} {loaded:>23.0f} {peak:>12.0f}")
+    print(f"Совпадает с sparse: out_of_core {'да' if same['fresh'] else 'нет'}, "
+          f"после прерывания {'да' if same['resumed'] else 'нет'}")
+
+
+# Модели, которые умеет оценивать команда evaluate (названия как у стратегий бота)
+EVALUATED_MODELS = ["item_cf", "user_cf", "mf", "popular"]
+
+
+def _evaluate_split(args: argparse.Namespace) -> None:
+    """
+    Оценка одной модели на одном разбиении и вывод результата одной строкой JSON.
+    """
+    async def run():
+        dp = await _load(args.ratings, args.items)
+        train_df, test_df = split_ratings(dp.ratings_df, args.split, args.test_fraction, args.seed)
+        await dp.set_ratings(train_df)
+        started = time.perf_counter()
+        if args.model == "mf":
+            model = MatrixFactorization(dp, factors=args.factors, iterations=args.iterations, reg=args.reg,
+                                        bias_reg=args.bias_reg, seed=args.seed)
+            model.train()
+        elif args.model == "user_cf":
+            users = UserSimilarityIndex(dp.user_ids, dp.movie_ids, dp.user_item_matrix)
+            model = UserBasedRecommender(dp, users, args.min_common)
+        elif args.model == "popular":
+            model = PopularityRecommender(dp)
+        else:
+            model = CollaborativeFiltering(dp, min_common_users=args.min_common, top_k=args.top_k,
+                                           cache_path=args.cache, block_size=args.block_size,
+                                           max_neighbors=args.default_max_neighbors)
+            model.build_item_similarity()
+        build_time = time.perf_counter() - started
+        result = await evaluate_recommender(model, train_df, test_df, args.k, args.relevant, args.users, args.seed)
+        result.update({"model": args.model, "split": args.split, "train_ratings": len(train_df),
+                       "test_ratings": len(test_df), "build_s": build_time, "peak_rss_mb": _peak_rss_mb()})
+        return result
+
+    print(json.dumps(asyncio.run(run())))
+
+
+def bench_evaluate(args: argparse.Namespace) -> None:
+    """
+    Офлайн-оценка качества и скорости рекомендаций на разбиениях u.data.
+
+    Каждая пара (модель, разбиение) считается в отдельном процессе, чтобы пик памяти был своим
+    для каждой. Результаты сохраняются в JSON для сравнения запусков.
+    """
+    if args.split:
+        return _evaluate_split(args)
+    params = {"test_fraction": args.test_fraction, "seed": args.seed, "k": args.k, "relevant": args.relevant,
+              "users": args.users, "min_common_users": args.min_common, "top_k": args.top_k,
+              "max_neighbors": args.default_max_neighbors, "factors": args.factors,
+              "iterations": args.iterations, "reg": args.reg, "bias_reg": args.bias_reg}
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "ratings": args.ratings, "params": params, "results": []}
+    for split in args.splits:
+        for model in args.models:
+            command = [sys.executable, __file__, "--ratings", args.ratings, "--items", args.items,
+                       "--min-common", str(args.min_common), "--block-size", str(args.block_size),
+                       "evaluate", "--model", model, "--split", split, "--test-fraction", str(args.test_fraction),
+                       "--seed", str(args.seed), "--k", str(args.k), "--relevant", str(args.relevant),
+                       "--users", str(args.users), "--top-k", str(args.top_k), "--factors", str(args.factors),
+                       "--iterations", str(args.iterations), "--reg", str(args.reg), "--bias-reg", str(args.bias_reg)]
+            result = subprocess.run(command, capture_output=True, text=True)
+            if result.returncode != 0:
+                error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode
+                print(f"{model}/{split}: ошибка: {error}")
+                continue
+            report["results"].append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    k = args.k
+    print(f"\n{'Модель':<7} {'Разбиение':<10} {'RMSE':>6} {'MAE':>6} {'Покрытие':>9} {f'P@{k}':>6} {f'R@{k}':>6} "
+          f"{f'NDCG@{k}':>8} {'Сборка, с':>10} {'Пик RSS, МБ':>12} {'p50/p95/p99, мс':>20}")
+    for r in report["results"]:
+        latency = r["latency"]
+        print(f"{r['model']:<7} {r['split']:<10} {r['rmse']:>6.3f} {r['mae']:>6.3f} {r['coverage']:>9.0%} {r[f'precision@{k}']:>6.3f} "
+              f"{r[f'recall@{k}']:>6.3f} {r[f'ndcg@{k}']:>8.3f} {r['build_s']:>10.2f} {r['peak_rss_mb']:>12.0f} "
+              f"{latency['p50_ms']:>6.1f}/{latency['p95_ms']:.1f}/{latency['p99_ms']:.1f}")
+
+    if args.output:
+        output = Path(args.output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with output.open("w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты записаны в {output}")
+
+
+def main() -> None:
+    config = get_config()
+    parser = argparse.ArgumentParser(description="Замеры производительности рекомендательной системы")
+    parser.add_argument("--ratings", default=config["dataset_users_path"], help="Путь к u.data")
+    parser.add_argument("--items", default=config["dataset_films_path"], help="Путь к u.item")
+    parser.add_argument("--min-common", type=int, default=config["cf"]["min_common_users"])
+    parser.add_argument("--block-size", type=int, default=config["cf"]["block_size"])
+    parser.add_argument("--cache", default="/dev/null", help="Путь к кэшу (в замерах не используется)")
+    parser.set_defaults(default_max_neighbors=config["cf"]["max_neighbors"])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_sim = sub.add_parser("similarity", help="Попарное и разреженное построение матрицы сходств")
+    p_sim.add_argument("--sample", type=int, default=150, help="Количество фильмов для попарного способа")
+    p_sim.set_defaults(func=bench_similarity)
+
+    p_workers = sub.add_parser("workers", help="Параллельное построение матрицы сходств")
+    p_workers.add_argument("--counts", type=int, nargs="+", default=[1, 2, 4, 8], help="Количество процессов")
+    p_workers.set_defaults(func=bench_workers)
+
+    p_neighbors = sub.add_parser("neighbors", help="Память и скорость доступа к соседям")
+    p_neighbors.add_argument("--queries", type=int, default=5000, help="Количество запросов")
+    p_neighbors.add_argument("--sizes", type=int, nargs="+", default=[0, 200, 50], help="Значения N (0 — все)")
+    p_neighbors.set_defaults(func=bench_neighbors)
+
+    p_scoring = sub.add_parser("scoring", help="Поштучное и пакетное предсказание рейтингов")
+    p_scoring.add_argument("--users", type=int, default=100, help="Количество пользователей")
+    p_scoring.set_defaults(func=bench_scoring)
+
+    p_candidates = sub.add_parser("candidates", help="Отбор кандидатов для рекомендаций")
+    p_candidates.add_argument("--users", type=int, default=100, help="Количество пользователей")
+    p_candidates.add_argument("--per-item", type=int, default=config["cf"]["candidates_per_item"])
+    p_candidates.set_defaults(func=bench_candidates)
+
+    p_users = sub.add_parser("users", help="Поиск похожих реальных пользователей")
+    p_users.add_argument("--queries", type=int, default=20, help="Количество запросов")
+    p_users.add_argument("--profile-size", type=int, default=20, help="Количество оценок в профиле")
+    p_users.set_defaults(func=bench_users)
+
+    p_ann = sub.add_parser("ann", help="Приближённый поиск похожих пользователей (LSH)")
+    p_ann.add_argument("--queries", type=int, default=50, help="Количество запросов")
+    p_ann.add_argument("--profile-size", type=int, default=20, help="Количество оценок в профиле")
+    p_ann.add_argument("--tables", type=int, nargs="+", default=[4, 8, 16])
+    p_ann.add_argument("--bits", type=int, nargs="+", default=[8, 12])
+    p_ann.add_argument("--probes", type=int, nargs="+", default=[0, 1])
+    p_ann.set_defaults(func=bench_ann)
+
+    p_memory = sub.add_parser("memory", help="Пиковая память таблицы пользователь x фильм")
+    p_memory.add_argument("--modes", nargs="+", default=["dense", "sparse"], choices=["dense", "sparse"])
+    p_memory.add_argument("--mode", choices=["dense", "sparse"], help=argparse.SUPPRESS)
+    p_memory.set_defaults(func=bench_memory)
+
+    p_ingest = sub.add_parser("ingest", help="Разбор датасета и загрузка из снимка")
+    p_ingest.add_argument("--snapshot", default="/tmp/dataset_snapshot.bin", help="Путь к снимку для замера")
+    p_ingest.set_defaults(func=bench_ingest)
+
+    p_genres = sub.add_parser("genres", help="Рекомендации с фильтром жанров")
+    p_genres.add_argument("--users", type=int, default=100, help="Количество профилей")
+    p_genres.add_argument("--n", type=int, default=10, help="Количество рекомендаций")
+    p_genres.add_argument("--genre", default="Sci-Fi,Thriller", help="Нужные жанры через запятую")
+    p_genres.add_argument("--exclude", default="Horror", help="Исключаемые жанры через запятую")
+    p_genres.set_defaults(func=bench_genres)
+
+    p_titles = sub.add_parser("titles", help="Название по ID и поиск по названиям")
+    p_titles.add_argument("--lookups", type=int, default=2000, help="Количество запросов названия по ID")
+    p_titles.add_argument("--queries", type=int, default=300, help="Количество поисковых запросов")
+    p_titles.set_defaults(func=bench_titles)
+
+    p_storage = sub.add_parser("storage", help="Запись оценок пользователей")
+    p_storage.add_argument("--events", type=int, default=2000, help="Количество оценок")
+    p_storage.add_argument("--users", type=int, default=200, help="Количество пользователей")
+    p_storage.add_argument("--batch", type=int, default=5, help="Оценок в одной транзакции")
+    p_storage.set_defaults(func=bench_storage)
+
+    p_write_behind = sub.add_parser("write-behind", help="Отложенная запись оценок с групповой фиксацией")
+    p_write_behind.add_argument("--users", type=int, default=50, help="Количество одновременных пользователей")
+    p_write_behind.add_argument("--events", type=int, default=40, help="Оценок от каждого пользователя")
+    p_write_behind.add_argument("--interval", type=float, default=config["storage_flush_interval_ms"],
+                                help="Максимальная задержка записи, мс")
+    p_write_behind.add_argument("--batch", type=int, default=config["storage_flush_batch"])
+    p_write_behind.set_defaults(func=bench_write_behind)
+
+    p_rec_cache = sub.add_parser("rec-cache", help="Кэш ранжированных списков рекомендаций")
+    p_rec_cache.add_argument("--users", type=int, default=50, help="Количество пользователей")
+    p_rec_cache.add_argument("--rounds", type=int, default=3, help="Повторов сценария для каждого пользователя")
+    p_rec_cache.add_argument("--rate-prob", type=float, default=0.3, help="Вероятность новой оценки после сценария")
+    p_rec_cache.add_argument("--size", type=int, default=config["rec_cache_size"], help="Размер кэша")
+    p_rec_cache.set_defaults(func=bench_rec_cache)
+
+    p_incremental = sub.add_parser("incremental", help="Обновление матрицы сходств по новым оценкам")
+    p_incremental.add_argument("--events", type=int, default=2000, help="Количество новых оценок")
+    p_incremental.add_argument("--changed", type=float, default=0.25,
+                               help="Доля изменённых оценок относительно новых")
+    p_incremental.add_argument("--batch", type=int, default=1, help="Оценок в одном обновлении")
+    p_incremental.add_argument("--seed", type=int, default=42, help="Зерно выбора оценок")
+    p_incremental.set_defaults(func=bench_incremental)
+
+    p_stream = sub.add_parser("stream", help="Подгрузка оценок, дописываемых в u.data")
+    p_stream.add_argument("--events", type=int, default=5000, help="Количество дописываемых оценок")
+    p_stream.add_argument("--chunk", type=int, default=100, help="Оценок в одной дописываемой порции")
+    p_stream.add_argument("--write-interval", type=float, default=0.01, help="Пауза между порциями, с")
+    p_stream.add_argument("--interval", type=float, default=0.05, help="Интервал проверки файла, с")
+    p_stream.add_argument("--batch", type=int, default=config["ingest_batch"], help="Оценок в пакете")
+    p_stream.add_argument("--incremental", action="store_true", help="Обновлять матрицу сходств item_cf")
+    p_stream.set_defaults(func=bench_stream)
+
+    p_similar = sub.add_parser("similar", help="Ответ /similar из списков похожих фильмов")
+    p_similar.add_argument("--queries", type=int, default=5000, help="Количество запросов")
+    p_similar.add_argument("--n", type=int, default=10, help="Количество похожих фильмов в ответе")
+    p_similar.add_argument("--limit", type=int, default=config["cf"]["similar_items"], help="Длина списков")
+    p_similar.add_argument("--pearson-queries", type=int, default=50, help="Запросов с расчётом Пирсона")
+    p_similar.set_defaults(func=bench_similar)
+
+    p_checkpoint = sub.add_parser("checkpoint", help="Построение out_of_core с прерыванием и продолжением")
+    p_checkpoint.add_argument("--memory-limit", type=float, default=config["cf"]["memory_limit_mb"],
+                              help="Ограничение памяти на блоки, МБ")
+    p_checkpoint.add_argument("--workers", type=int, default=1, help="Количество процессов")
+    p_checkpoint.add_argument("--interrupt", type=float, default=0.5, help="Доля блоков до прерывания")
+    p_checkpoint.add_argument("--mode", choices=["sparse", "out_of_core"], help=argparse.SUPPRESS)
+    p_checkpoint.add_argument("--dir", help=argparse.SUPPRESS)
+    p_checkpoint.add_argument("--output", help=argparse.SUPPRESS)
+    p_checkpoint.set_defaults(func=bench_checkpoint)
+
+    p_evaluate = sub.add_parser("evaluate", help="Офлайн-оценка точности и скорости рекомендаций")
+    p_evaluate.add_argument("--splits", nargs="+", default=list(SPLIT_METHODS), choices=SPLIT_METHODS)
+    p_evaluate.add_argument("--split", choices=SPLIT_METHODS, help=argparse.SUPPRESS)
+    p_evaluate.add_argument("--models", nargs="+", default=["item_cf", "mf"], choices=EVALUATED_MODELS,
+                            help="item_cf — item-item Пирсон, user_cf — похожие пользователи, "
+                                 "mf — матричное разложение, popular — популярные фильмы")
+    p_evaluate.add_argument("--model", choices=EVALUATED_MODELS, help=argparse.SUPPRESS)
+    p_evaluate.add_argument("--test-fraction", type=float, default=0.2, help="Доля оценок в тесте")
+    p_evaluate.add_argument("--seed", type=int, default=42, help="Зерно разбиения и выбора пользователей")
+    p_evaluate.add_argument("--k", type=int, default=10, help="Длина списка рекомендаций")
+    p_evaluate.add_argument("--relevant", type=float, default=4.0, help="Минимальная оценка релевантного фильма")
+    p_evaluate.add_argument("--users", type=int, default=500, help="Количество пользователей (0 — все)")
+    p_evaluate.add_argument("--top-k", type=int, default=config["cf"]["top_k"], help="Соседей в предсказании")
+    p_evaluate.add_argument("--factors", type=int, default=config["mf"]["factors"], help="Размерность факторов mf")
+    p_evaluate.add_argument("--iterations", type=int, default=config["mf"]["iterations"], help="Итераций ALS")
+    p_evaluate.add_argument("--reg", type=float, default=config["mf"]["reg"], help="Регуляризация факторов mf")
+    p_evaluate.add_argument("--bias-reg", type=float, default=config["mf"]["bias_reg"], help="Регуляризация смещений mf")
+    p_evaluate.add_argument("--output", default="", help="Путь к JSON-файлу с результатами")
+    p_evaluate.set_defaults(func=bench_evaluate)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
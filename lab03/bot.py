@@ -1,21 +1,55 @@
 import asyncio
+import logging
+import math
 import random
+from pathlib import Path
 from aiogram import Bot, Dispatcher, F
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery, Message
 from aiogram.filters import Command, CommandStart
 from config import get_config
 from data_handler import DataProcessor
 from collab_filtering import CollaborativeFiltering
+from matrix_factorization import MatrixFactorization
+from recommenders import PopularityRecommender, RecommenderRegistry, UserBasedRecommender
 from storage import Storage
-from similarity import user_pearson_similarity
+from write_behind import WriteBehindStorage
+from recommendation_cache import RecommendationCache
+from user_index import UserSimilarityIndex
+from ann_index import LSHUserIndex
+from fingerprint import file_sha256
+from warmup import WarmupTracker
+from rating_stream import RatingStreamIngester
 
 config = get_config()
+logger = logging.getLogger(__name__)
 bot = Bot(token=config["tg_token"])
 dp = Dispatcher()
 
 data_processor = DataProcessor()
-cf_engine: CollaborativeFiltering | None = None
-storage = Storage(config["storage_path"])
+user_index: UserSimilarityIndex | LSHUserIndex | None = None
+# Версия данных (счётчик изменённых оценок), по которым построен индекс пользователей
+user_index_version = 0
+storage = Storage(config["storage_path"], config["legacy_storage_path"],
+                  config["legacy_user_id"] or next(iter(config["admin_ids"]), None))
+# Обработчики пишут оценки через слой отложенной записи, не дожидаясь fsync
+ratings_store = WriteBehindStorage(storage, flush_interval=config["storage_flush_interval_ms"] / 1000,
+                                   max_batch=config["storage_flush_batch"])
+# Полные ранжированные списки рекомендаций по (пользователь, фильтры жанров)
+recommendation_cache = RecommendationCache(config["rec_cache_size"], config["rec_cache_ttl"])
+ratings_store.subscribe(recommendation_cache.invalidate_user)
+# Стратегии рекомендаций; модели загружаются в фоне и заменяются без остановки бота
+recommenders = RecommenderRegistry(config["recommender"], lambda: data_processor.version)
+# Оценки, дописываемые в u.data, подгружаются без перезапуска (место в файле задаётся после загрузки)
+ingester = RatingStreamIngester(data_processor, config["dataset_users_path"],
+                                poll_interval=config["ingest_interval"], max_batch=config["ingest_batch"])
+# Последняя показанная страница рекомендаций: user_id -> {"n", "include", "exclude", "strategy", "offset"}
+recommendation_pages: dict = {}
+
+# Этапы прогрева при запуске: бот принимает сообщения сразу, данные и модели готовятся в фоне
+STAGE_DATA = "Загрузка датасета"
+STAGE_USER_INDEX = "Индекс пользователей"
+STAGE_MODEL = "Модель рекомендаций"
+warmup = WarmupTracker([STAGE_DATA, STAGE_USER_INDEX, STAGE_MODEL], config["warmup_timings_path"])
 
 # Словарь для управления простыми диалоговыми состояниями
 # user_dialog_state[chat_id] = {
@@ -25,53 +59,281 @@ storage = Storage(config["storage_path"])
 user_dialog_state: dict = {}
 
 
-def _local_user_ratings_dict() -> dict:
+async def _compact_storage_periodically(interval: float) -> None:
     """
-    Получение словаря оценок локального пользователя.
+    Фоновый перенос журнала оценок в основной файл базы.
 
-    :return: Словарь {movie_id: rating}
+    :param interval: Интервал между переносами в секундах
     """
-    local = storage.get_local_user()
-    ratings = {}
-    for k, v in local.get("ratings", {}).items():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
         try:
-            ratings[int(k)] = float(v)
-        except Exception:
+            await loop.run_in_executor(None, storage.compact)
+        except Exception as e:
+            print(f"Ошибка сжатия журнала оценок: {e}")
+
+
+def _register_recommenders() -> None:
+    """
+    Регистрация стратегий рекомендаций: фабрики создают новые модели по текущим данным и настройкам.
+    """
+    cf_config, mf_config = config["cf"], config["mf"]
+    recommenders.register("item_cf", lambda: CollaborativeFiltering(
+        data_processor, min_common_users=cf_config["min_common_users"], top_k=cf_config["top_k"],
+        cache_path=config["cache_path"], similarity_backend=cf_config["similarity_backend"],
+        block_size=cf_config["block_size"], workers=cf_config["workers"],
+        max_neighbors=cf_config["max_neighbors"], candidates_per_item=cf_config["candidates_per_item"],
+        incremental=cf_config["incremental"], memory_limit_mb=cf_config["memory_limit_mb"],
+        checkpoint_dir=cf_config["checkpoint_dir"], similar_items=cf_config["similar_items"],
+        similar_path=config["similar_path"]),
+        "похожие фильмы (Пирсон)")
+    recommenders.register("user_cf", lambda: UserBasedRecommender(
+        data_processor, user_index, cf_config["min_common_users"], cf_config["user_neighbors"]),
+        "похожие пользователи")
+    recommenders.register("mf", lambda: MatrixFactorization(
+        data_processor, factors=mf_config["factors"], iterations=mf_config["iterations"], reg=mf_config["reg"],
+        bias_reg=mf_config["bias_reg"], model_path=config["mf_path"]),
+        "матричное разложение (ALS)")
+    recommenders.register("popular", lambda: PopularityRecommender(data_processor), "популярные фильмы", live=True)
+
+
+async def _refresh_similarities(old_matrix, ratings) -> None:
+    """
+    Обновление моделей по подгруженным оценкам: матрица сходств item_cf обновляется на месте,
+    если хранит статистики пар (версия модели растёт, и кэш перестаёт отдавать её прежние списки).
+    Популярные фильмы читаются из данных напрямую. Остальные модели остаются устаревшими, пока
+    изменений не накопится достаточно для перестроения в _refresh_stale_models.
+
+    :param old_matrix: Матрица пользователь x фильм до добавления оценок
+    :param ratings: Добавленные оценки
+    """
+    model = recommenders.get("item_cf")
+    if isinstance(model, CollaborativeFiltering) and model.incremental:
+        await asyncio.get_running_loop().run_in_executor(None, model.refresh_similarities, old_matrix, ratings)
+        recommenders.mark_current("item_cf")
+
+
+async def _refresh_stale_models(interval: float) -> None:
+    """
+    Фоновое перестроение индекса пользователей и моделей, устаревших после подгрузки оценок.
+
+    Перестраивается только то, что не обновляется на месте и после построения чего изменилось
+    не меньше model_refresh_fraction оценок: небольшие пакеты не запускают полных перестроений.
+    Модели перестраиваются через реестр, до готовности запросы обслуживает текущая версия.
+    user_cf перезагружается вслед за индексом пользователей, так как фабрика берёт текущий индекс.
+
+    :param interval: Интервал между проверками в секундах
+    """
+    global user_index, user_index_version
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        if not warmup.ready:
             continue
-    return ratings
+        min_changes = max(1, math.ceil(config["model_refresh_fraction"] * data_processor.user_item_matrix.nnz))
+        try:
+            if data_processor.version - user_index_version >= min_changes:
+                version = data_processor.version
+                matrix = (data_processor.user_ids, data_processor.movie_ids, data_processor.user_item_matrix)
+                user_index = await loop.run_in_executor(None, _build_user_index, *matrix, False)
+                user_index_version = version
+                if recommenders.get("user_cf") is not None:
+                    recommenders.load("user_cf")
+            for name in recommenders.stale(min_changes):
+                recommenders.load(name)
+        except Exception:
+            logger.exception("Ошибка обновления моделей")
 
 
-async def _find_most_similar_real_user(local_ratings: dict) -> tuple[int | None, float]:
+async def _warm_up() -> None:
+    """
+    Фоновый прогрев: загрузка датасета, построение индекса пользователей и модели по умолчанию.
+    """
+    global user_index, user_index_version
+    try:
+        with warmup.stage(STAGE_DATA):
+            await data_processor.load_data()
+        if config["ingest_interval"] > 0:
+            ingester.offset = data_processor.ratings_offset
+            ingester.on_batch = _refresh_similarities
+            ingester.start()
+        with warmup.stage(STAGE_USER_INDEX):
+            version = data_processor.version
+            matrix = (data_processor.user_ids, data_processor.movie_ids, data_processor.user_item_matrix)
+            user_index = await asyncio.get_running_loop().run_in_executor(None, _build_user_index, *matrix)
+            user_index_version = version
+        default = recommenders.default
+        with warmup.stage(STAGE_MODEL, lambda: getattr(recommenders.pending(default), "build_progress", None)):
+            if not await recommenders.load(default):
+                raise RuntimeError(f"не удалось загрузить модель {default}")
+        print(f"Данные загружены, бот готов (прогрев {sum(warmup.timings.values()):.1f} с).")
+    except Exception as e:
+        print(f"Ошибка прогрева: {e}")
+
+
+def _warming_up_text() -> str:
+    """
+    Сообщение о том, что бот ещё прогревается, с оценкой оставшегося времени.
     """
-    Поиск наиболее похожего реального пользователя.
+    if warmup.error is not None:
+        return "Не удалось подготовить данные для рекомендаций. Подробности: /status"
+    eta = warmup.eta()
+    if eta is None:
+        return "Бот ещё загружает данные, попробуйте чуть позже. Подробности: /status"
+    return f"Бот ещё загружает данные, осталось ~{eta:.0f} с. Подробности: /status"
+
+
+async def _find_similar_real_users(local_ratings: dict, top_n: int) -> list[tuple[int, float]]:
+    """
+    Поиск наиболее похожих реальных пользователей.
 
     :param local_ratings: Оценки локального пользователя
-    :return: Кортеж (user_id, similarity) или (None, 0.0)
+    :param top_n: Количество пользователей
+    :return: Список кортежей (user_id, similarity) по убыванию сходства
     """
-    if not local_ratings or data_processor.user_item_table is None:
-        return None, 0.0
-    
+    if not local_ratings or user_index is None:
+        return []
+
     min_common = config["cf"].get("min_common_users")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, user_index.most_similar, local_ratings, min_common, top_n)
+
+
+def _build_user_index(user_ids, movie_ids, matrix,
+                      use_cache: bool = True) -> UserSimilarityIndex | LSHUserIndex:
+    """
+    Построение индекса похожих пользователей: точного или приближённого (LSH).
+
+    Приближённый индекс сохраняется рядом с кэшем матрицы сходства и загружается из него,
+    если датасет и параметры не изменились. Массивы передаются снимком, взятым в цикле событий:
+    подгрузка оценок заменяет их во время построения.
+
+    :param user_ids: ID пользователей по строкам матрицы
+    :param movie_ids: ID фильмов по столбцам матрицы
+    :param matrix: Матрица пользователь x фильм
+    :param use_cache: Загружать и сохранять LSH-индекс в кэш (после подгрузки оценок u.data
+        уже не совпадает с данными в памяти), defaults to True
+    :return: Индекс похожих пользователей
+    """
+    exact = UserSimilarityIndex(user_ids, movie_ids, matrix)
+    cf_config = config["cf"]
+    if cf_config["user_index"] != "lsh":
+        return exact
+
+    lsh_path = Path(config["cache_path"]).with_suffix(".users-lsh.npz")
+    meta = {"ratings_sha256": file_sha256(Path(config["dataset_users_path"]))}
+    params = (cf_config["lsh_tables"], cf_config["lsh_bits"], cf_config["lsh_probes"])
+    if not use_cache:
+        return LSHUserIndex(exact, *params)
+    try:
+        index = LSHUserIndex.load(lsh_path, exact, meta, *params)
+        if index is not None:
+            print("Индекс пользователей загружен из кэша")
+            return index
+    except Exception as e:
+        print(f"Ошибка загрузки индекса пользователей: {e}")
+
+    index = LSHUserIndex(exact, *params)
+    try:
+        index.save(lsh_path, meta)
+    except Exception as e:
+        print(f"Ошибка сохранения индекса пользователей: {e}")
+    return index
+
+
+def _genre_mask(value: str) -> int:
+    """
+    Маска жанров из списка через запятую.
+
+    :param value: Жанры через запятую, например "Sci-Fi,Thriller"
+    :return: Битовая маска жанров
+    :raises ValueError: Если указан неизвестный жанр (в сообщении — список доступных жанров)
+    """
+    try:
+        return data_processor.genre_mask(value.split(","))
+    except ValueError as e:
+        raise ValueError(f"{e}\nДоступные жанры: {', '.join(data_processor.genre_names)}") from e
+
+
+def _parse_recommend_args(args: list[str]) -> tuple[int, int, int, str, bool]:
+    """
+    Разбор аргументов /recommend: количество, фильтры жанров, стратегия и запрос следующей страницы.
 
-    def _sync_search():
-        best_uid = None
-        best_sim = -1.0
+    :param args: Слова команды после /recommend, например ["10", "genre=Sci-Fi,Thriller", "model=mf"]
+    :return: Кортеж (количество, маска нужных жанров, маска исключаемых жанров, стратегия, следующая страница)
+    :raises ValueError: Если указан неизвестный жанр или стратегия
+    """
+    n = config["cf"]["num_recommendations"]
+    include_genres = exclude_genres = 0
+    strategy = recommenders.default
+    more = False
+    for arg in args:
+        key, sep, value = arg.partition("=")
+        if not sep:
+            if arg.lower() == "more":
+                more = True
+                continue
+            try:
+                n = int(arg)
+            except ValueError:
+                pass
+        elif key.lower() in ("genre", "genres"):
+            include_genres |= _genre_mask(value)
+        elif key.lower() in ("exclude", "-genre"):
+            exclude_genres |= _genre_mask(value)
+        elif key.lower() in ("model", "strategy"):
+            if value not in recommenders.names:
+                raise ValueError(f"Неизвестная модель: {value}\nДоступные модели: {', '.join(recommenders.names)}")
+            strategy = value
+    return n, include_genres, exclude_genres, strategy, more
+
+
+def _cache_key(user_id: int, include_genres: int, exclude_genres: int, strategy: str) -> tuple:
+    """
+    Ключ кэша рекомендаций; версия модели в ключе отделяет списки старой модели после замены
+    или обновления на месте. Подгрузка оценок, не изменившая модель стратегии, списки не сбрасывает.
+    """
+    return user_id, include_genres, exclude_genres, strategy, recommenders.version(strategy)
 
-        for uid in data_processor.get_all_users():
-            other_ratings = data_processor.get_user_ratings(uid)
-            sim = user_pearson_similarity(
-                local_ratings, other_ratings, min_common=min_common)
 
-            if sim is not None and sim > best_sim:
-                best_sim = sim
-                best_uid = uid
-                
-        if best_uid is None:
-            return (None, 0.0)
-        return (best_uid, float(best_sim))
+def _cached_recommendations(user_id: int, include_genres: int, exclude_genres: int,
+                            strategy: str) -> tuple[list, list] | None:
+    """
+    Полный ранжированный список рекомендаций и похожие пользователи из кэша.
 
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _sync_search)
+    :param user_id: ID пользователя Telegram
+    :param include_genres: Маска нужных жанров
+    :param exclude_genres: Маска исключаемых жанров
+    :param strategy: Название стратегии рекомендаций
+    :return: Кортеж (рекомендации, похожие пользователи) или None если в кэше нет
+    """
+    key = _cache_key(user_id, include_genres, exclude_genres, strategy)
+    return recommendation_cache.get(key, ratings_store.version(user_id))
+
+
+async def _compute_recommendations(user_id: int, ratings: dict, include_genres: int,
+                                   exclude_genres: int, strategy: str) -> tuple[list, list]:
+    """
+    Расчёт полного ранжированного списка рекомендаций и похожих пользователей с записью в кэш.
+
+    :param user_id: ID пользователя Telegram
+    :param ratings: Оценки пользователя
+    :param include_genres: Маска нужных жанров
+    :param exclude_genres: Маска исключаемых жанров
+    :param strategy: Название стратегии рекомендаций (модель должна быть загружена)
+    :return: Кортеж (рекомендации, похожие пользователи)
+    """
+    version = ratings_store.version(user_id)
+    # Ключ и модель берутся до расчёта: если модель заменят во время расчёта, список останется под старой версией
+    key = _cache_key(user_id, include_genres, exclude_genres, strategy)
+    model = recommenders.get(strategy)
+    ranked = await model.generate_recommendations(ratings, num_recommendations=None,
+                                                  include_genres=include_genres,
+                                                  exclude_genres=exclude_genres)
+    similar_users = await _find_similar_real_users(ratings, config["cf"]["similar_users"])
+    recommendation_cache.put(key, version, (ranked, similar_users))
+    return ranked, similar_users
 
 
 @dp.message(CommandStart())
@@ -81,8 +343,14 @@ async def cmd_start(message: Message) -> None:
         "Вы можете:\n"
         "/rate — добавить/изменить локальную оценку (1-5)\n"
         "/whoami — посмотреть локальные оценки\n"
-        "/recommend [N] — получить рекомендации (по умолчанию N = 5)\n"
+        "/recommend [N] [genre=Sci-Fi,Thriller] [exclude=Horror] — получить рекомендации (по умолчанию N = 5)\n"
+        "/recommend more — следующие рекомендации из того же списка\n"
+        "/recommend model=mf — рекомендации другой моделью (/models — список моделей)\n"
         "/info <movie_id> — посмотреть информацию о фильме\n"
+        "/search <текст> — найти фильм по названию\n"
+        "/similar <movie_id> [N] — фильмы, похожие на заданный\n"
+        "/models — доступные модели рекомендаций\n"
+        "/status — состояние бота и время загрузки\n"
         "/clear — очистить все оценки текущего пользователя\n\n"
     )
     await message.answer(text)
@@ -112,6 +380,10 @@ async def cb_rate_by_id(query: CallbackQuery) -> None:
 @dp.callback_query(F.data == "rate_suggest")
 async def cb_rate_suggest(query: CallbackQuery) -> None:
     chat_id = query.message.chat.id
+    if not warmup.is_done(STAGE_DATA):
+        await query.message.edit_text(_warming_up_text())
+        await query.answer()
+        return None
 
     random_movies = data_processor.get_random_movies(5)
     movies = [(mid, data_processor.get_movie_title(mid))
@@ -143,18 +415,13 @@ async def cb_rate_suggest(query: CallbackQuery) -> None:
 
 @dp.message(Command("whoami"))
 async def cmd_whoami(message: Message) -> None:
-    local = storage.get_local_user()
-    ratings = local.get("ratings", {})
-    lines = ["Локальные рейтинги (movie_id : title -> rating):"]
+    ratings = ratings_store.get_user_ratings(message.from_user.id)
+    lines = ["Ваши рейтинги (movie_id : title -> rating):"]
 
     if not ratings:
         lines.append("(пусто)")
     else:
-        for k, v in ratings.items():
-            try:
-                mid = int(k)
-            except Exception:
-                continue
+        for mid, v in ratings.items():
             title = data_processor.get_movie_title(mid)
             lines.append(f"{mid} : {title} -> {v}")
 
@@ -165,12 +432,23 @@ async def cmd_whoami(message: Message) -> None:
 async def cmd_recommend(message: Message) -> None:
     parts = message.text.strip().split()
     try:
-        n = int(parts[1]) if len(
-            parts) > 1 else config["cf"]["num_recommendations"]
-    except Exception:
-        n = config["cf"]["num_recommendations"]
+        n, include_genres, exclude_genres, strategy, more = _parse_recommend_args(parts[1:])
+    except ValueError as e:
+        await message.answer(str(e))
+        return None
 
-    local_ratings = _local_user_ratings_dict()
+    if not warmup.is_done(STAGE_DATA):
+        await message.answer(_warming_up_text())
+        return None
+
+    user_id = message.from_user.id
+    offset = 0
+    page = recommendation_pages.get(user_id)
+    if more and page is not None:
+        n, include_genres, exclude_genres, strategy, offset = (page["n"], page["include"], page["exclude"],
+                                                               page["strategy"], page["offset"])
+
+    local_ratings = ratings_store.get_user_ratings(user_id)
 
     if not local_ratings:
         popular = data_processor.get_top_popular_movies(5)
@@ -195,21 +473,53 @@ async def cmd_recommend(message: Message) -> None:
         await message.answer(text)
         return None
 
-    await message.answer("Формирую рекомендации... Пожалуйста, подождите.")
-    recommendations = await cf_engine.generate_recommendations(local_ratings, num_recommendations=n)
-
-    best_uid, best_sim = await _find_most_similar_real_user(local_ratings)
+    note = ""
+    if recommenders.get(strategy) is None and strategy != recommenders.default:
+        # Запрошенная модель ещё не загружена: загрузка в фоне, пока отвечает модель по умолчанию
+        if warmup.is_done(STAGE_USER_INDEX):
+            recommenders.load(strategy)
+        note = f"Модель {strategy} загружается, пока — рекомендации модели {recommenders.default}.\n"
+        strategy = recommenders.default
+
+    if recommenders.get(strategy) is None:
+        # Модель ещё не готова: популярные фильмы с теми же фильтрами, без кэширования и страниц
+        popular = data_processor.get_top_popular_movies(n + len(local_ratings), include_genres, exclude_genres)
+        movies = [mid for mid in popular if mid not in local_ratings][:n]
+        lines = [_warming_up_text(), "", "Пока — популярные фильмы:"]
+        for i, mid in enumerate(movies, 1):
+            genres = ", ".join(data_processor.get_movie_genres(mid))
+            lines.append(f"{i}. {data_processor.get_movie_title(mid)} ({mid}) — жанры: {genres}")
+        await message.answer("\n".join(lines))
+        return None
 
-    lines = ["Рекомендации:"]
-    for i, (movie_id, score) in enumerate(recommendations, 1):
+    cached = _cached_recommendations(user_id, include_genres, exclude_genres, strategy)
+    if cached is None:
+        await message.answer("Формирую рекомендации... Пожалуйста, подождите.")
+        cached = await _compute_recommendations(user_id, local_ratings, include_genres, exclude_genres, strategy)
+    ranked, similar_users = cached
+    best_uid, best_sim = similar_users[0] if similar_users else (None, 0.0)
+
+    recommendations = ranked[offset:offset + n]
+    recommendation_pages[user_id] = {"n": n, "include": include_genres, "exclude": exclude_genres,
+                                     "strategy": strategy, "offset": offset + len(recommendations)}
+    if not recommendations:
+        header = "Больше рекомендаций нет." if offset else "Нет фильмов, подходящих под выбранные жанры."
+    else:
+        header = "Рекомендации:" if not offset else f"Рекомендации (продолжение, с {offset + 1}):"
+    lines = [note + header]
+    for i, (movie_id, score) in enumerate(recommendations, offset + 1):
         title = data_processor.get_movie_title(movie_id)
         genres = ", ".join(data_processor.get_movie_genres(movie_id))
-        lines.append(
-            f"{i}. {title} ({movie_id}) — предсказанный рейтинг: {score:.2f} — жанры: {genres}")
+        # Нулевой рейтинг у популярных фильмов, подобранных без предсказания
+        rating = f"предсказанный рейтинг: {score:.2f}" if score > 0 else "популярный фильм"
+        lines.append(f"{i}. {title} ({movie_id}) — {rating} — жанры: {genres}")
 
     if best_uid is not None and best_sim > 0:
         lines.append(
             f"\nПохожесть с реальным пользователем id={best_uid}: {best_sim:.3f}")
+        others = [f"id={uid} ({sim:.3f})" for uid, sim in similar_users[1:] if sim > 0]
+        if others:
+            lines.append("Другие похожие пользователи: " + ", ".join(others))
     else:
         lines.append(
             "\nНет похожих реальных пользователей в датасете (или недостаточно данных).")
@@ -228,28 +538,145 @@ async def cmd_info(message: Message) -> None:
     except ValueError:
         await message.answer("movie_id должен быть целым числом.")
         return None
+    if not warmup.is_done(STAGE_DATA):
+        await message.answer(_warming_up_text())
+        return None
 
     title = data_processor.get_movie_title(mid)
     genres = data_processor.get_movie_genres(mid)
     genres_str = ", ".join(genres) if genres else "неизвестно"
 
-    if data_processor.ratings_df is not None and not data_processor.ratings_df.empty:
-        dfm = data_processor.ratings_df[data_processor.ratings_df['movie_id'] == mid]
-        if not dfm.empty:
-            avg = dfm['rating'].mean()
-            count = len(dfm)
-            stats = f"\nСредний рейтинг: {avg:.2f} (по {count} оценкам)"
-        else:
-            stats = "\nНет данных по рейтингу для этого фильма."
+    movie_stats = data_processor.get_movie_stats(mid)
+    if movie_stats is not None:
+        avg, count, rank = movie_stats
+        stats = f"\nСредний рейтинг: {avg:.2f} (по {count} оценкам)\nМесто по популярности: {rank}"
     else:
-        stats = ""
+        stats = "\nНет данных по рейтингу для этого фильма."
 
     await message.answer(f"{mid}: {title}\nЖанры: {genres_str}{stats}")
 
 
+@dp.message(Command("search"))
+async def cmd_search(message: Message) -> None:
+    parts = message.text.strip().split(maxsplit=1)
+    if len(parts) < 2:
+        await message.answer("Использование: /search <текст>\nПример: \n/search star wars")
+        return None
+    if not warmup.is_done(STAGE_DATA):
+        await message.answer(_warming_up_text())
+        return None
+
+    found = data_processor.search_movies(parts[1], limit=10)
+    if not found:
+        await message.answer("Ничего не найдено.")
+        return None
+    lines = ["Найденные фильмы (movie_id — title):"]
+    lines += [f"{mid} — {title}" for mid, title in found]
+    await message.answer("\n".join(lines))
+
+
+@dp.message(Command("similar"))
+async def cmd_similar(message: Message) -> None:
+    parts = message.text.strip().split()
+    limit = config["cf"]["similar_items"]
+    if len(parts) < 2:
+        await message.answer(f"Использование: /similar <movie_id> [N] (N до {limit}, по умолчанию 10)\n"
+                             f"Пример: \n/similar 50 5")
+        return None
+    try:
+        mid = int(parts[1])
+        n = int(parts[2]) if len(parts) > 2 else 10
+    except ValueError:
+        await message.answer("movie_id и N должны быть целыми числами.")
+        return None
+    if n <= 0:
+        await message.answer("N должно быть положительным числом.")
+        return None
+    if not warmup.is_done(STAGE_DATA):
+        await message.answer(_warming_up_text())
+        return None
+
+    model = recommenders.get("item_cf")
+    if not isinstance(model, CollaborativeFiltering):
+        # Списки похожих фильмов строятся вместе с матрицей сходств item_cf
+        if warmup.is_done(STAGE_USER_INDEX):
+            recommenders.load("item_cf")
+        await message.answer("Похожие фильмы ещё считаются, попробуйте позже. Состояние: /models")
+        return None
+
+    title = data_processor.get_movie_title(mid)
+    similar = model.similar_movies(mid, min(n, limit))
+    if not similar:
+        await message.answer(f"Для фильма {title} ({mid}) нет похожих фильмов.")
+        return None
+    lines = [f"Похожие на {title} ({mid}):"]
+    for i, (movie_id, sim) in enumerate(similar, 1):
+        genres = ", ".join(data_processor.get_movie_genres(movie_id))
+        lines.append(f"{i}. {data_processor.get_movie_title(movie_id)} ({movie_id}) — сходство: {sim:.2f} — "
+                     f"жанры: {genres}")
+    await message.answer("\n".join(lines))
+
+
+@dp.message(Command("status"))
+async def cmd_status(message: Message) -> None:
+    if warmup.ready:
+        lines = [f"Бот готов, прогрев занял {sum(warmup.timings.values()):.1f} с."]
+    elif warmup.error is not None:
+        lines = [f"Ошибка прогрева: {warmup.error}"]
+    else:
+        eta = warmup.eta()
+        lines = ["Бот прогревается" + (f", осталось ~{eta:.0f} с." if eta is not None else ".")]
+    lines += ["", "Этапы прогрева:"] + warmup.status()
+    lines += ["", "Модели рекомендаций:"] + recommenders.status()
+
+    writes = ratings_store.metrics()
+    cache = recommendation_cache.stats()
+    lines += [
+        "",
+        f"Запись оценок: в очереди {writes['queue_depth']}, записей {writes['flushes']} "
+        f"(ошибок {writes['failed_flushes']}), p95 {writes['flush_ms_p95']:.1f} мс",
+        f"Кэш рекомендаций: {cache['size']} списков, попаданий {cache['hit_rate']:.0%} "
+        f"({cache['hits']} из {cache['hits'] + cache['misses']})"
+    ]
+    if config["ingest_interval"] > 0:
+        stream = ingester.metrics()
+        line = (f"Новые оценки из {config['dataset_users_path']}: принято {stream['ingested']} "
+                f"(пакетов {stream['batches']}, пропущено строк {stream['bad_lines']}), "
+                f"не прочитано {stream['backlog_bytes'] / 2 ** 10:.0f} КБ")
+        if stream['batches']:
+            line += (f", {stream['ratings_per_s']:.0f} оценок/с, задержка p95 {stream['delay_ms_p95']:.0f} мс, "
+                     f"отставание от последней оценки {stream['event_lag_s']:.0f} с")
+        lines.append(line)
+    await message.answer("\n".join(lines))
+
+
+@dp.message(Command("models"))
+async def cmd_models(message: Message) -> None:
+    lines = ["Модели рекомендаций (выбор: /recommend model=<название>):"] + recommenders.status()
+    await message.answer("\n".join(lines))
+
+
+@dp.message(Command("reload"))
+async def cmd_reload(message: Message) -> None:
+    if message.from_user.id not in config["admin_ids"]:
+        await message.answer("Команда доступна только администраторам.")
+        return None
+    parts = message.text.strip().split()
+    strategy = parts[1] if len(parts) > 1 else recommenders.default
+    if strategy not in recommenders.names:
+        await message.answer(f"Неизвестная модель: {strategy}\nДоступные модели: {', '.join(recommenders.names)}")
+        return None
+    if not warmup.is_done(STAGE_USER_INDEX):
+        await message.answer(_warming_up_text())
+        return None
+    recommenders.load(strategy)
+    await message.answer(f"Модель {strategy} перестраивается в фоне; до готовности запросы обслуживает "
+                         f"текущая версия. Состояние: /models")
+
+
 @dp.message(Command("clear"))
 async def cmd_clear(message: Message) -> None:
-    storage.clear_local_user()
+    ratings_store.clear_user(message.from_user.id)
     await message.answer("Все ваши оценки очищены!")
 
 
@@ -264,7 +691,7 @@ async def handle_dialog_messages(message: Message) -> None:
         text = message.text.strip()
 
         if state == "awaiting_initial_ratings":
-            added = await _parse_and_save_ratings(text)
+            added = await _parse_and_save_ratings(chat_id, text)
             if added > 0:
                 user_dialog_state.pop(chat_id, None)
                 await message.answer(f"Добавлено оценок: {added}. Теперь можете использовать /recommend для получения персонализированных рекомендаций!")
@@ -280,7 +707,7 @@ async def handle_dialog_messages(message: Message) -> None:
                     mid = int(parts[0])
                     rating = float(parts[1])
                     if 1.0 <= rating <= 5.0:
-                        storage.add_rating(mid, rating)
+                        ratings_store.add_rating(chat_id, mid, rating)
                         title = data_processor.get_movie_title(mid)
                         user_dialog_state.pop(chat_id, None)
                         await message.answer(f"Сохранено: {mid} — {title} -> {rating}")
@@ -290,7 +717,7 @@ async def handle_dialog_messages(message: Message) -> None:
                     await message.answer("Ошибка формата. movie_id должен быть целым, rating — число (например 4.0 или 4.5).")
 
         elif state == "awaiting_batch_rate":
-            added = await _parse_and_save_ratings(text)
+            added = await _parse_and_save_ratings(chat_id, text)
             if added > 0:
                 user_dialog_state.pop(chat_id, None)
                 await message.answer(f"Добавлено оценок: {added}.")
@@ -298,10 +725,11 @@ async def handle_dialog_messages(message: Message) -> None:
                 await message.answer("Не удалось распознать оценки. Используйте формат: movie_id:rating, movie_id:rating, ...")
 
 
-async def _parse_and_save_ratings(text: str) -> int:
+async def _parse_and_save_ratings(user_id: int, text: str) -> int:
     """
-    Парсинг и сохранение оценок из текстового ввода.
+    Парсинг и сохранение оценок из текстового ввода одной транзакцией.
 
+    :param user_id: ID пользователя Telegram
     :param text: Текст с оценками в формате movie_id:rating
     :return: Количество добавленных оценок
     """
@@ -309,7 +737,7 @@ async def _parse_and_save_ratings(text: str) -> int:
     if not pairs:
         return 0
 
-    added = 0
+    ratings = []
     for p in pairs:
         if ':' not in p:
             sub = p.split()
@@ -329,22 +757,31 @@ async def _parse_and_save_ratings(text: str) -> int:
             except Exception:
                 continue
         if 1.0 <= rating <= 5.0:
-            storage.add_rating(mid, rating)
-            added += 1
+            ratings.append((user_id, mid, rating))
 
-    return added
+    return ratings_store.add_ratings(ratings)
 
 
 async def main() -> None:
-    await data_processor.load_data()
-    min_common = config["cf"]["min_common_users"]
-    top_k = config["cf"]["top_k"]
-    cache_path = config["cache_path"]
-    global cf_engine
-    cf_engine = CollaborativeFiltering(
-        data_processor, min_common_users=min_common, top_k=top_k, cache_path=cache_path)
-    print("Данные загружены, бот готов.")
-    await dp.start_polling(bot)
+    _register_recommenders()
+    # Опрос Telegram начинается сразу, до окончания прогрева
+    warming = asyncio.create_task(_warm_up())
+    compaction = asyncio.create_task(_compact_storage_periodically(config["storage_compact_interval"]))
+    refresh = None
+    if config["ingest_interval"] > 0 and config["model_refresh_interval"] > 0:
+        refresh = asyncio.create_task(_refresh_stale_models(config["model_refresh_interval"]))
+    ratings_store.start()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        warming.cancel()
+        compaction.cancel()
+        if refresh is not None:
+            refresh.cancel()
+        await ingester.close()
+        await ratings_store.close()
+        print(f"Запись оценок: {ratings_store.metrics()}")
+        storage.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from array_store import load_arrays, read_header, save_arrays
+from neighbor_index import NeighborIndex
+from parallel_similarity import iter_pearson_blocks
+from progress import ProgressReporter
+from similarity import ItemRatingMatrix, SIMILARITY_THRESHOLD
+
+# Сигнатура файла блока соседей, формат описан в array_store
+BLOCK_MAGIC = b"SIMBLK\0\0"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# Пиковая память на одну пару блока в pearson_block: шесть плотных матриц статистик float64,
+# num, den_i, den_j и sim в pearson_from_stats, два временных массива float64 при их вычислении
+# и три булевых маски (valid, |sim| > порога, keep). Замер tracemalloc на MovieLens 100K —
+# около 98 байт на пару; отобранные пары разрежены и в оценку не входят.
+BYTES_PER_PAIR = (6 + 4 + 2) * np.dtype(np.float64).itemsize + 3 * np.dtype(np.bool_).itemsize
+
+
+def matrix_fingerprint(matrix: ItemRatingMatrix) -> str:
+    """
+    Отпечаток матрицы оценок: SHA-256 позиций и значений оценок.
+
+    :param matrix: Матрица оценок фильм x пользователь
+    :return: Хэш в шестнадцатеричном виде
+    """
+    digest = hashlib.sha256()
+    for name in ("item_ids", "indptr", "indices", "data"):
+        digest.update(np.ascontiguousarray(matrix.arrays[name]).tobytes())
+    return digest.hexdigest()
+
+
+class CheckpointedSimilarityBuild:
+    """
+    Построение индекса соседей по блокам фильмов с ограничением памяти и продолжением после сбоя.
+
+    Размер блока подбирается так, чтобы плотные промежуточные матрицы всех процессов укладывались
+    в memory_limit_mb. Отобранные соседи каждого готового блока сразу записываются на диск в
+    отдельный файл, а список готовых блоков — в манифест. После прерывания построение с теми же
+    данными и параметрами продолжается с первого неготового блока. Итоговый индекс собирается
+    из файлов блоков, которые читаются через mmap по одному.
+    """
+
+    def __init__(self, directory: str, min_common: int, max_neighbors: int, block_size: int = 256,
+                 memory_limit_mb: float = 512, workers: int = 1) -> None:
+        """
+        Инициализация.
+
+        :param directory: Каталог для файлов блоков и манифеста
+        :param min_common: Минимальное количество общих пользователей
+        :param max_neighbors: Максимальное количество соседей на фильм (0 — без ограничения)
+        :param block_size: Максимальное количество фильмов в блоке, defaults to 256
+        :param memory_limit_mb: Ограничение памяти на промежуточные матрицы блоков в МБ
+            (0 — только block_size), defaults to 512
+        :param workers: Количество процессов, defaults to 1
+        """
+        self.directory = Path(directory)
+        self.min_common = min_common
+        self.max_neighbors = max_neighbors
+        self.block_size = max(1, block_size)
+        self.memory_limit_mb = max(0.0, memory_limit_mb)
+        self.workers = max(1, workers)
+
+    @property
+    def manifest_path(self) -> Path:
+        """
+        Путь к манифесту построения.
+        """
+        return self.directory / MANIFEST_NAME
+
+    def block_rows(self, n_items: int) -> int:
+        """
+        Количество фильмов в блоке с учётом ограничения памяти.
+
+        :param n_items: Количество фильмов
+        :return: Размер блока, не меньше 1
+        """
+        if self.memory_limit_mb <= 0 or n_items == 0:
+            return self.block_size
+        per_row = BYTES_PER_PAIR * n_items * self.workers
+        return max(1, min(self.block_size, int(self.memory_limit_mb * 2 ** 20) // per_row))
+
+    def _block_path(self, start: int) -> Path:
+        """
+        Путь к файлу блока, начинающегося со строки start.
+        """
+        return self.directory / f"block_{start:08d}.bin"
+
+    def _load_manifest(self, meta: Dict) -> Dict[int, int]:
+        """
+        Готовые блоки из манифеста, если он записан для тех же данных и параметров.
+
+        :param meta: Параметры построения и отпечаток данных
+        :return: Словарь {start: stop} блоков, файлы которых на месте
+        """
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Ошибка чтения манифеста {self.manifest_path}: {e}")
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("meta") != meta:
+            print("Манифест построен по другим данным или параметрам, построение начинается заново")
+            return {}
+        completed = {}
+        for start, stop in manifest.get("blocks", []):
+            header = read_header(self._block_path(start), BLOCK_MAGIC)
+            if header is not None and header.get("meta") == {"start": start, "stop": stop}:
+                completed[start] = stop
+        return completed
+
+    def _save_manifest(self, meta: Dict, completed: Dict[int, int]) -> None:
+        """
+        Атомарная запись манифеста с готовыми блоками.
+
+        :param meta: Параметры построения и отпечаток данных
+        :param completed: Готовые блоки {start: stop}
+        """
+        manifest = {"version": MANIFEST_VERSION, "meta": meta,
+                    "blocks": [[start, completed[start]] for start in sorted(completed)]}
+        tmp_path = self.manifest_path.with_name(f"{MANIFEST_NAME}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.manifest_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def _reset(self) -> None:
+        """
+        Удаление файлов блоков и манифеста прежнего построения.
+        """
+        for path in self.directory.glob("block_*.bin"):
+            path.unlink()
+        if self.manifest_path.exists():
+            self.manifest_path.unlink()
+
+    def build(self, matrix: ItemRatingMatrix, progress: Optional[ProgressReporter] = None) -> NeighborIndex:
+        """
+        Построение индекса соседей с продолжением с последнего готового блока.
+
+        :param matrix: Матрица оценок фильм x пользователь
+        :param progress: Счётчик прогресса по фильмам, defaults to None
+        :return: Индекс соседей
+        """
+        n = matrix.n_items
+        rows = self.block_rows(n)
+        meta = {
+            "fingerprint": matrix_fingerprint(matrix),
+            "n_items": n,
+            "block_rows": rows,
+            "min_common": self.min_common,
+            "max_neighbors": self.max_neighbors,
+            "threshold": SIMILARITY_THRESHOLD
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        completed = self._load_manifest(meta)
+        if not completed:
+            self._reset()
+        blocks = [(start, min(start + rows, n)) for start in range(0, n, rows)]
+        remaining = [(start, stop) for start, stop in blocks if completed.get(start) != stop]
+        if len(remaining) < len(blocks):
+            print(f"Продолжаю построение: готово блоков {len(blocks) - len(remaining)} из {len(blocks)}")
+            if progress is not None:
+                progress.advance(n - sum(stop - start for start, stop in remaining))
+
+        if remaining:
+            for start, stop, (block_rows, cols, vals) in iter_pearson_blocks(
+                    matrix, self.min_common, rows, self.workers, self.max_neighbors, remaining):
+                save_arrays(self._block_path(start), BLOCK_MAGIC,
+                            {"rows": block_rows.astype(np.int32), "cols": cols.astype(np.int32),
+                             "vals": vals.astype(np.float64)},
+                            {"start": start, "stop": stop})
+                completed[start] = stop
+                self._save_manifest(meta, completed)
+                if progress is not None:
+                    progress.advance(stop - start)
+        return self._assemble(matrix.item_ids, blocks)
+
+    def _assemble(self, item_ids: np.ndarray, blocks: List[Tuple[int, int]]) -> NeighborIndex:
+        """
+        Сборка индекса из файлов блоков без одновременной загрузки всех блоков в память.
+
+        :param item_ids: ID фильмов по позициям
+        :param blocks: Блоки (start, stop) по возрастанию start
+        :return: Индекс соседей
+        """
+        lengths = [read_header(self._block_path(start), BLOCK_MAGIC)["arrays"]["rows"]["length"]
+                   for start, _ in blocks]
+        indices = np.empty(sum(lengths), dtype=np.int32)
+        data = np.empty(sum(lengths), dtype=np.float32)
+        counts = np.zeros(len(item_ids), dtype=np.int64)
+        offset = 0
+        for (start, stop), length in zip(blocks, lengths):
+            arrays = load_arrays(self._block_path(start), BLOCK_MAGIC, {"start": start, "stop": stop})
+            if arrays is None:
+                raise RuntimeError(f"Файл блока {self._block_path(start)} повреждён")
+            # Строки блока уже упорядочены по убыванию сходства и обрезаны до max_neighbors
+            counts[start:stop] = np.bincount(arrays["rows"] - start, minlength=stop - start)
+            indices[offset:offset + length] = arrays["cols"]
+            data[offset:offset + length] = arrays["vals"]
+            offset += length
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        return NeighborIndex(item_ids, indptr, indices, data)
+
+    def cleanup(self) -> None:
+        """
+        Удаление файлов блоков и манифеста после сохранения итогового индекса.
+        """
+        if not self.directory.exists():
+            return None
+        self._reset()
+        if not any(self.directory.iterdir()):
+            self.directory.rmdir()
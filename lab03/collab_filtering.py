@@ -1,33 +1,111 @@
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Sequence
 import asyncio
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
 from data_handler import DataProcessor
-from similarity import pearson_item_similarity
+from similarity import pearson_item_similarity, ItemRatingMatrix, SIMILARITY_THRESHOLD
+from parallel_similarity import iter_pearson_blocks, resolve_workers
+from progress import ProgressReporter
+from neighbor_index import NeighborIndex, NeighborRows
+from incremental_similarity import IncrementalSimilarity
+from checkpointed_similarity import CheckpointedSimilarityBuild
+from similarity_store import load_neighbor_index, save_neighbor_index
+from fingerprint import file_sha256
 
-import pickle
 from pathlib import Path
 
 
+def popular_recommendations(dp: DataProcessor, user_ratings: Dict[int, float], num_recommendations: Optional[int],
+                            include_genres: int = 0, exclude_genres: int = 0) -> List[Tuple[int, float]]:
+    """
+    Популярные фильмы, которые пользователь ещё не оценил (рекомендации для холодного старта).
+
+    :param dp: Обработчик данных
+    :param user_ratings: Оценки пользователя
+    :param num_recommendations: Количество рекомендаций (None — все подходящие фильмы)
+    :param include_genres: Маска жанров, хотя бы один из которых должен быть у фильма (0 — любые), defaults to 0
+    :param exclude_genres: Маска исключаемых жанров, defaults to 0
+    :return: Список кортежей (movie_id, 0.0) по убыванию популярности
+    """
+    limit = len(dp.item_stats.movie_ids) if num_recommendations is None else num_recommendations
+    popular = dp.get_top_popular_movies(limit + len(user_ratings), include_genres, exclude_genres)
+    return [(mid, 0.0) for mid in popular if mid not in user_ratings][:limit]
+
+
 class CollaborativeFiltering:
     """
     Реализация Item-Based Collaborative Filtering с корреляцией Пирсона.
     """
 
-    def __init__(self, data_processor: DataProcessor, min_common_users: int, top_k: int, cache_path: str) -> None:
+    def __init__(self, data_processor: DataProcessor, min_common_users: int, top_k: int, cache_path: str,
+                 similarity_backend: str = "sparse", block_size: int = 256, workers: int = 1,
+                 max_neighbors: Optional[int] = 200, candidates_per_item: int = 100, incremental: bool = False,
+                 memory_limit_mb: float = 512, checkpoint_dir: str = "data/similarity_blocks",
+                 similar_items: int = 20, similar_path: Optional[str] = None) -> None:
         """
         Инициализация Collaborative Filtering.
 
         :param data_processor: Обработчик данных
         :param min_common_users: Минимальное количество общих пользователей, defaults to 3
         :param top_k: Количество ближайших соседей для предсказания, defaults to 20
+        :param similarity_backend: Способ построения матрицы сходств: "sparse", "out_of_core" (по блокам
+            с записью на диск и продолжением после сбоя) или "pairwise", defaults to "sparse"
+        :param block_size: Количество фильмов в блоке для "sparse" и "out_of_core", defaults to 256
+        :param workers: Количество процессов для "sparse" и "out_of_core" (0 — по числу ядер), defaults to 1
+        :param max_neighbors: Количество хранимых соседей на фильм (0 или None — все). С ограничением
+            предсказания приближённые: оценки пользователя за пределами первых max_neighbors соседей
+            фильма не учитываются, defaults to 200
+        :param candidates_per_item: Количество кандидатов от каждого оценённого фильма (0 — все), defaults to 100
+        :param incremental: Хранить статистики пар фильмов и обновлять матрицу сходств по новым оценкам
+            без полного перестроения ("sparse"), defaults to False
+        :param memory_limit_mb: Ограничение памяти на промежуточные матрицы блоков в МБ для "out_of_core"
+            (0 — только block_size), defaults to 512
+        :param checkpoint_dir: Каталог для готовых блоков и манифеста "out_of_core",
+            defaults to "data/similarity_blocks"
+        :param similar_items: Длина списка похожих фильмов («ещё похожие»), defaults to 20
+        :param similar_path: Путь к файлу списков похожих фильмов (None — не сохранять), defaults to None
         """
+        if similarity_backend not in ("sparse", "out_of_core", "pairwise"):
+            raise ValueError(f"Неизвестный способ построения матрицы сходства: {similarity_backend}")
         self.dp = data_processor
         self.min_common_users = min_common_users
         self.top_k = top_k
-        self.sim: Dict[int, Dict[int, float]] = {}
+        self.similarity_backend = similarity_backend
+        self.block_size = max(1, block_size)
+        self.workers = resolve_workers(workers)
+        self.max_neighbors = max(0, max_neighbors or 0)
+        self.candidates_per_item = max(0, candidates_per_item)
+        self.sim: NeighborIndex = NeighborIndex.empty()
+        # Короткие списки похожих фильмов для /similar: первые similar_items соседей с положительным сходством
+        self.similar_items = max(1, similar_items)
+        self.similar: NeighborIndex = NeighborIndex.empty()
+        # Списки похожих фильмов, в которых incremental заменяет строки изменившихся фильмов
+        self._similar_rows: Optional[NeighborRows] = None
+        self.similar_file = Path(similar_path) if similar_path else None
+        self.incremental = incremental and similarity_backend == "sparse"
+        self.checkpoint = CheckpointedSimilarityBuild(checkpoint_dir, min_common_users, self.max_neighbors,
+                                                      self.block_size, memory_limit_mb, self.workers)
+        self._incremental: Optional[IncrementalSimilarity] = None
         self._built = False
+        # Счётчик прогресса текущего построения матрицы сходства
+        self.build_progress: Optional[ProgressReporter] = None
         self._build_lock = asyncio.Lock()
         self.cache_file = Path(cache_path)
 
+    @property
+    def is_built(self) -> bool:
+        """
+        Матрица сходств построена или загружена из кэша.
+        """
+        return self._built
+
+    async def warm_up(self) -> None:
+        """
+        Загрузка матрицы сходств из кэша или её построение заранее, до первого запроса.
+        """
+        await self._ensure_built()
+
     async def _ensure_built(self) -> None:
         """
         Гарантирует что матрица сходств построена
@@ -41,77 +119,232 @@ class CollaborativeFiltering:
                     return None
                 loop = asyncio.get_running_loop()
                 await loop.run_in_executor(None, self.build_item_similarity)
-                await self._save_to_cache()
+                if await self._save_to_cache() and self.similarity_backend == "out_of_core":
+                    # Готовые блоки больше не нужны: при следующем запуске индекс читается из кэша
+                    self.checkpoint.cleanup()
                 self._built = True
 
+    async def _cache_meta(self) -> Dict:
+        """
+        Параметры построения и отпечаток датасета, которым должен соответствовать кэш.
+        """
+        ratings_path = Path(self.dp.config.get("dataset_users_path", "data/u.data"))
+        loop = asyncio.get_running_loop()
+        ratings_hash = await loop.run_in_executor(None, file_sha256, ratings_path)
+        return {
+            'ratings_sha256': ratings_hash,
+            'min_common_users': self.min_common_users,
+            'top_k': self.top_k,
+            'max_neighbors': self.max_neighbors,
+            'threshold': SIMILARITY_THRESHOLD
+        }
+
     async def _load_from_cache(self) -> bool:
         """
-        Загружает матрицу сходств из кэша.
-        """
-        if self.cache_file.exists():
-            try:
-                with open(self.cache_file, 'rb') as f:
-                    cached_data = pickle.load(f)
-                    if (cached_data.get('min_common_users') == self.min_common_users and
-                            cached_data.get('top_k') == self.top_k):
-                        self.sim = cached_data['sim']
-                        print("Матрица сходства загружена из кэша")
-                        return True
-            except Exception as e:
-                print(f"Ошибка загрузки кэша: {e}")
+        Открывает матрицу сходств из кэша через mmap, если кэш построен по тому же датасету.
+        """
+        try:
+            meta = await self._cache_meta()
+            index = load_neighbor_index(self.cache_file, meta)
+            if index is not None:
+                self.sim = index
+                similar = None
+                if self.similar_file is not None:
+                    similar = load_neighbor_index(self.similar_file, {**meta, 'similar_items': self.similar_items})
+                self.similar = similar if similar is not None else self.sim.truncated(self.similar_items)
+                print("Матрица сходства загружена из кэша")
+                return True
+        except Exception as e:
+            print(f"Ошибка загрузки кэша: {e}")
         return False
 
-    async def _save_to_cache(self) -> None:
+    async def _save_to_cache(self) -> bool:
         """
         Сохраняет матрицу сходств в кэш.
+
+        :return: True если кэш записан
         """
         try:
-            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
-            cache_data = {
-                'sim': self.sim,
-                'min_common_users': self.min_common_users,
-                'top_k': self.top_k
-            }
-            with open(self.cache_file, 'wb') as f:
-                pickle.dump(cache_data, f)
+            meta = await self._cache_meta()
+            save_neighbor_index(self.cache_file, self.sim, meta)
+            if self.similar_file is not None:
+                save_neighbor_index(self.similar_file, self.similar, {**meta, 'similar_items': self.similar_items})
             print("Матрица сходства сохранена в кэш")
+            return True
         except Exception as e:
             print(f"Ошибка сохранения кэша: {e}")
+            return False
 
     def build_item_similarity(self) -> None:
         """
-        Построение матрицы сходств между фильмами.
+        Построение матрицы сходств между фильмами выбранным способом.
+        """
+        if self.similarity_backend == "pairwise":
+            self._build_pairwise()
+        elif self.similarity_backend == "out_of_core":
+            self._build_out_of_core()
+        elif self.incremental:
+            self._build_incremental()
+        else:
+            self._build_sparse()
+        self.similar = self.sim.truncated(self.similar_items)
+        self._built = True
+
+    def _build_incremental(self) -> None:
+        """
+        Построение матрицы сходств по статистикам пар фильмов, которые сохраняются для обновлений.
+        """
+        print("Начинаю построение матрицы сходства со статистиками пар...")
+        progress = self.build_progress = ProgressReporter(len(self.dp.movie_ids), "фильмов")
+        self._incremental = IncrementalSimilarity.build(self.dp.movie_ids, self.dp.item_user_matrix(),
+                                                        self.min_common_users, self.max_neighbors,
+                                                        self.block_size, progress)
+        self.sim = self._incremental.index
+        print(f"Матрица сходства построена за {progress.elapsed:.1f} с "
+              f"(пар фильмов: {len(self._incremental.stats)}, "
+              f"{self._incremental.stats.nbytes / 2 ** 20:.0f} МБ).")
+
+    def update_ratings(self, new_ratings: pd.DataFrame) -> None:
+        """
+        Учёт новых и изменённых оценок: данные обновляются на месте, а построенная матрица
+        сходств — по статистикам пар (incremental) или полным перестроением.
+
+        :param new_ratings: DataFrame с колонками user_id, movie_id, rating, timestamp
+        """
+        if new_ratings.empty:
+            return None
+        if not self.incremental or not self._built:
+            self.dp.add_ratings(new_ratings)
+            if self._built:
+                self.build_item_similarity()
+            return None
+        # add_ratings подставляет новую матрицу, прежняя остаётся без изменений
+        old_matrix = self.dp.user_item_matrix
+        self.dp.add_ratings(new_ratings)
+        self.refresh_similarities(old_matrix, new_ratings)
+
+    def refresh_similarities(self, old_matrix: sp.csr_matrix, new_ratings: pd.DataFrame) -> None:
+        """
+        Обновление матрицы сходств по статистикам пар после того, как оценки уже добавлены
+        в обработчик данных (incremental).
+
+        :param old_matrix: Матрица пользователь x фильм до добавления оценок
+        :param new_ratings: Добавленные оценки
+        """
+        if not self.incremental or not self._built or new_ratings.empty:
+            return None
+        if self._incremental is None:
+            # Матрица загружена из кэша: статистики пар считаются один раз по текущим данным
+            self._build_incremental()
+            self.similar = self.sim.truncated(self.similar_items)
+            return None
+        latest = new_ratings.drop_duplicates(['user_id', 'movie_id'], keep='last')
+        users = np.array([self.dp.user_position(user_id) for user_id in latest['user_id'].tolist()], dtype=np.int64)
+        items = self.dp.movie_positions_for(latest['movie_id'].to_numpy())
+        ratings = np.asarray(self.dp.user_item_matrix[users, items], dtype=np.float64).ravel()
+        self.sim = self._incremental.apply(old_matrix, self.dp.movie_ids, users, items, ratings)
+        self.similar = self._refresh_similar(self._incremental.changed)
+
+    def _refresh_similar(self, changed: np.ndarray) -> NeighborIndex:
+        """
+        Списки похожих фильмов с заменой строк фильмов, соседи которых изменились.
+
+        :param changed: Позиции фильмов с изменёнными списками соседей
+        :return: Новый индекс списков похожих фильмов
+        """
+        if self._similar_rows is None or self._similar_rows.index is not self.similar:
+            self._similar_rows = NeighborRows(self.similar)
+        index = self.sim
+        rows = {}
+        for item in changed.tolist():
+            start, stop = index.starts[item], index.stops[item]
+            cols, vals = index.indices[start:stop], index.data[start:stop]
+            keep = vals > 0
+            rows[item] = (cols[keep][:self.similar_items], vals[keep][:self.similar_items])
+        return self._similar_rows.replace(index.item_ids, rows)
+
+    def _build_sparse(self) -> None:
         """
-        print("Начинаю построение матрицы сходства...")
+        Построение матрицы сходств блочными произведениями разреженной матрицы оценок.
+        """
+        print(f"Начинаю построение матрицы сходства (sparse, процессов: {self.workers})...")
+        matrix = ItemRatingMatrix(self.dp.movie_ids, self.dp.item_user_matrix())
+        progress = self.build_progress = ProgressReporter(matrix.n_items, "фильмов")
+
+        def tracked_blocks():
+            blocks = iter_pearson_blocks(matrix, self.min_common_users, self.block_size,
+                                         self.workers, self.max_neighbors)
+            for start, stop, block in blocks:
+                progress.advance(stop - start)
+                yield block
+
+        self.sim = NeighborIndex.from_blocks(matrix.item_ids, tracked_blocks(), self.max_neighbors)
+        print(f"Матрица сходства построена за {progress.elapsed:.1f} с.")
+
+    def _build_out_of_core(self) -> None:
+        """
+        Построение матрицы сходств по блокам с записью готовых блоков на диск и продолжением
+        с последнего готового блока после прерывания.
+        """
+        matrix = ItemRatingMatrix(self.dp.movie_ids, self.dp.item_user_matrix())
+        rows = self.checkpoint.block_rows(matrix.n_items)
+        print(f"Начинаю построение матрицы сходства (out_of_core, блоки по {rows} фильмов, "
+              f"процессов: {self.workers}, каталог {self.checkpoint.directory})...")
+        progress = self.build_progress = ProgressReporter(matrix.n_items, "фильмов")
+        self.sim = self.checkpoint.build(matrix, progress)
+        print(f"Матрица сходства построена за {progress.elapsed:.1f} с.")
+
+    def _build_pairwise(self) -> None:
+        """
+        Построение матрицы сходств попарным сравнением фильмов.
+        """
+        print("Начинаю построение матрицы сходства (pairwise)...")
         ratings_df = self.dp.ratings_df
 
         movie_ids = ratings_df['movie_id'].unique().tolist()
-        n = len(movie_ids)
         sim: Dict[int, Dict[int, float]] = {}
+        progress = self.build_progress = ProgressReporter(len(movie_ids), "фильмов")
 
         for i_idx, item_i in enumerate(movie_ids):
-            sim[item_i] = {}
-            if (i_idx + 1) % 100 == 0:
-                print(f"  обработано {i_idx + 1}/{n} фильмов...")
+            sim.setdefault(item_i, {})
 
             for item_j in movie_ids[i_idx + 1:]:
                 similarity = pearson_item_similarity(
                     item_i, item_j, ratings_df, min_common=self.min_common_users
                 )
 
-                if similarity is not None and abs(similarity) > 0.1:
+                if similarity is not None and abs(similarity) > SIMILARITY_THRESHOLD:
                     sim[item_i][item_j] = similarity
                     if item_j not in sim:
                         sim[item_j] = {}
                     sim[item_j][item_i] = similarity
+            progress.advance()
+
+        self.sim = NeighborIndex.from_dict(sim, self.max_neighbors)
+        print(f"Матрица сходства построена за {progress.elapsed:.1f} с.")
 
-        self.sim = sim
-        print("Матрица сходства построена.")
+    def similar_movies(self, movie_id: int, n: int = 10) -> List[Tuple[int, float]]:
+        """
+        Фильмы, похожие на заданный, из заранее отобранного списка (не дольше similar_items).
+
+        :param movie_id: ID фильма
+        :param n: Количество фильмов, defaults to 10
+        :return: Список кортежей (movie_id, сходство) по убыванию сходства; пустой если фильма нет
+            или у него нет соседей
+        """
+        neighbor_ids, sims = self.similar.neighbors(movie_id)
+        n = max(0, n)
+        return list(zip(neighbor_ids[:n].tolist(), sims[:n].tolist()))
 
     def predict_rating(self, user_ratings: Dict[int, float], item_id: int, k: Optional[int] = None) -> Optional[float]:
         """
         Предсказание рейтинга пользователя для заданного фильма.
 
+        Соседи выбираются из строки индекса, то есть среди первых max_neighbors фильмов, похожих
+        на целевой. Если пользователь оценил похожий фильм дальше в списке, он не учитывается,
+        и предсказание может отличаться от полного перебора оценок пользователя; при
+        max_neighbors=0 результат совпадает с ним.
+
         :param user_ratings: Оценки пользователя
         :param item_id: ID целевого фильма
         :param k: Количество соседей для учета, defaults to None
@@ -123,35 +356,30 @@ class CollaborativeFiltering:
         if not user_ratings:
             return None
 
+        # Соседи в индексе уже упорядочены по убыванию сходства
         similarities = []
-        for rated_movie_id, user_rating in user_ratings.items():
-            similarity = self.sim.get(item_id, {}).get(rated_movie_id)
-            if similarity is not None and similarity > 0:
+        neighbor_ids, neighbor_sims = self.sim.neighbors(item_id)
+        for rated_movie_id, similarity in zip(neighbor_ids.tolist(), neighbor_sims.tolist()):
+            if similarity <= 0 or len(similarities) >= k:
+                break
+            user_rating = user_ratings.get(rated_movie_id)
+            if user_rating is not None:
                 similarities.append((rated_movie_id, similarity, user_rating))
 
         if not similarities:
             return None
 
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        similarities = similarities[:k]
-
-        user_item_table = self.dp.user_item_table
-        if user_item_table is None or item_id not in user_item_table.columns:
+        item_stats = self.dp.item_stats
+        if item_id not in item_stats:
             return None
 
-        target_ratings = user_item_table[item_id]
-        target_mean = target_ratings[target_ratings > 0].mean() if len(
-            target_ratings[target_ratings > 0]) > 0 else 3.0
+        target_mean = item_stats.mean(item_id)
 
         numerator = 0.0
         denominator = 0.0
 
         for rated_movie_id, similarity, user_rating in similarities:
-            rated_movie_ratings = user_item_table[rated_movie_id]
-            rated_movie_mean = rated_movie_ratings[rated_movie_ratings > 0].mean() if len(
-                rated_movie_ratings[rated_movie_ratings > 0]) > 0 else 3.0
-
-            adjusted_rating = user_rating - rated_movie_mean
+            adjusted_rating = user_rating - item_stats.mean(rated_movie_id)
 
             numerator += similarity * adjusted_rating
             denominator += abs(similarity)
@@ -165,41 +393,126 @@ class CollaborativeFiltering:
 
         return prediction
 
-    async def generate_recommendations(self, virtual_user_ratings: Dict[int, float], num_recommendations: int = 5) -> List[Tuple[int, float]]:
+    def predict_ratings(self, user_ratings: Dict[int, float], item_ids: Sequence[int],
+                        k: Optional[int] = None) -> np.ndarray:
+        """
+        Пакетное предсказание рейтингов пользователя для набора фильмов.
+
+        Выполняет те же шаги, что и predict_rating, сразу для всех фильмов: собирает строки индекса
+        соседей, оставляет соседей с положительным сходством, которых оценил пользователь, берёт
+        первые k в каждой строке и считает взвешенную сумму отклонений от средних.
+
+        :param user_ratings: Оценки пользователя
+        :param item_ids: ID целевых фильмов
+        :param k: Количество соседей для учета, defaults to None
+        :return: Массив предсказаний в порядке item_ids (NaN если предсказание невозможно)
+        """
+        if k is None:
+            k = self.top_k
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        predictions = np.full(len(item_ids), np.nan)
+        if not user_ratings or len(item_ids) == 0:
+            return predictions
+
+        index = self.sim
+        item_stats = self.dp.item_stats
+        user_vector = np.full(len(index), np.nan)
+        rated_ids = np.fromiter(user_ratings.keys(), dtype=np.int64, count=len(user_ratings))
+        rated_positions = index.positions_for(rated_ids)
+        rated_known = rated_positions >= 0
+        user_vector[rated_positions[rated_known]] = np.fromiter(
+            user_ratings.values(), dtype=np.float64, count=len(user_ratings))[rated_known]
+
+        target_positions = index.positions_for(item_ids)
+        valid = (target_positions >= 0) & (item_stats.counts_for(item_ids) > 0)
+        targets = np.flatnonzero(valid)
+        rows, flat = index.gather_rows(target_positions[targets])
+        neighbors = index.indices[flat]
+        neighbor_ratings = user_vector[neighbors]
+        usable = np.flatnonzero(~np.isnan(neighbor_ratings) & (index.data[flat] > 0))
+
+        # Строки упорядочены по убыванию сходства: первые k подходящих соседей в строке — лучшие
+        usable_rows = rows[usable]
+        rank = np.arange(len(usable)) - np.searchsorted(usable_rows, usable_rows)
+        selected = usable[rank < k]
+        rows = rows[selected]
+        sims = index.data[flat[selected]].astype(np.float64)
+        neighbor_means = item_stats.means_for(index.item_ids[neighbors[selected]])
+
+        weighted = sims * (neighbor_ratings[selected] - neighbor_means)
+        numerator = np.bincount(rows, weights=weighted, minlength=len(targets))
+        denominator = np.bincount(rows, weights=np.abs(sims), minlength=len(targets))
+
+        has_neighbors = denominator > 0
+        target_means = item_stats.means_for(item_ids[targets])
+        scores = np.full(len(targets), np.nan)
+        scores[has_neighbors] = np.clip(
+            target_means[has_neighbors] + numerator[has_neighbors] / denominator[has_neighbors], 1.0, 5.0)
+        predictions[targets] = scores
+        return predictions
+
+    def candidate_items(self, user_ratings: Dict[int, float], include_genres: int = 0,
+                        exclude_genres: int = 0) -> List[int]:
+        """
+        Кандидаты для рекомендаций: соседи оценённых пользователем фильмов.
+
+        От каждого оценённого фильма берётся не более candidates_per_item соседей с положительным
+        сходством, подходящих под фильтр жанров; уже оценённые фильмы исключаются. Кандидаты
+        упорядочены по популярности.
+
+        :param user_ratings: Оценки пользователя
+        :param include_genres: Маска жанров, хотя бы один из которых должен быть у фильма (0 — любые), defaults to 0
+        :param exclude_genres: Маска исключаемых жанров, defaults to 0
+        :return: Список ID фильмов-кандидатов
+        """
+        if not user_ratings:
+            return []
+        rated_ids = np.fromiter(user_ratings.keys(), dtype=np.int64, count=len(user_ratings))
+        allowed = None
+        if include_genres or exclude_genres:
+            allowed = self.dp.genre_filter(self.sim.item_ids, include_genres, exclude_genres)
+        positions = self.sim.neighbors_of_many(rated_ids, self.candidates_per_item, allowed)
+        candidate_ids = self.sim.item_ids[positions]
+        candidate_ids = candidate_ids[~np.isin(candidate_ids, rated_ids)]
+        order = np.argsort(self.dp.item_stats.ranks_for(candidate_ids), kind='stable')
+        return candidate_ids[order].tolist()
+
+    async def generate_recommendations(self, virtual_user_ratings: Dict[int, float],
+                                       num_recommendations: Optional[int] = 5, include_genres: int = 0,
+                                       exclude_genres: int = 0) -> List[Tuple[int, float]]:
         """
         Генерация рекомендаций для пользователя.
 
+        Фильтр жанров применяется при отборе кандидатов, до расчёта предсказаний.
+
         :param virtual_user_ratings: Оценки пользователя
-        :param num_recommendations: Количество рекомендаций, defaults to 5
+        :param num_recommendations: Количество рекомендаций (None — весь ранжированный список), defaults to 5
+        :param include_genres: Маска жанров, хотя бы один из которых должен быть у фильма (0 — любые), defaults to 0
+        :param exclude_genres: Маска исключаемых жанров, defaults to 0
         :return: Список кортежей (movie_id, predicted_rating)
         """
         await self._ensure_built()
+        return self.recommend(virtual_user_ratings, num_recommendations, include_genres, exclude_genres)
 
-        # all_movie_ids = self.dp.ratings_df['movie_id'].unique().tolist()
-        popular = self.dp.get_top_popular_movies(1000)
-        watched = set(virtual_user_ratings.keys())
-        candidate_ids = [m for m in popular if m not in watched]
-        # watched = set(virtual_user_ratings.keys())
-        # candidate_ids = [m for m in all_movie_ids if m not in watched]
-
-        if len(candidate_ids) > 1000:
-            candidate_ids = candidate_ids[:1000]
+    def recommend(self, user_ratings: Dict[int, float], num_recommendations: Optional[int] = 5,
+                  include_genres: int = 0, exclude_genres: int = 0) -> List[Tuple[int, float]]:
+        """
+        Рекомендации по уже построенной матрице сходств (без ожидания построения), например,
+        для пакетной генерации в процессах-обработчиках.
 
-        predicted = []
-        for item_id in candidate_ids:
-            pred = self.predict_rating(virtual_user_ratings, item_id)
-            if pred is not None and pred > 3.0:
-                predicted.append((item_id, pred))
+        :param user_ratings: Оценки пользователя
+        :param num_recommendations: Количество рекомендаций (None — весь ранжированный список), defaults to 5
+        :param include_genres: Маска жанров, хотя бы один из которых должен быть у фильма (0 — любые), defaults to 0
+        :param exclude_genres: Маска исключаемых жанров, defaults to 0
+        :return: Список кортежей (movie_id, predicted_rating)
+        """
+        candidate_ids = self.candidate_items(user_ratings, include_genres, exclude_genres)
+        scores = self.predict_ratings(user_ratings, candidate_ids)
+        predicted = [(item_id, score) for item_id, score in zip(candidate_ids, scores.tolist()) if score > 3.0]
 
         if not predicted:
-            watched = set(virtual_user_ratings.keys())
-            popular = self.dp.get_top_popular_movies(num_recommendations * 2)
-            result = []
-            for mid in popular:
-                if mid not in watched:
-                    result.append((mid, 0.0))
-                if len(result) >= num_recommendations:
-                    break
-            return result
+            # Холодный старт: у оценённых фильмов нет подходящих соседей
+            return popular_recommendations(self.dp, user_ratings, num_recommendations,
+                                           include_genres, exclude_genres)
         predicted.sort(key=lambda x: x[1], reverse=True)
-        return predicted[:num_recommendations]
+        return predicted if num_recommendations is None else predicted[:num_recommendations]
@@ -13,11 +13,53 @@ def get_config() -> dict:
         "tg_token": os.getenv("TELEGRAM_TOKEN"),
         "dataset_users_path": os.getenv("DATASET_USERS_PATH", "data/u.data"),
         "dataset_films_path": os.getenv("DATASET_FILMS_PATH", "data/u.item"),
-        "storage_path": os.getenv("STORAGE_PATH", "data/local_user_storage.json"),
-        "cache_path": os.getenv("CACHE_PATH", "data/similarity_cache.pkl"),
+        "storage_path": os.getenv("STORAGE_PATH", "data/user_ratings.sqlite3"),
+        # Оценки общего пользователя прежней версии переносятся один раз пользователю LEGACY_USER_ID
+        # (по умолчанию — первому из ADMIN_IDS; если не задан ни один, перенос откладывается)
+        "legacy_storage_path": os.getenv("LEGACY_STORAGE_PATH", "data/local_user_storage.json"),
+        "legacy_user_id": int(os.getenv("LEGACY_USER_ID", 0)),
+        "storage_compact_interval": float(os.getenv("STORAGE_COMPACT_INTERVAL", 60)),
+        "storage_flush_interval_ms": float(os.getenv("STORAGE_FLUSH_INTERVAL_MS", 5)),
+        "storage_flush_batch": int(os.getenv("STORAGE_FLUSH_BATCH", 256)),
+        "ingest_interval": float(os.getenv("INGEST_INTERVAL", 1.0)),
+        "ingest_batch": int(os.getenv("INGEST_BATCH", 1000)),
+        # Модели без обновления на месте и индекс пользователей перестраиваются в фоне (проверка раз в
+        # интервал, 0 — никогда), когда после их построения изменилась заданная доля оценок
+        "model_refresh_interval": float(os.getenv("MODEL_REFRESH_INTERVAL", 300)),
+        "model_refresh_fraction": float(os.getenv("MODEL_REFRESH_FRACTION", 0.05)),
+        "rec_cache_size": int(os.getenv("REC_CACHE_SIZE", 1024)),
+        "rec_cache_ttl": float(os.getenv("REC_CACHE_TTL", 600)),
+        "cache_path": os.getenv("CACHE_PATH", "data/similarity_cache.bin"),
+        "snapshot_path": os.getenv("DATASET_SNAPSHOT_PATH", "data/dataset_snapshot.bin"),
+        "warmup_timings_path": os.getenv("WARMUP_TIMINGS_PATH", "data/warmup_timings.json"),
+        "similar_path": os.getenv("SIMILAR_PATH", "data/similar_items.bin"),
+        "mf_path": os.getenv("MF_PATH", "data/mf_factors.bin"),
+        "recommender": os.getenv("RECOMMENDER", "item_cf"),
+        "admin_ids": [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()],
         "cf": {
             "min_common_users": int(os.getenv("CF_MIN_COMMON", 3)),
             "top_k": int(os.getenv("CF_TOP_K", 20)),
-            "num_recommendations": int(os.getenv("CF_NUM_RECOMMENDATIONS", 5))
+            "num_recommendations": int(os.getenv("CF_NUM_RECOMMENDATIONS", 5)),
+            "similarity_backend": os.getenv("CF_SIMILARITY_BACKEND", "sparse"),
+            "block_size": int(os.getenv("CF_BLOCK_SIZE", 256)),
+            "workers": int(os.getenv("CF_WORKERS", 1)),
+            "max_neighbors": int(os.getenv("CF_MAX_NEIGHBORS", 200)),
+            "candidates_per_item": int(os.getenv("CF_CANDIDATES_PER_ITEM", 100)),
+            "similar_users": int(os.getenv("CF_SIMILAR_USERS", 3)),
+            "user_index": os.getenv("CF_USER_INDEX", "exact"),
+            "lsh_tables": int(os.getenv("CF_LSH_TABLES", 16)),
+            "lsh_bits": int(os.getenv("CF_LSH_BITS", 10)),
+            "lsh_probes": int(os.getenv("CF_LSH_PROBES", 1)),
+            "user_neighbors": int(os.getenv("CF_USER_NEIGHBORS", 50)),
+            "incremental": os.getenv("CF_INCREMENTAL", "0") == "1",
+            "memory_limit_mb": float(os.getenv("CF_MEMORY_LIMIT_MB", 512)),
+            "checkpoint_dir": os.getenv("CF_CHECKPOINT_DIR", "data/similarity_blocks"),
+            "similar_items": int(os.getenv("CF_SIMILAR_ITEMS", 20))
+        },
+        "mf": {
+            "factors": int(os.getenv("MF_FACTORS", 32)),
+            "iterations": int(os.getenv("MF_ITERATIONS", 10)),
+            "reg": float(os.getenv("MF_REG", 0.05)),
+            "bias_reg": float(os.getenv("MF_BIAS_REG", 10.0))
         }
     }
@@ -1,21 +1,111 @@
+import asyncio
+import numpy as np
 import pandas as pd
 import random
+import scipy.sparse as sp
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from array_store import load_arrays, save_arrays
 from config import get_config
+from fingerprint import file_sha256
+from item_stats import ItemStatistics
+from title_index import TitleIndex
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
+# Сигнатура и версия снимка датасета (версия меняется при изменении набора массивов)
+SNAPSHOT_MAGIC = b"DATASET\0"
+SNAPSHOT_VERSION = 2
+
+
+def _extend_lookup(lookup: np.ndarray, ids: np.ndarray, start: int) -> np.ndarray:
+    """
+    Добавление новых ID в массив соответствия ID -> позиция.
+
+    :param lookup: Массив позиций по ID (-1 — ID нет)
+    :param ids: Новые ID
+    :param start: Позиция первого нового ID
+    :return: Новый массив позиций (расширенный при необходимости)
+    """
+    # Прежний массив не меняется: его могут читать другие потоки
+    size = max(len(lookup), int(ids.max()) + 1 if len(ids) else 0)
+    grown = np.full(size, -1, dtype=np.int32)
+    grown[:len(lookup)] = lookup
+    grown[ids] = np.arange(start, start + len(ids), dtype=np.int32)
+    return grown
+
+
+def _sorted_codes(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Уникальные значения по возрастанию и номер каждого элемента среди них.
+
+    Быстрее np.unique(return_inverse=True): хэширование вместо сортировки всего массива.
+
+    :param values: Массив целых ID
+    :return: Кортеж (отсортированные уникальные ID, номера элементов)
+    """
+    codes, uniques = pd.factorize(values, sort=False)
+    order = np.argsort(uniques, kind='stable')
+    rank = np.empty(len(order), dtype=np.int32)
+    rank[order] = np.arange(len(order), dtype=np.int32)
+    return np.asarray(uniques)[order], rank[codes]
+
+
+def _pair_keys(ratings_df: pd.DataFrame) -> np.ndarray:
+    """
+    Пара (пользователь, фильм) одним числом: user_id в старших 32 битах, movie_id в младших.
+    """
+    return (ratings_df['user_id'].to_numpy(dtype=np.int64) << 32) | ratings_df['movie_id'].to_numpy(dtype=np.int64)
+
+
+def _latest_ratings(ratings_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Последняя по времени оценка каждой пары (пользователь, фильм).
+
+    Из оценок с одинаковым временем остаётся последняя по порядку строк, поэтому повторное
+    чтение тех же строк ничего не меняет. Порядок оставшихся строк сохраняется.
+
+    :param ratings_df: DataFrame с колонками user_id, movie_id, rating, timestamp
+    :return: DataFrame без повторов пар (тот же объект, если повторов нет)
+    """
+    keys = pd.Series(_pair_keys(ratings_df))
+    if not keys.duplicated().any():
+        return ratings_df
+    order = np.argsort(ratings_df['timestamp'].to_numpy(), kind='stable')
+    latest = ~keys.iloc[order].duplicated(keep='last').to_numpy()
+    return ratings_df.iloc[np.sort(order[latest])].reset_index(drop=True)
 
 
 class DataProcessor:
     """
     Обработчик датасета MovieLens для загрузки и обработки данных о фильмах и оценках.
+
+    Оценки хранятся в разреженной матрице пользователь x фильм (CSR, индексы int32, значения
+    float32): отсутствие элемента означает отсутствие оценки. Пиковое потребление памяти
+    при загрузке замеряет benchmark.py memory.
     """
 
     def __init__(self) -> None:
         self.config = get_config()
         self.ratings_df: Optional[pd.DataFrame] = None
-        self.user_item_table: Optional[pd.DataFrame] = None
+        # Размер u.data в байтах на момент загрузки: с этого места читаются дописанные оценки
+        self.ratings_offset = 0
+        # Версия оценок — счётчик изменений: растёт на количество загруженных, добавленных или
+        # изменённых оценок; по разнице версий видно, насколько устарели построенные модели
+        self.version = 0
+        self.user_item_matrix: sp.csr_matrix = sp.csr_matrix((0, 0), dtype=np.float32)
+        self.user_ids: np.ndarray = np.zeros(0, dtype=np.int32)
+        self.movie_ids: np.ndarray = np.zeros(0, dtype=np.int32)
+        self._user_positions: np.ndarray = np.zeros(0, dtype=np.int32)
+        self._movie_positions: np.ndarray = np.zeros(0, dtype=np.int32)
         self.movie_titles: pd.DataFrame = pd.DataFrame(columns=['movie_id', 'title'])
-        self.movie_genres: Dict[int, List[str]] = {}
+        self._titles: Dict[int, str] = {}
+        self.title_index: TitleIndex = TitleIndex(np.zeros(0, np.int32), [])
+        self.item_stats: ItemStatistics = ItemStatistics.from_matrix(self.movie_ids, self.user_item_matrix)
 
         self.genre_names = [
             "unknown", "Action", "Adventure", "Animation", "Children's",
@@ -23,23 +113,43 @@ class DataProcessor:
             "Film-Noir", "Horror", "Musical", "Mystery", "Romance",
             "Sci-Fi", "Thriller", "War", "Western"
         ]
+        # Битовая маска жанров по ID фильма: бит i установлен, если фильм относится к genre_names[i]
+        self.genre_masks: np.ndarray = np.zeros(0, dtype=np.uint32)
 
     async def load_data(self) -> None:
         """
         Асинхронная загрузка данных из файлов u.data и u.item.
+
+        Если снимок датасета построен по тем же файлам (совпадает SHA-256 содержимого, как у кэша
+        матрицы сходств), данные берутся из него без разбора текстовых файлов. Иначе файлы разбираются заново
+        и снимок перезаписывается.
         """
         users_path = Path(self.config.get("dataset_users_path", "data/u.data"))
         films_path = Path(self.config.get("dataset_films_path", "data/u.item"))
+        snapshot_path = self.config.get("snapshot_path")
+        # Строки, дописанные во время чтения файла, будут прочитаны ещё раз; повтор оценки её не меняет
+        self.ratings_offset = users_path.stat().st_size if users_path.exists() else 0
+        loop = asyncio.get_running_loop()
+        snapshot_meta = {
+            "version": SNAPSHOT_VERSION,
+            "ratings_sha256": await loop.run_in_executor(None, file_sha256, users_path),
+            "items_sha256": await loop.run_in_executor(None, file_sha256, films_path),
+            "genres": self.genre_names
+        }
+        if snapshot_path and self._load_snapshot(Path(snapshot_path), snapshot_meta):
+            print(f"Загружен снимок датасета {snapshot_path}: оценок {len(self.ratings_df)}, "
+                  f"фильмов {len(self.movie_titles)}")
+            return None
 
         try:
-            self.ratings_df = pd.read_csv(
+            ratings_df = pd.read_csv(
                 users_path,
                 sep='\t',
                 names=['user_id', 'movie_id', 'rating', 'timestamp'],
-                dtype={'user_id': int, 'movie_id': int, 'rating': float, 'timestamp': int},
-                engine='python'
+                dtype={'user_id': np.int32, 'movie_id': np.int32, 'rating': np.float32, 'timestamp': np.int64},
+                engine=CSV_ENGINE
             )
-            print(f"Загружено оценок: {len(self.ratings_df)}")
+            print(f"Загружено оценок: {len(ratings_df)}")
         except Exception as e:
             print(f"Ошибка при загрузке {users_path}: {e}")
             self.ratings_df = pd.DataFrame(columns=['user_id', 'movie_id', 'rating', 'timestamp'])
@@ -54,54 +164,213 @@ class DataProcessor:
                     encoding='latin-1',
                     header=None,
                     names=cols,
-                    usecols=list(range(5 + len(self.genre_names)))
+                    usecols=['movie_id', 'title'] + self.genre_names,
+                    dtype={'movie_id': np.int32, 'title': str},
+                    engine=CSV_ENGINE
                 )
-                self.movie_titles = df_items[['movie_id', 'title']].copy()
-                for _, row in df_items.iterrows():
-                    mid = int(row['movie_id'])
-                    genres = []
-                    for g in self.genre_names:
-                        try:
-                            if row[g] == 1:
-                                genres.append(g)
-                        except Exception:
-                            continue
-                    self.movie_genres[mid] = genres
+                genre_flags = (df_items[self.genre_names] == 1).to_numpy(dtype=np.uint32)
+                masks = (genre_flags << np.arange(len(self.genre_names), dtype=np.uint32)).sum(axis=1, dtype=np.uint32)
+                self._set_movies(df_items['movie_id'].to_numpy(), df_items['title'].fillna('').tolist(), masks)
                 print(f"Загружено названий фильмов: {len(self.movie_titles)}")
             except Exception as e:
                 print(f"Ошибка загрузки {films_path}: {e}")
-                self.movie_titles = pd.DataFrame(columns=['movie_id', 'title'])
-                self.movie_genres = {}
+                self._set_movies(np.zeros(0, np.int32), [], np.zeros(0, np.uint32))
         else:
             print(f"Файл {films_path} не найден. Названия фильмов не загружены.")
 
-        await self._create_user_item_table()
+        await self.set_ratings(ratings_df)
+        if snapshot_path:
+            try:
+                self._save_snapshot(Path(snapshot_path), snapshot_meta)
+            except OSError as e:
+                print(f"Не удалось сохранить снимок датасета {snapshot_path}: {e}")
+
+    def _set_movies(self, movie_ids: np.ndarray, titles: List[str], genre_masks: np.ndarray) -> None:
+        """
+        Заполнение названий и жанров фильмов.
+
+        :param movie_ids: ID фильмов
+        :param titles: Названия фильмов в том же порядке
+        :param genre_masks: Битовые маски жанров в том же порядке
+        """
+        movie_ids = np.asarray(movie_ids, dtype=np.int32)
+        self.movie_titles = pd.DataFrame({'movie_id': movie_ids, 'title': titles})
+        self._titles = dict(zip(movie_ids.tolist(), titles))
+        self.title_index = TitleIndex(movie_ids, titles)
+        self.genre_masks = np.zeros(int(movie_ids.max()) + 1 if len(movie_ids) else 0, dtype=np.uint32)
+        self.genre_masks[movie_ids] = genre_masks
+
+    def _save_snapshot(self, path: Path, meta: Dict) -> None:
+        """
+        Запись снимка датасета: оценки, названия, жанры и матрица пользователь x фильм.
+
+        :param path: Путь к файлу снимка
+        :param meta: Отпечатки исходных файлов
+        """
+        titles = [title.encode('utf-8') for title in self.movie_titles['title'].tolist()]
+        matrix = self.user_item_matrix
+        arrays = {
+            "user_id": self.ratings_df['user_id'].to_numpy(dtype=np.int32),
+            "movie_id": self.ratings_df['movie_id'].to_numpy(dtype=np.int32),
+            "rating": self.ratings_df['rating'].to_numpy(dtype=np.float32),
+            "timestamp": self.ratings_df['timestamp'].to_numpy(dtype=np.int64),
+            "title_movie_ids": self.movie_titles['movie_id'].to_numpy(dtype=np.int32),
+            "title_offsets": np.cumsum([0] + [len(title) for title in titles], dtype=np.int64),
+            "title_bytes": np.frombuffer(b"".join(titles), dtype=np.uint8),
+            "title_genre_masks": self.genre_masks_for(self.movie_titles['movie_id'].to_numpy()),
+            "user_ids": self.user_ids,
+            "movie_ids": self.movie_ids,
+            "indptr": matrix.indptr,
+            "indices": matrix.indices,
+            "data": matrix.data
+        }
+        save_arrays(path, SNAPSHOT_MAGIC, arrays, meta)
+
+    def _load_snapshot(self, path: Path, meta: Dict) -> bool:
+        """
+        Загрузка снимка датасета, если он построен по тем же исходным файлам.
 
-    async def _create_user_item_table(self) -> None:
+        :param path: Путь к файлу снимка
+        :param meta: Ожидаемые отпечатки исходных файлов
+        :return: True если снимок загружен
         """
-        Создание таблицы пользователь x фильм с заполнением нулями.
+        try:
+            arrays = load_arrays(path, SNAPSHOT_MAGIC, meta)
+        except (OSError, ValueError) as e:
+            print(f"Ошибка чтения снимка датасета {path}: {e}")
+            return False
+        if arrays is None:
+            return False
+
+        title_bytes = arrays["title_bytes"].tobytes()
+        offsets = arrays["title_offsets"].tolist()
+        titles = [title_bytes[start:stop].decode('utf-8') for start, stop in zip(offsets[:-1], offsets[1:])]
+        self._set_movies(arrays["title_movie_ids"], titles, arrays["title_genre_masks"])
+
+        self.ratings_df = pd.DataFrame({
+            'user_id': arrays["user_id"],
+            'movie_id': arrays["movie_id"],
+            'rating': arrays["rating"],
+            'timestamp': arrays["timestamp"]
+        })
+        self.user_ids = np.array(arrays["user_ids"])
+        self.movie_ids = np.array(arrays["movie_ids"])
+        self._user_positions = _extend_lookup(np.zeros(0, dtype=np.int32), self.user_ids, 0)
+        self._movie_positions = _extend_lookup(np.zeros(0, dtype=np.int32), self.movie_ids, 0)
+        self.user_item_matrix = sp.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]),
+                                              shape=(len(self.user_ids), len(self.movie_ids)))
+        self.item_stats = ItemStatistics.from_matrix(self.movie_ids, self.user_item_matrix)
+        self.version += len(self.ratings_df)
+        return True
+
+    async def set_ratings(self, ratings_df: pd.DataFrame) -> None:
         """
-        if self.ratings_df is None:
-            self.user_item_table = pd.DataFrame()
+        Замена оценок с перестроением матрицы пользователь x фильм и статистики фильмов.
+
+        Из повторных оценок пользователем одного фильма остаётся последняя по времени, как и в add_ratings.
+
+        :param ratings_df: DataFrame с колонками user_id, movie_id, rating, timestamp
+        """
+        self.ratings_df = _latest_ratings(ratings_df)
+        await self._create_user_item_matrix()
+        self.item_stats = ItemStatistics.from_matrix(self.movie_ids, self.user_item_matrix)
+        self.version += len(self.ratings_df)
+
+    async def _create_user_item_matrix(self) -> None:
+        """
+        Создание разреженной матрицы пользователь x фильм (в ratings_df нет повторов пар).
+        """
+        if self.ratings_df is None or self.ratings_df.empty:
+            self.user_ids = np.zeros(0, dtype=np.int32)
+            self.movie_ids = np.zeros(0, dtype=np.int32)
+            self._user_positions = np.zeros(0, dtype=np.int32)
+            self._movie_positions = np.zeros(0, dtype=np.int32)
+            self.user_item_matrix = self._csr(np.zeros(0), np.zeros(0), np.zeros(0))
             return None
-        self.user_item_table = self.ratings_df.pivot_table(
-            index='user_id',
-            columns='movie_id',
-            values='rating',
-            aggfunc='mean'
-        ).fillna(0)
+        user_ids, rows = _sorted_codes(self.ratings_df['user_id'].to_numpy())
+        movie_ids, cols = _sorted_codes(self.ratings_df['movie_id'].to_numpy())
+        self.user_ids = user_ids.astype(np.int32)
+        self.movie_ids = movie_ids.astype(np.int32)
+        self._user_positions = _extend_lookup(np.zeros(0, dtype=np.int32), self.user_ids, 0)
+        self._movie_positions = _extend_lookup(np.zeros(0, dtype=np.int32), self.movie_ids, 0)
+        self.user_item_matrix = self._csr(self.ratings_df['rating'].to_numpy(), rows, cols)
+
+    def _csr(self, values: np.ndarray, rows: np.ndarray, cols: np.ndarray, dtype=np.float32,
+             shape: Optional[Tuple[int, int]] = None) -> sp.csr_matrix:
+        """
+        Сборка матрицы пользователь x фильм с индексами int32.
+
+        :param values: Оценки
+        :param rows: Номера строк пользователей
+        :param cols: Номера столбцов фильмов
+        :param dtype: Тип значений, defaults to float32
+        :param shape: Размер матрицы (None — по текущим user_ids и movie_ids), defaults to None
+        :return: Разреженная матрица оценок
+        """
+        if shape is None:
+            shape = (len(self.user_ids), len(self.movie_ids))
+        matrix = sp.csr_matrix((values.astype(dtype), (rows.astype(np.int32), cols.astype(np.int32))),
+                               shape=shape, dtype=dtype)
+        return self._csr_like(matrix.data, matrix)
+
+    def _csr_like(self, values: np.ndarray, matrix: sp.csr_matrix) -> sp.csr_matrix:
+        """
+        Матрица с той же структурой, значениями float32 и индексами int32.
+
+        :param values: Значения в порядке элементов matrix
+        :param matrix: Матрица в формате CSR
+        :return: Разреженная матрица оценок
+        """
+        return sp.csr_matrix((values.astype(np.float32), matrix.indices.astype(np.int32, copy=False),
+                              matrix.indptr.astype(np.int32, copy=False)), shape=matrix.shape)
+
+    def user_position(self, user_id: int) -> Optional[int]:
+        """
+        Номер строки пользователя в матрице оценок.
+
+        :param user_id: ID пользователя
+        :return: Номер строки или None если пользователь не найден
+        """
+        if user_id < 0 or user_id >= len(self._user_positions):
+            return None
+        pos = int(self._user_positions[user_id])
+        return pos if pos >= 0 else None
+
+    def movie_positions_for(self, movie_ids: np.ndarray) -> np.ndarray:
+        """
+        Номера столбцов фильмов в матрице оценок.
+
+        :param movie_ids: ID фильмов
+        :return: Массив номеров столбцов (-1 для фильмов без оценок)
+        """
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        known = (movie_ids >= 0) & (movie_ids < len(self._movie_positions))
+        positions = np.full(len(movie_ids), -1, dtype=np.int64)
+        positions[known] = self._movie_positions[movie_ids[known]]
+        return positions
+
+    def item_user_matrix(self) -> sp.csr_matrix:
+        """
+        Матрица фильм x пользователь в формате CSR (транспонированная матрица оценок).
+
+        :return: Разреженная матрица оценок по фильмам
+        """
+        return self.user_item_matrix.T.tocsr()
 
     def get_user_ratings(self, user_id: int) -> Dict[int, float]:
         """
-        Получение словаря ненулевых рейтингов для заданного пользователя.
+        Получение словаря рейтингов для заданного пользователя.
 
         :param user_id: ID пользователя
         :return: Словарь {movie_id: rating} или пустой словарь если пользователь не найден
         """
-        if self.user_item_table is None or user_id not in self.user_item_table.index:
+        pos = self.user_position(user_id)
+        if pos is None:
             return {}
-        user_ratings = self.user_item_table.loc[user_id]
-        return {int(movie_id): float(rating) for movie_id, rating in user_ratings.items() if rating > 0}
+        start, stop = self.user_item_matrix.indptr[pos], self.user_item_matrix.indptr[pos + 1]
+        movie_ids = self.movie_ids[self.user_item_matrix.indices[start:stop]]
+        ratings = self.user_item_matrix.data[start:stop]
+        return dict(zip(movie_ids.tolist(), ratings.tolist()))
 
     def get_all_users(self) -> List[int]:
         """
@@ -109,9 +378,7 @@ class DataProcessor:
 
         :return: Список ID пользователей
         """
-        if self.user_item_table is None:
-            return []
-        return list(self.user_item_table.index.tolist())
+        return self.user_ids.tolist()
 
     def get_movie_title(self, movie_id: int) -> str:
         """
@@ -120,11 +387,18 @@ class DataProcessor:
         :param movie_id: ID фильма
         :return: Название фильма или 'Фильм {id}' если не найден
         """
-        if not self.movie_titles.empty:
-            row = self.movie_titles[self.movie_titles['movie_id'] == movie_id]
-            if not row.empty:
-                return row['title'].iloc[0]
-        return f"Фильм {movie_id}"
+        title = self._titles.get(movie_id)
+        return title if title is not None else f"Фильм {movie_id}"
+
+    def search_movies(self, text: str, limit: int = 10) -> List[Tuple[int, str]]:
+        """
+        Поиск фильмов по части названия.
+
+        :param text: Строка запроса
+        :param limit: Максимальное количество результатов, defaults to 10
+        :return: Список кортежей (movie_id, title)
+        """
+        return self.title_index.search(text, limit)
 
     def get_movie_genres(self, movie_id: int) -> List[str]:
         """
@@ -133,19 +407,138 @@ class DataProcessor:
         :param movie_id: ID фильма
         :return: Список жанров фильма
         """
-        return self.movie_genres.get(movie_id, [])
+        mask = int(self.genre_masks_for(np.array([movie_id]))[0])
+        return [name for bit, name in enumerate(self.genre_names) if mask >> bit & 1]
+
+    def genre_mask(self, genres: List[str]) -> int:
+        """
+        Битовая маска для списка названий жанров (без учёта регистра).
+
+        :param genres: Названия жанров
+        :return: Маска жанров
+        :raises ValueError: Если жанр не найден
+        """
+        bits = {name.lower(): bit for bit, name in enumerate(self.genre_names)}
+        mask = 0
+        for genre in genres:
+            bit = bits.get(genre.strip().lower())
+            if bit is None:
+                raise ValueError(f"Неизвестный жанр: {genre}")
+            mask |= 1 << bit
+        return mask
+
+    def genre_masks_for(self, movie_ids: np.ndarray) -> np.ndarray:
+        """
+        Битовые маски жанров для массива фильмов.
 
-    def get_top_popular_movies(self, n: int = 50) -> List[int]:
+        :param movie_ids: ID фильмов
+        :return: Массив масок (0 для фильмов без жанров или без описания)
+        """
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        known = (movie_ids >= 0) & (movie_ids < len(self.genre_masks))
+        masks = np.zeros(len(movie_ids), dtype=np.uint32)
+        masks[known] = self.genre_masks[movie_ids[known]]
+        return masks
+
+    def genre_filter(self, movie_ids: np.ndarray, include_genres: int = 0, exclude_genres: int = 0) -> np.ndarray:
+        """
+        Отбор фильмов по жанрам.
+
+        :param movie_ids: ID фильмов
+        :param include_genres: Маска жанров, хотя бы один из которых должен быть у фильма (0 — любые), defaults to 0
+        :param exclude_genres: Маска жанров, которых не должно быть у фильма, defaults to 0
+        :return: Булев массив: фильм проходит фильтр
+        """
+        masks = self.genre_masks_for(movie_ids)
+        allowed = (masks & np.uint32(exclude_genres)) == 0
+        if include_genres:
+            allowed &= (masks & np.uint32(include_genres)) != 0
+        return allowed
+
+    def get_top_popular_movies(self, n: int = 50, include_genres: int = 0, exclude_genres: int = 0) -> List[int]:
         """
         Получение топ-N популярных фильмов по количеству оценок.
 
         :param n: Количество фильмов для возврата, defaults to 50
+        :param include_genres: Маска жанров, хотя бы один из которых должен быть у фильма (0 — любые), defaults to 0
+        :param exclude_genres: Маска исключаемых жанров, defaults to 0
         :return: Список ID популярных фильмов
         """
-        if self.ratings_df is None or self.ratings_df.empty:
-            return []
-        counts = self.ratings_df.groupby('movie_id').size()
-        return counts.nlargest(n).index.tolist()
+        if not include_genres and not exclude_genres:
+            return self.item_stats.top_popular(n)
+        popular = np.asarray(self.item_stats.top_popular(len(self.item_stats.movie_ids)), dtype=np.int64)
+        return popular[self.genre_filter(popular, include_genres, exclude_genres)][:max(0, n)].tolist()
+
+    def get_movie_stats(self, movie_id: int) -> Optional[Tuple[float, int, int]]:
+        """
+        Получение статистики оценок фильма.
+
+        :param movie_id: ID фильма
+        :return: Кортеж (средний рейтинг, количество оценок, место по популярности) или None если оценок нет
+        """
+        return self.item_stats.describe(movie_id)
+
+    def add_ratings(self, new_ratings: pd.DataFrame) -> None:
+        """
+        Добавление новых или изменённых оценок с обновлением матрицы и статистики.
+
+        Из оценок пользователем одного фильма остаётся последняя по времени (при равном времени —
+        последняя по порядку), в том числе в ratings_df: результат тот же, что у set_ratings по всем строкам.
+        Прежняя матрица пользователь x фильм не меняется: её могут читать построения моделей
+        в исполнителе. Новая матрица подставляется одним присваиванием до массивов позиций,
+        поэтому позиция из любого массива всегда есть в текущей матрице.
+
+        :param new_ratings: DataFrame с колонками user_id, movie_id, rating, timestamp
+        """
+        if new_ratings.empty:
+            return None
+        ratings_df, latest = self._merge_ratings(self.ratings_df, new_ratings)
+        users = latest['user_id'].to_numpy(dtype=np.int64)
+        movies = latest['movie_id'].to_numpy(dtype=np.int64)
+        ratings = latest['rating'].to_numpy(dtype=np.float64)
+
+        new_users = np.setdiff1d(users, self.user_ids)
+        new_movies = np.setdiff1d(movies, self.movie_ids)
+        user_positions = _extend_lookup(self._user_positions, new_users, len(self.user_ids))
+        movie_positions = _extend_lookup(self._movie_positions, new_movies, len(self.movie_ids))
+        user_ids = np.concatenate([self.user_ids, new_users.astype(np.int32)])
+        movie_ids = np.concatenate([self.movie_ids, new_movies.astype(np.int32)])
+
+        matrix = self.user_item_matrix
+        shape = (len(user_ids), len(movie_ids))
+        # Новые пользователи — пустые строки в конце, новые фильмы — столбцы без оценок
+        indptr = np.concatenate([matrix.indptr, np.full(shape[0] - matrix.shape[0], matrix.indptr[-1],
+                                                        dtype=matrix.indptr.dtype)])
+        grown = sp.csr_matrix((matrix.data, matrix.indices, indptr), shape=shape)
+        rows = user_positions[users]
+        cols = movie_positions[movies]
+        old = np.asarray(grown[rows, cols], dtype=np.float64).ravel()
+        # Замена оценок: добавляется разность между новой и прежней оценкой
+        self.user_item_matrix = grown + self._csr(ratings - old, rows, cols, shape=shape)
+        self.user_ids, self.movie_ids = user_ids, movie_ids
+        self._user_positions, self._movie_positions = user_positions, movie_positions
+
+        self.item_stats.apply_changes(movies, np.where(old > 0, old, np.nan), ratings)
+        self.ratings_df = ratings_df
+        self.version += len(latest)
+
+    @staticmethod
+    def _merge_ratings(ratings_df: Optional[pd.DataFrame],
+                       new_ratings: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Слияние новых оценок с текущими: для каждой пары остаётся последняя по времени оценка.
+
+        :param ratings_df: Текущие оценки
+        :param new_ratings: Новые оценки
+        :return: Кортеж (новый DataFrame: прежние строки без затронутых пар, затем итоговые оценки
+            затронутых пар; итоговые оценки затронутых пар)
+        """
+        if ratings_df is None or ratings_df.empty:
+            latest = _latest_ratings(new_ratings).reset_index(drop=True)
+            return latest, latest
+        touched = np.isin(_pair_keys(ratings_df), _pair_keys(new_ratings))
+        latest = _latest_ratings(pd.concat([ratings_df[touched], new_ratings], ignore_index=True))
+        return pd.concat([ratings_df[~touched], latest], ignore_index=True), latest
 
     def get_random_movies(self, n: int = 5) -> List[int]:
         """
@@ -0,0 +1,164 @@
+import math
+import time
+from typing import Dict, List, Sequence, Set, Tuple
+import numpy as np
+import pandas as pd
+
+# Способы разбиения оценок на обучающую и тестовую части
+SPLIT_METHODS = ("random", "temporal")
+
+
+def split_ratings(ratings_df: pd.DataFrame, method: str = "random", test_fraction: float = 0.2,
+                  seed: int = 42) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Воспроизводимое разбиение оценок на обучающую и тестовую части.
+
+    random — в тест попадает случайная доля всех оценок. temporal — у каждого пользователя
+    в тест попадают его последние по timestamp оценки (доля test_fraction с округлением вниз,
+    поэтому пользователи с малым числом оценок остаются только в обучении).
+
+    :param ratings_df: DataFrame с колонками user_id, movie_id, rating, timestamp
+    :param method: Способ разбиения: "random" или "temporal", defaults to "random"
+    :param test_fraction: Доля оценок в тестовой части, defaults to 0.2
+    :param seed: Зерно генератора случайных чисел, defaults to 42
+    :return: Кортеж (обучающая часть, тестовая часть)
+    :raises ValueError: Если способ разбиения неизвестен
+    """
+    n = len(ratings_df)
+    if method == "random":
+        is_test = np.zeros(n, dtype=bool)
+        is_test[np.random.default_rng(seed).permutation(n)[:int(n * test_fraction)]] = True
+    elif method == "temporal":
+        users = ratings_df['user_id'].to_numpy()
+        # При равных timestamp порядок определяется зерном, а не порядком строк в файле
+        tiebreak = np.random.default_rng(seed).random(n)
+        order = np.lexsort((tiebreak, ratings_df['timestamp'].to_numpy(), users))
+        sorted_users = users[order]
+        starts = np.flatnonzero(np.r_[True, sorted_users[1:] != sorted_users[:-1]])
+        counts = np.diff(np.r_[starts, n])
+        rank = np.arange(n) - np.repeat(starts, counts)
+        n_test = np.repeat((counts * test_fraction).astype(np.int64), counts)
+        is_test = np.zeros(n, dtype=bool)
+        is_test[order] = rank >= np.repeat(counts, counts) - n_test
+    else:
+        raise ValueError(f"Неизвестный способ разбиения: {method}")
+    return ratings_df[~is_test].reset_index(drop=True), ratings_df[is_test].reset_index(drop=True)
+
+
+def user_profiles(ratings_df: pd.DataFrame, user_ids: Sequence[int]) -> Dict[int, Dict[int, float]]:
+    """
+    Оценки выбранных пользователей в виде словарей.
+
+    :param ratings_df: DataFrame с колонками user_id, movie_id, rating
+    :param user_ids: ID пользователей
+    :return: Словарь {user_id: {movie_id: rating}}
+    """
+    subset = ratings_df[ratings_df['user_id'].isin(user_ids)]
+    profiles: Dict[int, Dict[int, float]] = {int(user_id): {} for user_id in user_ids}
+    for user_id, movie_id, rating in zip(subset['user_id'].tolist(), subset['movie_id'].tolist(),
+                                         subset['rating'].tolist()):
+        profiles[user_id][movie_id] = rating
+    return profiles
+
+
+def rating_metrics(predicted: np.ndarray, actual: np.ndarray) -> Dict[str, float]:
+    """
+    Точность предсказания рейтингов.
+
+    :param predicted: Предсказания (NaN — предсказание невозможно)
+    :param actual: Настоящие оценки
+    :return: Словарь: rmse и mae по предсказанным оценкам и доля предсказанных (coverage)
+    """
+    known = ~np.isnan(predicted)
+    errors = predicted[known] - actual[known]
+    return {
+        "rmse": float(np.sqrt(np.mean(errors ** 2))) if len(errors) else float("nan"),
+        "mae": float(np.mean(np.abs(errors))) if len(errors) else float("nan"),
+        "coverage": float(known.mean()) if len(known) else 0.0,
+        "predictions": int(len(known))
+    }
+
+
+def ranking_metrics(recommended: List[int], relevant: Set[int], k: int) -> Tuple[float, float, float]:
+    """
+    Качество списка рекомендаций одного пользователя.
+
+    :param recommended: Рекомендованные ID фильмов по убыванию предсказания
+    :param relevant: ID фильмов, которые пользователь высоко оценил в тесте
+    :param k: Длина списка
+    :return: Кортеж (precision@k, recall@k, ndcg@k)
+    """
+    hits = [1.0 if movie_id in relevant else 0.0 for movie_id in recommended[:k]]
+    dcg = sum(hit / math.log2(rank + 2) for rank, hit in enumerate(hits))
+    ideal = sum(1.0 / math.log2(rank + 2) for rank in range(min(k, len(relevant))))
+    return sum(hits) / k, sum(hits) / len(relevant), dcg / ideal if ideal else 0.0
+
+
+def latency_percentiles(seconds: Sequence[float]) -> Dict[str, float]:
+    """
+    Перцентили задержки в миллисекундах.
+
+    :param seconds: Длительности запросов в секундах
+    :return: Словарь p50_ms, p95_ms, p99_ms
+    """
+    values = np.asarray(seconds, dtype=np.float64) * 1e3 if len(seconds) else np.zeros(1)
+    return {f"p{q}_ms": float(np.percentile(values, q)) for q in (50, 95, 99)}
+
+
+async def evaluate_recommender(model, train_df: pd.DataFrame, test_df: pd.DataFrame, k: int = 10,
+                               relevant_threshold: float = 4.0, max_users: int = 0, seed: int = 42) -> Dict:
+    """
+    Оценка модели на отложенных оценках.
+
+    Для каждого пользователя из теста профилем служат его оценки из обучающей части. Рейтинги
+    тестовых фильмов предсказываются predict_ratings (пакетный вариант predict_rating с теми же
+    результатами), список из k рекомендаций строится generate_recommendations и сравнивается
+    с тестовыми фильмами с оценкой не ниже relevant_threshold. У модели должны быть методы
+    predict_ratings(ratings, item_ids) и async generate_recommendations(ratings, n).
+
+    :param model: Модель рекомендаций, построенная по train_df
+    :param train_df: Обучающая часть оценок
+    :param test_df: Тестовая часть оценок
+    :param k: Длина списка рекомендаций, defaults to 10
+    :param relevant_threshold: Минимальная оценка релевантного фильма, defaults to 4.0
+    :param max_users: Максимальное количество пользователей (0 — все), defaults to 0
+    :param seed: Зерно выбора пользователей, defaults to 42
+    :return: Словарь метрик
+    """
+    user_ids = np.unique(test_df['user_id'].to_numpy())
+    if 0 < max_users < len(user_ids):
+        user_ids = np.sort(np.random.default_rng(seed).choice(user_ids, max_users, replace=False))
+    user_ids = user_ids.tolist()
+    profiles = user_profiles(train_df, user_ids)
+    tests = user_profiles(test_df, user_ids)
+
+    predicted, actual = [], []
+    precisions, recalls, ndcgs, latencies = [], [], [], []
+    for user_id in user_ids:
+        profile, test = profiles[user_id], tests[user_id]
+        item_ids = list(test)
+        predicted.append(model.predict_ratings(profile, item_ids))
+        actual.append(np.fromiter(test.values(), dtype=np.float64, count=len(test)))
+
+        relevant = {movie_id for movie_id, rating in test.items() if rating >= relevant_threshold}
+        if not profile or not relevant:
+            continue
+        started = time.perf_counter()
+        recommendations = await model.generate_recommendations(profile, k)
+        latencies.append(time.perf_counter() - started)
+        precision, recall, ndcg = ranking_metrics([movie_id for movie_id, _ in recommendations], relevant, k)
+        precisions.append(precision)
+        recalls.append(recall)
+        ndcgs.append(ndcg)
+
+    result = rating_metrics(np.concatenate(predicted) if predicted else np.zeros(0),
+                            np.concatenate(actual) if actual else np.zeros(0))
+    result.update({
+        "users": len(user_ids),
+        "ranked_users": len(precisions),
+        f"precision@{k}": float(np.mean(precisions)) if precisions else 0.0,
+        f"recall@{k}": float(np.mean(recalls)) if recalls else 0.0,
+        f"ndcg@{k}": float(np.mean(ndcgs)) if ndcgs else 0.0,
+        "latency": latency_percentiles(latencies)
+    })
+    return result
@@ -0,0 +1,21 @@
+import hashlib
+from pathlib import Path
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """
+    Вычисление SHA-256 содержимого файла.
+
+    :param path: Путь к файлу
+    :param chunk_size: Размер читаемого блока в байтах, defaults to 1 МБ
+    :return: Хэш в шестнадцатеричном виде или пустая строка если файла нет
+    """
+    path = Path(path)
+    if not path.exists():
+        return ""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
@@ -0,0 +1,428 @@
+from typing import Dict, Optional, Set, Tuple
+import numpy as np
+import scipy.sparse as sp
+from similarity import ItemRatingMatrix, SIMILARITY_THRESHOLD, pearson_from_stats
+from neighbor_index import NeighborIndex, NeighborRows, select_top_neighbors
+from progress import ProgressReporter
+
+# Пара фильмов (a, b), a < b, хранится под ключом (a << PAIR_SHIFT) | b
+PAIR_SHIFT = 32
+PAIR_MASK = (1 << PAIR_SHIFT) - 1
+
+# Порядок столбцов статистик, если поменять фильмы пары местами
+_SWAPPED = [0, 2, 1, 4, 3, 5]
+
+
+def pair_keys(items: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """
+    Ключи неупорядоченных пар фильмов.
+
+    :param items: Позиции первых фильмов пар
+    :param others: Позиции вторых фильмов пар
+    :return: Ключи (min << PAIR_SHIFT) | max
+    """
+    items, others = np.asarray(items, dtype=np.int64), np.asarray(others, dtype=np.int64)
+    return (np.minimum(items, others) << PAIR_SHIFT) | np.maximum(items, others)
+
+
+def _find(table: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """
+    Номера ключей в отсортированном массиве.
+
+    :param table: Отсортированный массив ключей
+    :param keys: Искомые ключи
+    :return: Номера (-1 для отсутствующих ключей)
+    """
+    positions = np.searchsorted(table, keys)
+    found = positions < len(table)
+    found[found] = table[positions[found]] == keys[found]
+    return np.where(found, positions, -1)
+
+
+class PairStatistics:
+    """
+    Достаточные статистики корреляции Пирсона для всех пар фильмов с общими оценками.
+
+    Для пары (a, b), a < b — позиции фильмов в матрице оценок — хранятся количество общих
+    пользователей, суммы и суммы квадратов оценок каждого из фильмов по этим пользователям
+    и сумма произведений оценок. Пары лежат в отсортированном массиве ключей; для поиска
+    пар фильма, в которых он второй, хранится порядок ключей по второму фильму. Пары,
+    появившиеся после построения, добавляются в небольшую отдельную таблицу, чтобы не
+    копировать основную на каждую оценку, и переносятся в основную, когда их становится много.
+    """
+
+    def __init__(self, keys: np.ndarray, stats: np.ndarray) -> None:
+        """
+        Инициализация статистик.
+
+        :param keys: Отсортированные ключи пар (int64)
+        :param stats: Статистики пар shape (len(keys), 6): n, s_a, s_b, ss_a, ss_b, s_ab
+        """
+        self.keys = keys
+        self.stats = stats
+        self.new_keys = np.zeros(0, dtype=np.int64)
+        self.new_stats = np.zeros((0, 6))
+        self._index_second()
+
+    def _index_second(self) -> None:
+        """
+        Порядок ключей основной таблицы по второму фильму пары: пары (k, item) для всех k
+        занимают в нём непрерывный отрезок.
+        """
+        swapped = ((self.keys & PAIR_MASK) << PAIR_SHIFT) | (self.keys >> PAIR_SHIFT)
+        self.second_order = np.argsort(swapped, kind='stable')
+        self.second_keys = swapped[self.second_order]
+
+    @classmethod
+    def from_matrix(cls, matrix: ItemRatingMatrix, block_size: int = 256,
+                    progress: Optional[ProgressReporter] = None) -> "PairStatistics":
+        """
+        Подсчёт статистик всех пар блоками строк матрицы оценок.
+
+        :param matrix: Матрица оценок фильм x пользователь
+        :param block_size: Количество фильмов в блоке, defaults to 256
+        :param progress: Счётчик обработанных фильмов, defaults to None
+        :return: Статистики пар
+        """
+        keys, stats = [np.zeros(0, dtype=np.int64)], [np.zeros((0, 6))]
+        for start in range(0, matrix.n_items, block_size):
+            stop = min(start + block_size, matrix.n_items)
+            rows, cols, block = matrix.pair_stats_block(start, stop)
+            # Строки блока идут по возрастанию, столбцы в строке отсортированы: ключи упорядочены
+            keys.append((rows.astype(np.int64) << PAIR_SHIFT) | cols)
+            stats.append(block)
+            if progress is not None:
+                progress.advance(stop - start)
+        return cls(np.concatenate(keys), np.vstack(stats))
+
+    def __len__(self) -> int:
+        return len(self.keys) + len(self.new_keys)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Объём памяти статистик в байтах.
+        """
+        return (self.keys.nbytes + self.stats.nbytes + self.second_keys.nbytes + self.second_order.nbytes
+                + self.new_keys.nbytes + self.new_stats.nbytes)
+
+    def add(self, item: int, others: np.ndarray, delta_n: float, delta_s_item: float, delta_ss_item: float,
+            delta_s_others: np.ndarray, delta_ss_others: np.ndarray, delta_cross: np.ndarray) -> None:
+        """
+        Изменение статистик пар (item, j) для разных фильмов j из others.
+
+        :param item: Позиция фильма, оценку которого изменили
+        :param others: Позиции других фильмов пользователя
+        :param delta_n: Изменение количества общих пользователей (1 для новой оценки, иначе 0)
+        :param delta_s_item: Изменение суммы оценок item
+        :param delta_ss_item: Изменение суммы квадратов оценок item
+        :param delta_s_others: Изменения сумм оценок фильмов others
+        :param delta_ss_others: Изменения сумм квадратов оценок фильмов others
+        :param delta_cross: Изменения сумм произведений оценок
+        """
+        item_first = item < others
+        deltas = np.empty((len(others), 6))
+        deltas[:, 0] = delta_n
+        deltas[:, 1] = np.where(item_first, delta_s_item, delta_s_others)
+        deltas[:, 2] = np.where(item_first, delta_s_others, delta_s_item)
+        deltas[:, 3] = np.where(item_first, delta_ss_item, delta_ss_others)
+        deltas[:, 4] = np.where(item_first, delta_ss_others, delta_ss_item)
+        deltas[:, 5] = delta_cross
+        keys = pair_keys(np.full(len(others), item), others)
+
+        # Ключи уникальны, поэтому индексирование с присваиванием не теряет слагаемых
+        positions = _find(self.keys, keys)
+        found = positions >= 0
+        self.stats[positions[found]] += deltas[found]
+        keys, deltas = keys[~found], deltas[~found]
+        positions = _find(self.new_keys, keys)
+        found = positions >= 0
+        self.new_stats[positions[found]] += deltas[found]
+        keys, deltas = keys[~found], deltas[~found]
+        if len(keys):
+            order = np.argsort(keys)
+            at = np.searchsorted(self.new_keys, keys[order])
+            self.new_keys = np.insert(self.new_keys, at, keys[order])
+            self.new_stats = np.insert(self.new_stats, at, deltas[order], axis=0)
+
+    def pairs(self, items: np.ndarray, others: np.ndarray) -> np.ndarray:
+        """
+        Статистики пар (items[k], others[k]), упорядоченные так, что первым в паре идёт items[k].
+
+        :param items: Позиции первых фильмов пар
+        :param others: Позиции вторых фильмов пар
+        :return: Статистики shape (k, 6): n, s_item, s_other, ss_item, ss_other, s_item_other
+                 (нули для пар без общих пользователей)
+        """
+        keys = pair_keys(items, others)
+        stats = np.zeros((len(keys), 6))
+        for table_keys, table_stats in ((self.keys, self.stats), (self.new_keys, self.new_stats)):
+            positions = _find(table_keys, keys)
+            found = positions >= 0
+            stats[found] = table_stats[positions[found]]
+        swapped = np.asarray(others) < np.asarray(items)
+        stats[swapped] = stats[swapped][:, _SWAPPED]
+        return stats
+
+    def row(self, item: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Статистики всех пар фильма item, упорядоченные так, что первым в паре идёт item.
+
+        :param item: Позиция фильма
+        :return: Кортеж (позиции других фильмов, статистики shape (k, 6))
+        """
+        bounds = [item << PAIR_SHIFT, (item + 1) << PAIR_SHIFT]
+        # Пары (item, j), j > item, занимают непрерывный отрезок массива ключей
+        lo, hi = np.searchsorted(self.keys, bounds)
+        # Пары (k, item), k < item, — непрерывный отрезок в порядке по второму фильму
+        second_lo, second_hi = np.searchsorted(self.second_keys, bounds)
+        before_positions = self.second_order[second_lo:second_hi]
+        # Таблица новых пар мала (см. compact): в ней пары (k, item) ищутся просмотром
+        new_lo, new_hi = np.searchsorted(self.new_keys, bounds)
+        new_before = np.flatnonzero((self.new_keys & PAIR_MASK) == item)
+        others = np.concatenate([self.keys[before_positions] >> PAIR_SHIFT, self.keys[lo:hi] & PAIR_MASK,
+                                 self.new_keys[new_before] >> PAIR_SHIFT, self.new_keys[new_lo:new_hi] & PAIR_MASK])
+        stats = np.vstack([self.stats[before_positions][:, _SWAPPED], self.stats[lo:hi],
+                           self.new_stats[new_before][:, _SWAPPED], self.new_stats[new_lo:new_hi]])
+        return others, stats
+
+    def compact(self, threshold: Optional[int] = None) -> None:
+        """
+        Перенос новых пар в основную таблицу.
+
+        :param threshold: Перенос выполняется, если новых пар больше threshold
+                          (None — 1% от числа пар, но не меньше 1024), defaults to None
+        """
+        if threshold is None:
+            threshold = max(1024, len(self.keys) // 100)
+        if len(self.new_keys) <= threshold:
+            return None
+        keys = np.concatenate([self.keys, self.new_keys])
+        order = np.argsort(keys, kind='stable')
+        self.keys, self.stats = keys[order], np.vstack([self.stats, self.new_stats])[order]
+        self.new_keys, self.new_stats = np.zeros(0, dtype=np.int64), np.zeros((0, 6))
+        self._index_second()
+
+
+class IncrementalSimilarity:
+    """
+    Индекс соседей фильмов, обновляемый по новым и изменённым оценкам без полного перестроения.
+
+    Оценка пользователя u фильму m меняет статистики только пар (m, j) для фильмов j,
+    которые u уже оценил: у новой оценки появляется общий пользователь, у изменённой
+    меняются суммы m и сумма произведений. Поэтому список соседей m строится заново,
+    а в отсортированные списки соседей фильмов j вставляется новое сходство с m. Изменённые
+    списки заменяются в NeighborRows без копирования остальных. Стоимость обновления
+    пропорциональна количеству оценок пользователя и длине затронутых списков.
+
+    Сходства соседей дополнительно хранятся в float64, чтобы порядок равных во float32
+    сходств совпадал с полным построением.
+    """
+
+    def __init__(self, index: NeighborIndex, values: np.ndarray, stats: PairStatistics, min_common: int,
+                 max_neighbors: int) -> None:
+        """
+        Инициализация.
+
+        :param index: Индекс соседей, соответствующий статистикам
+        :param values: Сходства соседей индекса в float64 (в порядке index.data)
+        :param stats: Статистики пар фильмов
+        :param min_common: Минимальное количество общих пользователей
+        :param max_neighbors: Максимальное количество соседей на фильм (0 — без ограничения)
+        """
+        self._rows = NeighborRows(index, values)
+        self.stats = stats
+        self.min_common = min_common
+        self.max_neighbors = max_neighbors
+        # Позиции фильмов, списки соседей которых заменил последний вызов apply
+        self.changed = np.zeros(0, dtype=np.int64)
+
+    @property
+    def index(self) -> NeighborIndex:
+        """
+        Текущий индекс соседей.
+        """
+        return self._rows.index
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        Сходства соседей в float64 в порядке элементов index.data.
+        """
+        return self._rows.values
+
+    @classmethod
+    def build(cls, item_ids: np.ndarray, item_user_matrix: sp.csr_matrix, min_common: int, max_neighbors: int,
+              block_size: int = 256, progress: Optional[ProgressReporter] = None) -> "IncrementalSimilarity":
+        """
+        Подсчёт статистик пар и построение индекса соседей по ним.
+
+        :param item_ids: ID фильмов по строкам матрицы
+        :param item_user_matrix: Матрица оценок фильм x пользователь
+        :param min_common: Минимальное количество общих пользователей
+        :param max_neighbors: Максимальное количество соседей на фильм (0 — без ограничения)
+        :param block_size: Количество фильмов в блоке, defaults to 256
+        :param progress: Счётчик обработанных фильмов, defaults to None
+        :return: Индекс с обновлением по оценкам
+        """
+        stats = PairStatistics.from_matrix(ItemRatingMatrix(item_ids, item_user_matrix), block_size, progress)
+        similarity = cls(NeighborIndex.empty(), np.zeros(0), stats, min_common, max_neighbors)
+        keep, sim = similarity._pearson(stats.stats)
+        a, b, values = stats.keys[keep] >> PAIR_SHIFT, stats.keys[keep] & PAIR_MASK, sim[keep]
+        rows, cols, values = select_top_neighbors(np.concatenate([a, b]), np.concatenate([b, a]),
+                                                  np.concatenate([values, values]), max_neighbors)
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(item_ids)))])
+        similarity._rows = NeighborRows(NeighborIndex(item_ids, indptr, cols, values), values)
+        return similarity
+
+    def _pearson(self, stats: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Сходства по статистикам пар.
+
+        :param stats: Статистики shape (k, 6)
+        :return: Кортеж (признак сохранения в индексе, сходства)
+        """
+        valid, sim = pearson_from_stats(stats[:, 0], stats[:, 1], stats[:, 2], stats[:, 3], stats[:, 4],
+                                        stats[:, 5], self.min_common)
+        return valid & (np.abs(sim) > SIMILARITY_THRESHOLD), sim
+
+    def _full_row(self, item: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Список соседей фильма по статистикам всех его пар.
+
+        :param item: Позиция фильма
+        :return: Кортеж (позиции соседей, сходства) по убыванию сходства
+        """
+        others, stats = self.stats.row(item)
+        keep, sim = self._pearson(stats)
+        _, cols, vals = select_top_neighbors(np.zeros(keep.sum(), dtype=np.int64), others[keep], sim[keep],
+                                             self.max_neighbors)
+        return cols, vals
+
+    def _update_rows(self, touched: Dict[int, Set[int]]) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Обновление списков соседей фильмов, у которых изменились сходства только с некоторыми фильмами.
+
+        Изменившиеся сходства убираются из списка и вставляются на новое место. Если список был
+        обрезан до max_neighbors и сосед из него опустился ниже последнего, его место может занять
+        фильм, которого в списке нет, — такая строка строится заново по всем парам.
+
+        :param touched: Позиции фильмов и позиции фильмов с изменившимся сходством
+        :return: Новые строки {позиция: (позиции соседей, сходства)}
+        """
+        items = np.array(sorted(touched), dtype=np.int64)
+        changed_rows = np.repeat(items, [len(touched[item]) for item in items.tolist()])
+        changed_cols = np.fromiter((col for item in items.tolist() for col in sorted(touched[item])),
+                                   dtype=np.int64, count=len(changed_rows))
+        changed_keys = (changed_rows << PAIR_SHIFT) | changed_cols
+        changed_kept, changed_vals = self._pearson(self.stats.pairs(changed_rows, changed_cols))
+
+        # Текущие списки соседей: упорядочены по строке, убыванию сходства и позиции соседа
+        indexed = items[items < len(self.index)]
+        row_numbers, flat = self.index.gather_rows(indexed)
+        rows = indexed[row_numbers]
+        cols = self.index.indices[flat].astype(np.int64)
+        vals = self.values[flat]
+        listed = np.isin((rows << PAIR_SHIFT) | cols, changed_keys)
+
+        rebuild: Set[int] = set()
+        if self.max_neighbors > 0 and len(indexed):
+            counts = self.index.stops[indexed] - self.index.starts[indexed]
+            full = counts >= self.max_neighbors
+            ends = np.cumsum(counts)[full] - 1
+            last = dict(zip(indexed[full].tolist(), zip(vals[ends].tolist(), cols[ends].tolist())))
+            moved = np.isin(changed_keys, (rows[listed] << PAIR_SHIFT) | cols[listed])
+            for row, col, value, kept in zip(changed_rows[moved].tolist(), changed_cols[moved].tolist(),
+                                             changed_vals[moved].tolist(), changed_kept[moved].tolist()):
+                if row not in last:
+                    continue
+                last_val, last_col = last[row]
+                if not kept or col == last_col or value < last_val or (value == last_val and col > last_col):
+                    rebuild.add(row)
+
+        stay = ~listed
+        insert = changed_kept.copy()
+        if rebuild:
+            rebuilt = np.fromiter(rebuild, dtype=np.int64, count=len(rebuild))
+            stay &= ~np.isin(rows, rebuilt)
+            insert &= ~np.isin(changed_rows, rebuilt)
+        rows, cols, vals = rows[stay], cols[stay], vals[stay]
+
+        # Вставка новых сходств в отсортированные строки; равные позиции — в порядке (-сходство, столбец)
+        new_rows, new_cols, new_vals = changed_rows[insert], changed_cols[insert], changed_vals[insert]
+        order = np.lexsort((new_cols, -new_vals, new_rows))
+        new_rows, new_cols, new_vals = new_rows[order], new_cols[order], new_vals[order]
+        row_starts = np.searchsorted(rows, new_rows, side='left')
+        row_stops = np.searchsorted(rows, new_rows, side='right')
+        at = np.empty(len(new_rows), dtype=np.int64)
+        for k, (start, stop, col, value) in enumerate(zip(row_starts.tolist(), row_stops.tolist(),
+                                                          new_cols.tolist(), new_vals.tolist())):
+            negated = -vals[start:stop]
+            lo = start + int(np.searchsorted(negated, -value, side='left'))
+            hi = start + int(np.searchsorted(negated, -value, side='right'))
+            at[k] = lo + int(np.searchsorted(cols[lo:hi], col))
+        rows = np.insert(rows, at, new_rows)
+        cols = np.insert(cols, at, new_cols)
+        vals = np.insert(vals, at, new_vals)
+
+        starts, stops = np.searchsorted(rows, items, side='left'), np.searchsorted(rows, items, side='right')
+        if self.max_neighbors > 0:
+            stops = np.minimum(stops, starts + self.max_neighbors)
+        result = {item: (cols[start:stop], vals[start:stop])
+                  for item, start, stop in zip(items.tolist(), starts.tolist(), stops.tolist())}
+        for item in rebuild:
+            result[item] = self._full_row(item)
+        return result
+
+    def apply(self, user_item_matrix: sp.csr_matrix, item_ids: np.ndarray, users: np.ndarray, items: np.ndarray,
+              ratings: np.ndarray) -> NeighborIndex:
+        """
+        Учёт новых и изменённых оценок.
+
+        :param user_item_matrix: Матрица оценок пользователь x фильм до изменений
+                                 (новых пользователей и фильмов в ней может не быть)
+        :param item_ids: ID фильмов по позициям после изменений
+        :param users: Позиции пользователей
+        :param items: Позиции фильмов
+        :param ratings: Новые оценки
+        :return: Обновлённый индекс соседей
+        """
+        profiles: Dict[int, Dict[int, float]] = {}
+        changed_items: Set[int] = set()
+        touched: Dict[int, Set[int]] = {}
+        for user, item, rating in zip(users.tolist(), items.tolist(), ratings.tolist()):
+            profile = profiles.get(user)
+            if profile is None:
+                profile = {}
+                if user < user_item_matrix.shape[0]:
+                    start, stop = user_item_matrix.indptr[user], user_item_matrix.indptr[user + 1]
+                    profile = dict(zip(user_item_matrix.indices[start:stop].tolist(),
+                                       user_item_matrix.data[start:stop].tolist()))
+                profiles[user] = profile
+            old = profile.get(item)
+            if old == rating:
+                continue
+            profile[item] = rating
+            others = np.fromiter((j for j in profile if j != item), dtype=np.int64, count=len(profile) - 1)
+            if len(others) == 0:
+                continue
+            other_ratings = np.fromiter((profile[j] for j in others.tolist()), dtype=np.float64, count=len(others))
+            if old is None:
+                self.stats.add(item, others, 1.0, rating, rating * rating, other_ratings, other_ratings ** 2,
+                               rating * other_ratings)
+            else:
+                zeros = np.zeros(len(others))
+                self.stats.add(item, others, 0.0, rating - old, rating * rating - old * old, zeros, zeros,
+                               (rating - old) * other_ratings)
+            changed_items.add(item)
+            for j in others.tolist():
+                touched.setdefault(j, set()).add(item)
+
+        rows = {item: self._full_row(item) for item in changed_items}
+        for item in changed_items:
+            touched.pop(item, None)
+        if touched:
+            rows.update(self._update_rows(touched))
+        self.stats.compact()
+        self.changed = np.array(sorted(rows), dtype=np.int64)
+        return self._rows.replace(item_ids, rows)
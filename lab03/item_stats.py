@@ -0,0 +1,262 @@
+from typing import List, Optional, Tuple
+import numpy as np
+import scipy.sparse as sp
+
+# Средняя оценка для фильмов без оценок, как и раньше в predict_rating
+DEFAULT_MEAN = 3.0
+
+
+class _ItemArrays:
+    """
+    Неизменяемый набор массивов статистики, который заменяется целиком одним присваиванием.
+    """
+
+    __slots__ = ("movie_ids", "positions", "counts", "sums", "means", "popular_order", "popular_rank")
+
+    def __init__(self, movie_ids: np.ndarray, positions: np.ndarray, counts: np.ndarray, sums: np.ndarray) -> None:
+        """
+        Расчёт средних и порядка популярности по количествам и суммам оценок.
+
+        :param movie_ids: ID фильмов
+        :param positions: Позиции фильмов по ID (-1 — фильма нет)
+        :param counts: Количество оценок каждого фильма
+        :param sums: Сумма оценок каждого фильма
+        """
+        self.movie_ids = movie_ids
+        self.positions = positions
+        self.counts = counts
+        self.sums = sums
+        self.means = np.where(counts > 0, sums / np.maximum(counts, 1), DEFAULT_MEAN)
+        # Порядок популярности: по убыванию числа оценок, затем по ID
+        order = np.lexsort((movie_ids, -counts.astype(np.int64)))
+        self.popular_order = order[counts[order] > 0]
+        self.popular_rank = np.full(len(movie_ids), -1, dtype=np.int32)
+        self.popular_rank[self.popular_order] = np.arange(len(self.popular_order), dtype=np.int32)
+
+    def position(self, movie_id: int) -> Optional[int]:
+        """
+        Позиция фильма в массивах или None если фильма нет.
+        """
+        if movie_id < 0 or movie_id >= len(self.positions):
+            return None
+        pos = int(self.positions[movie_id])
+        return pos if pos >= 0 else None
+
+    def positions_for(self, movie_ids: np.ndarray) -> np.ndarray:
+        """
+        Позиции массива фильмов в массивах (-1 для фильмов без статистики).
+        """
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        known = (movie_ids >= 0) & (movie_ids < len(self.positions))
+        positions = np.full(len(movie_ids), -1, dtype=np.int64)
+        positions[known] = self.positions[movie_ids[known]]
+        return positions
+
+
+class ItemStatistics:
+    """
+    Статистика фильмов в массивах: количество оценок, сумма, средняя оценка и порядок популярности.
+
+    Строится один раз при загрузке данных. При изменении оценок новые массивы собираются
+    заранее и подставляются одним присваиванием: методы читают их в исполнителе, пока
+    цикл событий добавляет оценки, и всегда видят согласованный набор.
+    """
+
+    def __init__(self, movie_ids: np.ndarray, counts: np.ndarray, sums: np.ndarray) -> None:
+        """
+        Инициализация статистики.
+
+        :param movie_ids: ID фильмов
+        :param counts: Количество оценок каждого фильма
+        :param sums: Сумма оценок каждого фильма
+        """
+        movie_ids = np.asarray(movie_ids, dtype=np.int32)
+        max_id = int(movie_ids.max()) if len(movie_ids) else -1
+        positions = np.full(max_id + 1, -1, dtype=np.int32)
+        positions[movie_ids] = np.arange(len(movie_ids), dtype=np.int32)
+        self._arrays = _ItemArrays(movie_ids, positions, np.asarray(counts, dtype=np.int32).copy(),
+                                   np.asarray(sums, dtype=np.float64).copy())
+
+    @classmethod
+    def from_matrix(cls, movie_ids: np.ndarray, user_item_matrix: sp.spmatrix) -> "ItemStatistics":
+        """
+        Построение статистики по разреженной матрице оценок пользователь x фильм.
+
+        :param movie_ids: ID фильмов в порядке столбцов матрицы
+        :param user_item_matrix: Матрица оценок (элемент отсутствует — нет оценки)
+        :return: Статистика фильмов
+        """
+        matrix = user_item_matrix.tocsr()
+        n_movies = len(movie_ids)
+        counts = np.bincount(matrix.indices, minlength=n_movies)
+        sums = np.bincount(matrix.indices, weights=matrix.data.astype(np.float64), minlength=n_movies)
+        return cls(movie_ids, counts, sums)
+
+    @property
+    def movie_ids(self) -> np.ndarray:
+        """
+        ID фильмов по позициям.
+        """
+        return self._arrays.movie_ids
+
+    @property
+    def counts(self) -> np.ndarray:
+        """
+        Количество оценок по позициям фильмов.
+        """
+        return self._arrays.counts
+
+    @property
+    def means(self) -> np.ndarray:
+        """
+        Средние оценки по позициям фильмов.
+        """
+        return self._arrays.means
+
+    def position(self, movie_id: int) -> Optional[int]:
+        """
+        Позиция фильма в массивах статистики.
+
+        :param movie_id: ID фильма
+        :return: Позиция или None если по фильму нет статистики
+        """
+        return self._arrays.position(movie_id)
+
+    def positions_for(self, movie_ids: np.ndarray) -> np.ndarray:
+        """
+        Позиции массива фильмов в массивах статистики.
+
+        :param movie_ids: ID фильмов
+        :return: Массив позиций (-1 для фильмов без статистики)
+        """
+        return self._arrays.positions_for(movie_ids)
+
+    def counts_for(self, movie_ids: np.ndarray) -> np.ndarray:
+        """
+        Количество оценок для массива фильмов.
+
+        :param movie_ids: ID фильмов
+        :return: Массив количеств оценок (0 для фильмов без статистики)
+        """
+        arrays = self._arrays
+        positions = arrays.positions_for(movie_ids)
+        return np.where(positions >= 0, arrays.counts[positions], 0)
+
+    def __contains__(self, movie_id: int) -> bool:
+        arrays = self._arrays
+        pos = arrays.position(movie_id)
+        return pos is not None and arrays.counts[pos] > 0
+
+    def mean(self, movie_id: int) -> float:
+        """
+        Средняя оценка фильма.
+
+        :param movie_id: ID фильма
+        :return: Средняя оценка или DEFAULT_MEAN если оценок нет
+        """
+        arrays = self._arrays
+        pos = arrays.position(movie_id)
+        return float(arrays.means[pos]) if pos is not None else DEFAULT_MEAN
+
+    def means_for(self, movie_ids: np.ndarray) -> np.ndarray:
+        """
+        Средние оценки для массива фильмов.
+
+        :param movie_ids: ID фильмов
+        :return: Массив средних оценок (DEFAULT_MEAN для фильмов без статистики)
+        """
+        arrays = self._arrays
+        positions = arrays.positions_for(movie_ids)
+        return np.where(positions >= 0, arrays.means[positions], DEFAULT_MEAN)
+
+    def count(self, movie_id: int) -> int:
+        """
+        Количество оценок фильма.
+
+        :param movie_id: ID фильма
+        :return: Количество оценок
+        """
+        arrays = self._arrays
+        pos = arrays.position(movie_id)
+        return int(arrays.counts[pos]) if pos is not None else 0
+
+    def top_popular(self, n: int) -> List[int]:
+        """
+        Топ-N фильмов по количеству оценок.
+
+        :param n: Количество фильмов
+        :return: Список ID фильмов
+        """
+        arrays = self._arrays
+        return arrays.movie_ids[arrays.popular_order[:max(0, n)]].tolist()
+
+    def popularity_rank(self, movie_id: int) -> Optional[int]:
+        """
+        Место фильма в рейтинге популярности (с 1).
+
+        :param movie_id: ID фильма
+        :return: Место или None если оценок нет
+        """
+        arrays = self._arrays
+        pos = arrays.position(movie_id)
+        if pos is None:
+            return None
+        rank = int(arrays.popular_rank[pos])
+        return rank + 1 if rank >= 0 else None
+
+    def ranks_for(self, movie_ids: np.ndarray) -> np.ndarray:
+        """
+        Места массива фильмов в рейтинге популярности (с 0).
+
+        :param movie_ids: ID фильмов
+        :return: Массив мест (len(movie_ids) и больше для фильмов без оценок)
+        """
+        arrays = self._arrays
+        positions = arrays.positions_for(movie_ids)
+        ranks = np.where(positions >= 0, arrays.popular_rank[positions], -1).astype(np.int64)
+        return np.where(ranks >= 0, ranks, len(arrays.movie_ids) + np.arange(len(ranks)))
+
+    def apply_changes(self, movie_ids: np.ndarray, old_ratings: np.ndarray, new_ratings: np.ndarray) -> None:
+        """
+        Обновление статистики при изменении оценок: новые массивы подставляются одним присваиванием.
+
+        :param movie_ids: ID фильмов для каждого изменения
+        :param old_ratings: Прежние оценки (NaN — оценки не было)
+        :param new_ratings: Новые оценки (NaN — оценка удалена)
+        """
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        if len(movie_ids) == 0:
+            return None
+        arrays = self._arrays
+        all_ids, positions = arrays.movie_ids, arrays.positions
+        added = np.unique(movie_ids[arrays.positions_for(movie_ids) < 0])
+        if len(added):
+            # Новые фильмы добавляются в конец массивов
+            all_ids = np.concatenate([all_ids, added.astype(np.int32)])
+            grown = np.full(max(len(positions), int(added.max()) + 1), -1, dtype=np.int32)
+            grown[:len(positions)] = positions
+            grown[added] = np.arange(len(arrays.movie_ids), len(all_ids), dtype=np.int32)
+            positions = grown
+        counts = np.zeros(len(all_ids), dtype=np.int32)
+        counts[:len(arrays.counts)] = arrays.counts
+        sums = np.zeros(len(all_ids))
+        sums[:len(arrays.sums)] = arrays.sums
+
+        changed = positions[movie_ids]
+        old_ratings = np.asarray(old_ratings, dtype=np.float64)
+        new_ratings = np.asarray(new_ratings, dtype=np.float64)
+        delta_count = (~np.isnan(new_ratings)).astype(np.int32) - (~np.isnan(old_ratings)).astype(np.int32)
+        np.add.at(counts, changed, delta_count)
+        np.add.at(sums, changed, np.nan_to_num(new_ratings) - np.nan_to_num(old_ratings))
+        self._arrays = _ItemArrays(all_ids, positions, counts, sums)
+
+    def describe(self, movie_id: int) -> Optional[Tuple[float, int, int]]:
+        """
+        Сводка по фильму для вывода пользователю.
+
+        :param movie_id: ID фильма
+        :return: Кортеж (средняя оценка, количество оценок, место по популярности) или None
+        """
+        if movie_id not in self:
+            return None
+        return self.mean(movie_id), self.count(movie_id), self.popularity_rank(movie_id)
@@ -0,0 +1,325 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
+from pathlib import Path
+import numpy as np
+import scipy.sparse as sp
+from data_handler import DataProcessor
+from array_store import load_arrays, save_arrays
+from collab_filtering import popular_recommendations
+from fingerprint import file_sha256
+from progress import ProgressReporter
+
+# Сигнатура файла с факторами модели, формат описан в array_store
+MAGIC = b"MFMODEL\0"
+
+
+def _solve_rows(matrix: sp.csr_matrix, residuals: np.ndarray, fixed: np.ndarray, reg: float,
+                block_rows: int = 2048) -> np.ndarray:
+    """
+    Шаг ALS: факторы строк матрицы при фиксированных факторах столбцов.
+
+    Для строки u решается система (Y_u^T Y_u + reg * n_u * I) x_u = Y_u^T r_u, где Y_u — факторы
+    оценённых столбцов, r_u — остатки оценок, n_u — их количество. Матрицы Y_u^T Y_u строк блока
+    считаются матричным умножением по строке, системы блока решаются одним вызовом.
+
+    :param matrix: Матрица оценок в формате CSR (строки — решаемая сторона)
+    :param residuals: Остатки оценок в порядке matrix.data
+    :param fixed: Факторы столбцов, shape (n_cols, factors)
+    :param reg: Коэффициент регуляризации
+    :param block_rows: Количество строк в блоке, defaults to 2048
+    :return: Факторы строк, shape (n_rows, factors); у строк без оценок — нули
+    """
+    n_rows, factors = matrix.shape[0], fixed.shape[1]
+    result = np.zeros((n_rows, factors), dtype=np.float32)
+    indptr, indices = matrix.indptr, matrix.indices
+    counts = np.diff(indptr)
+    fixed = fixed.astype(np.float64)
+    identity = np.eye(factors)
+    for start in range(0, n_rows, block_rows):
+        rows = start + np.flatnonzero(counts[start:start + block_rows])
+        if len(rows) == 0:
+            continue
+        gram = np.empty((len(rows), factors, factors))
+        rhs = np.empty((len(rows), factors))
+        for i, row in enumerate(rows.tolist()):
+            y = fixed[indices[indptr[row]:indptr[row + 1]]]
+            gram[i] = y.T @ y
+            rhs[i] = residuals[indptr[row]:indptr[row + 1]] @ y
+        gram += reg * counts[rows, None, None] * identity
+        result[rows] = np.linalg.solve(gram, rhs[..., None])[..., 0]
+    return result
+
+
+class MatrixFactorization:
+    """
+    Рекомендации на основе матричного разложения, обучаемого чередующимися наименьшими квадратами (ALS).
+
+    Оценка моделируется как mean + b_item + b_user + p_user · q_item. Обучение линейно по
+    количеству оценок, предсказание — скалярное произведение. Локальные пользователи бота
+    не входят в обучение: их смещение и факторы вычисляются по их оценкам при запросе
+    (fold-in) одним шагом ALS при фиксированных факторах фильмов.
+    """
+
+    def __init__(self, data_processor: DataProcessor, factors: int = 32, iterations: int = 10,
+                 reg: float = 0.05, bias_reg: float = 10.0, model_path: str = "", seed: int = 42) -> None:
+        """
+        Инициализация модели.
+
+        :param data_processor: Обработчик данных
+        :param factors: Размерность факторов, defaults to 32
+        :param iterations: Количество итераций ALS, defaults to 10
+        :param reg: Коэффициент регуляризации факторов (умножается на число оценок), defaults to 0.05
+        :param bias_reg: Коэффициент регуляризации смещений, defaults to 10.0
+        :param model_path: Путь к файлу с факторами (пустая строка — без сохранения), defaults to ""
+        :param seed: Зерно начальных факторов, defaults to 42
+        """
+        self.dp = data_processor
+        self.factors = max(1, factors)
+        self.iterations = max(1, iterations)
+        self.reg = reg
+        self.bias_reg = bias_reg
+        self.seed = seed
+        self.model_path = Path(model_path) if model_path else None
+        self.movie_ids = np.zeros(0, dtype=np.int32)
+        self.global_mean = 0.0
+        self.item_bias = np.zeros(0, dtype=np.float32)
+        self.item_factors = np.zeros((0, self.factors), dtype=np.float32)
+        self._positions = np.zeros(0, dtype=np.int32)
+        self._built = False
+        self.build_progress: Optional[ProgressReporter] = None
+        self._build_lock = asyncio.Lock()
+
+    @property
+    def is_built(self) -> bool:
+        """
+        Модель обучена или загружена из файла.
+        """
+        return self._built
+
+    async def warm_up(self) -> None:
+        """
+        Загрузка факторов из файла или обучение модели заранее, до первого запроса.
+        """
+        await self._ensure_built()
+
+    async def _ensure_built(self) -> None:
+        """
+        Гарантирует что модель обучена
+        """
+        if self._built:
+            return None
+        async with self._build_lock:
+            if not self._built:
+                if await self._load():
+                    return None
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, self.train)
+                await self._save()
+
+    async def _model_meta(self) -> Dict:
+        """
+        Параметры обучения и отпечаток датасета, которым должен соответствовать файл факторов.
+        """
+        ratings_path = Path(self.dp.config.get("dataset_users_path", "data/u.data"))
+        loop = asyncio.get_running_loop()
+        ratings_hash = await loop.run_in_executor(None, file_sha256, ratings_path)
+        return {
+            'ratings_sha256': ratings_hash,
+            'factors': self.factors,
+            'iterations': self.iterations,
+            'reg': self.reg,
+            'bias_reg': self.bias_reg,
+            'seed': self.seed
+        }
+
+    async def _load(self) -> bool:
+        """
+        Открывает факторы из файла через mmap, если они обучены на том же датасете.
+        """
+        if self.model_path is None:
+            return False
+        try:
+            arrays = load_arrays(self.model_path, MAGIC, await self._model_meta())
+            if arrays is not None:
+                self._set_model(arrays["movie_ids"], float(arrays["global_mean"][0]), arrays["item_bias"],
+                                arrays["item_factors"].reshape(-1, self.factors))
+                print("Факторы модели загружены из файла")
+                return True
+        except Exception as e:
+            print(f"Ошибка загрузки факторов модели: {e}")
+        return False
+
+    async def _save(self) -> None:
+        """
+        Сохраняет факторы модели в файл.
+        """
+        if self.model_path is None:
+            return None
+        try:
+            arrays = {"movie_ids": self.movie_ids, "global_mean": np.array([self.global_mean]),
+                      "item_bias": self.item_bias, "item_factors": self.item_factors}
+            save_arrays(self.model_path, MAGIC, arrays, await self._model_meta())
+            print("Факторы модели сохранены в файл")
+        except Exception as e:
+            print(f"Ошибка сохранения факторов модели: {e}")
+
+    def _set_model(self, movie_ids: np.ndarray, global_mean: float, item_bias: np.ndarray,
+                   item_factors: np.ndarray) -> None:
+        """
+        Установка параметров модели и таблицы позиций фильмов.
+        """
+        self.movie_ids = np.asarray(movie_ids, dtype=np.int32)
+        self.global_mean = global_mean
+        self.item_bias = item_bias
+        self.item_factors = item_factors
+        size = int(self.movie_ids.max()) + 1 if len(self.movie_ids) else 0
+        self._positions = np.full(size, -1, dtype=np.int32)
+        self._positions[self.movie_ids] = np.arange(len(self.movie_ids), dtype=np.int32)
+        self._built = True
+
+    def train(self) -> None:
+        """
+        Обучение модели на матрице оценок: смещения, затем iterations шагов ALS по остаткам.
+        """
+        users = self.dp.user_item_matrix
+        if not users.has_sorted_indices:
+            users = users.sorted_indices()
+        items = users.T.tocsr()
+        items.sort_indices()
+        print(f"Начинаю обучение матричного разложения (факторов: {self.factors}, итераций: {self.iterations})...")
+        progress = self.build_progress = ProgressReporter(self.iterations, "итераций")
+
+        ratings = users.data.astype(np.float64)
+        global_mean = float(ratings.mean()) if len(ratings) else 0.0
+        user_rows = np.repeat(np.arange(users.shape[0]), np.diff(users.indptr))
+        item_counts = np.bincount(users.indices, minlength=users.shape[1])
+        item_bias = np.bincount(users.indices, weights=ratings - global_mean,
+                                minlength=users.shape[1]) / (item_counts + self.bias_reg)
+        user_bias = np.bincount(user_rows, weights=ratings - global_mean - item_bias[users.indices],
+                                minlength=users.shape[0]) / (np.diff(users.indptr) + self.bias_reg)
+        residuals = ratings - global_mean - item_bias[users.indices] - user_bias[user_rows]
+        # Остатки в порядке оценок матрицы фильм x пользователь
+        item_residuals = sp.csr_matrix((residuals, users.indices, users.indptr), shape=users.shape).T.tocsr()
+        item_residuals.sort_indices()
+
+        rng = np.random.default_rng(self.seed)
+        item_factors = (rng.standard_normal((users.shape[1], self.factors)) * 0.1).astype(np.float32)
+        for _ in range(self.iterations):
+            user_factors = _solve_rows(users, residuals, item_factors, self.reg)
+            item_factors = _solve_rows(items, item_residuals.data, user_factors, self.reg)
+            progress.advance()
+
+        self._set_model(self.dp.movie_ids, global_mean, item_bias.astype(np.float32), item_factors)
+        print(f"Матричное разложение обучено за {progress.elapsed:.1f} с.")
+
+    def positions_for(self, movie_ids: np.ndarray) -> np.ndarray:
+        """
+        Позиции фильмов в модели.
+
+        :param movie_ids: ID фильмов
+        :return: Позиции (-1 для фильмов, которых нет в модели)
+        """
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        result = np.full(len(movie_ids), -1, dtype=np.int32)
+        known = (movie_ids >= 0) & (movie_ids < len(self._positions))
+        result[known] = self._positions[movie_ids[known]]
+        return result
+
+    def fold_in(self, user_ratings: Dict[int, float]) -> Optional[Tuple[float, np.ndarray]]:
+        """
+        Смещение и факторы пользователя по его оценкам при фиксированных факторах фильмов.
+
+        :param user_ratings: Оценки пользователя
+        :return: Кортеж (смещение, факторы) или None если ни один оценённый фильм не известен модели
+        """
+        rated_ids = np.fromiter(user_ratings.keys(), dtype=np.int64, count=len(user_ratings))
+        positions = self.positions_for(rated_ids)
+        known = positions >= 0
+        if not known.any():
+            return None
+        positions = positions[known]
+        ratings = np.fromiter(user_ratings.values(), dtype=np.float64, count=len(user_ratings))[known]
+        deviations = ratings - self.global_mean - self.item_bias[positions]
+        user_bias = float(deviations.sum() / (len(deviations) + self.bias_reg))
+        y = self.item_factors[positions].astype(np.float64)
+        gram = y.T @ y + self.reg * len(positions) * np.eye(self.factors)
+        user_factors = np.linalg.solve(gram, y.T @ (deviations - user_bias))
+        return user_bias, user_factors
+
+    def _scores(self, user_ratings: Dict[int, float], positions: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """
+        Предсказанные оценки пользователя по всем фильмам модели или по заданным позициям.
+        """
+        folded = self.fold_in(user_ratings)
+        if folded is None:
+            return None
+        user_bias, user_factors = folded
+        bias = self.item_bias if positions is None else self.item_bias[positions]
+        factors = self.item_factors if positions is None else self.item_factors[positions]
+        return np.clip(self.global_mean + user_bias + bias + factors @ user_factors, 1.0, 5.0)
+
+    def predict_rating(self, user_ratings: Dict[int, float], item_id: int) -> Optional[float]:
+        """
+        Предсказание рейтинга пользователя для заданного фильма.
+
+        :param user_ratings: Оценки пользователя
+        :param item_id: ID целевого фильма
+        :return: Предсказанный рейтинг или None если предсказание невозможно
+        """
+        prediction = self.predict_ratings(user_ratings, [item_id])[0]
+        return None if np.isnan(prediction) else float(prediction)
+
+    def predict_ratings(self, user_ratings: Dict[int, float], item_ids: Sequence[int]) -> np.ndarray:
+        """
+        Пакетное предсказание рейтингов пользователя для набора фильмов.
+
+        :param user_ratings: Оценки пользователя
+        :param item_ids: ID целевых фильмов
+        :return: Массив предсказаний в порядке item_ids (NaN если предсказание невозможно)
+        """
+        positions = self.positions_for(np.asarray(item_ids, dtype=np.int64))
+        predictions = np.full(len(positions), np.nan)
+        if not user_ratings or len(positions) == 0:
+            return predictions
+        known = positions >= 0
+        scores = self._scores(user_ratings, positions[known])
+        if scores is not None:
+            predictions[known] = scores
+        return predictions
+
+    async def generate_recommendations(self, virtual_user_ratings: Dict[int, float],
+                                       num_recommendations: Optional[int] = 5, include_genres: int = 0,
+                                       exclude_genres: int = 0) -> List[Tuple[int, float]]:
+        """
+        Генерация рекомендаций для пользователя.
+
+        Оцениваются все фильмы модели, подходящие под фильтр жанров, кроме уже оценённых.
+
+        :param virtual_user_ratings: Оценки пользователя
+        :param num_recommendations: Количество рекомендаций (None — весь ранжированный список), defaults to 5
+        :param include_genres: Маска жанров, хотя бы один из которых должен быть у фильма (0 — любые), defaults to 0
+        :param exclude_genres: Маска исключаемых жанров, defaults to 0
+        :return: Список кортежей (movie_id, predicted_rating)
+        """
+        await self._ensure_built()
+
+        scores = self._scores(virtual_user_ratings) if virtual_user_ratings else None
+        if scores is None:
+            # Холодный старт: модели не известен ни один оценённый фильм
+            return popular_recommendations(self.dp, virtual_user_ratings, num_recommendations,
+                                           include_genres, exclude_genres)
+
+        allowed = self.dp.genre_filter(self.movie_ids, include_genres, exclude_genres) & (scores > 3.0)
+        rated_positions = self.positions_for(np.fromiter(virtual_user_ratings.keys(), dtype=np.int64))
+        allowed[rated_positions[rated_positions >= 0]] = False
+        candidates = np.flatnonzero(allowed)
+        if len(candidates) == 0:
+            # Как в item_cf: ни один неоценённый фильм не получил оценку выше 3 или не прошёл фильтр жанров
+            return popular_recommendations(self.dp, virtual_user_ratings, num_recommendations,
+                                           include_genres, exclude_genres)
+        if num_recommendations is not None and num_recommendations < len(candidates):
+            top = np.argpartition(-scores[candidates], num_recommendations)[:num_recommendations]
+            candidates = candidates[top]
+        order = np.lexsort((self.movie_ids[candidates], -scores[candidates]))
+        candidates = candidates[order]
+        return list(zip(self.movie_ids[candidates].tolist(), scores[candidates].tolist()))
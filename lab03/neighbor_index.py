@@ -0,0 +1,347 @@
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+
+
+def select_top_neighbors(rows: np.ndarray, cols: np.ndarray, vals: np.ndarray,
+                         max_neighbors: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Отбор для каждой строки не более max_neighbors соседей с наибольшим сходством.
+
+    :param rows: Позиции фильмов
+    :param cols: Позиции соседей
+    :param vals: Значения сходства
+    :param max_neighbors: Максимальное количество соседей на фильм (0 — без ограничения)
+    :return: Кортеж (строки, столбцы, значения), упорядоченный по строке и убыванию сходства
+    """
+    order = np.lexsort((cols, -vals, rows))
+    rows, cols, vals = rows[order], cols[order], vals[order]
+    if max_neighbors > 0 and len(rows):
+        row_start = np.searchsorted(rows, rows, side='left')
+        keep = np.arange(len(rows)) - row_start < max_neighbors
+        rows, cols, vals = rows[keep], cols[keep], vals[keep]
+    return rows, cols, vals
+
+
+class NeighborIndex:
+    """
+    Компактное хранилище ближайших соседей фильмов в формате CSR.
+
+    Для фильма на позиции p его соседи лежат в indices[starts[p]:stops[p]]
+    (позиции в item_ids) со значениями сходства в data, по убыванию сходства. У индекса,
+    собранного по indptr, строки идут подряд: starts и stops — срезы indptr. Индекс из
+    from_ranges (NeighborRows) хранит строки в общих буферах по произвольным отрезкам,
+    indptr у него нет.
+    """
+
+    def __init__(self, item_ids: np.ndarray, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray) -> None:
+        """
+        Инициализация индекса соседей.
+
+        :param item_ids: ID фильмов по позициям (int32)
+        :param indptr: Границы строк, длина len(item_ids) + 1 (int32)
+        :param indices: Позиции соседей (int32)
+        :param data: Значения сходства (float32)
+        """
+        self.item_ids = np.asarray(item_ids, dtype=np.int32)
+        self.indptr = np.asarray(indptr, dtype=np.int32)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.data = np.asarray(data, dtype=np.float32)
+        self.starts = self.indptr[:-1]
+        self.stops = self.indptr[1:]
+        self._positions = self._position_lookup(self.item_ids)
+
+    @staticmethod
+    def _position_lookup(item_ids: np.ndarray) -> np.ndarray:
+        """
+        Массив соответствия ID фильма -> позиция (-1 — фильма нет).
+        """
+        max_id = int(item_ids.max()) if len(item_ids) else -1
+        positions = np.full(max_id + 2, -1, dtype=np.int32)
+        positions[item_ids] = np.arange(len(item_ids), dtype=np.int32)
+        return positions
+
+    @classmethod
+    def from_ranges(cls, item_ids: np.ndarray, starts: np.ndarray, stops: np.ndarray, indices: np.ndarray,
+                    data: np.ndarray, positions: Optional[np.ndarray] = None) -> "NeighborIndex":
+        """
+        Индекс, строки которого лежат в indices/data по отрезкам [starts[p], stops[p]).
+
+        Массивы не копируются; элементы вне отрезков не читаются.
+
+        :param item_ids: ID фильмов по позициям (int32)
+        :param starts: Начала строк
+        :param stops: Концы строк
+        :param indices: Буфер позиций соседей (int32)
+        :param data: Буфер значений сходства (float32)
+        :param positions: Готовый массив ID -> позиция для тех же item_ids (None — построить), defaults to None
+        :return: Индекс соседей без indptr
+        """
+        index = cls.__new__(cls)
+        index.item_ids = np.asarray(item_ids, dtype=np.int32)
+        index.indptr = None
+        index.indices = indices
+        index.data = data
+        index.starts = np.asarray(starts, dtype=np.int64)
+        index.stops = np.asarray(stops, dtype=np.int64)
+        index._positions = positions if positions is not None else cls._position_lookup(index.item_ids)
+        return index
+
+    @classmethod
+    def empty(cls) -> "NeighborIndex":
+        """
+        Пустой индекс без фильмов.
+        """
+        return cls(np.zeros(0, np.int32), np.zeros(1, np.int32), np.zeros(0, np.int32), np.zeros(0, np.float32))
+
+    @classmethod
+    def from_blocks(cls, item_ids: np.ndarray,
+                    blocks: Iterable[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+                    max_neighbors: int) -> "NeighborIndex":
+        """
+        Сборка индекса из блоков (строки, столбцы, значения) с позициями фильмов.
+
+        :param item_ids: ID фильмов по позициям
+        :param blocks: Блоки пар, каждая строка целиком лежит в одном блоке
+        :param max_neighbors: Максимальное количество соседей на фильм (0 — без ограничения)
+        :return: Индекс соседей
+        """
+        parts = [select_top_neighbors(rows, cols, vals, max_neighbors) for rows, cols, vals in blocks]
+        if parts:
+            rows = np.concatenate([p[0] for p in parts])
+            cols = np.concatenate([p[1] for p in parts])
+            vals = np.concatenate([p[2] for p in parts])
+            order = np.argsort(rows, kind='stable')
+            rows, cols, vals = rows[order], cols[order], vals[order]
+        else:
+            rows = cols = np.zeros(0, np.int32)
+            vals = np.zeros(0, np.float32)
+        counts = np.bincount(rows, minlength=len(item_ids))
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        return cls(item_ids, indptr, cols, vals)
+
+    @classmethod
+    def from_dict(cls, sim: Dict[int, Dict[int, float]], max_neighbors: int) -> "NeighborIndex":
+        """
+        Сборка индекса из словаря сходств {movie_id: {movie_id: similarity}}.
+
+        :param sim: Словарь сходств
+        :param max_neighbors: Максимальное количество соседей на фильм (0 — без ограничения)
+        :return: Индекс соседей
+        """
+        item_ids = np.array(sorted(set(sim) | {j for row in sim.values() for j in row}), dtype=np.int32)
+        positions = {int(item_id): pos for pos, item_id in enumerate(item_ids)}
+        rows, cols, vals = [], [], []
+        for item_i, row in sim.items():
+            for item_j, value in row.items():
+                rows.append(positions[item_i])
+                cols.append(positions[item_j])
+                vals.append(value)
+        block = (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64), np.array(vals, dtype=np.float64))
+        return cls.from_blocks(item_ids, [block], max_neighbors)
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Объём памяти массивов индекса в байтах.
+        """
+        bounds = self.indptr.nbytes if self.indptr is not None else self.starts.nbytes + self.stops.nbytes
+        return self.item_ids.nbytes + bounds + self.indices.nbytes + self.data.nbytes + self._positions.nbytes
+
+    def position(self, movie_id: int) -> Optional[int]:
+        """
+        Позиция фильма в индексе.
+
+        :param movie_id: ID фильма
+        :return: Позиция или None если фильма нет в индексе
+        """
+        if movie_id < 0 or movie_id >= len(self._positions):
+            return None
+        pos = int(self._positions[movie_id])
+        return pos if pos >= 0 else None
+
+    def positions_for(self, movie_ids: np.ndarray) -> np.ndarray:
+        """
+        Позиции массива фильмов в индексе.
+
+        :param movie_ids: ID фильмов
+        :return: Массив позиций (-1 для фильмов, которых нет в индексе)
+        """
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        known = (movie_ids >= 0) & (movie_ids < len(self._positions))
+        positions = np.full(len(movie_ids), -1, dtype=np.int64)
+        positions[known] = self._positions[movie_ids[known]]
+        return positions
+
+    def gather_rows(self, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Плоские индексы элементов строк для набора позиций.
+
+        :param positions: Позиции фильмов в индексе
+        :return: Кортеж (номер строки в positions для каждого элемента, индекс элемента в indices/data)
+        """
+        starts = self.starts[positions].astype(np.int64)
+        lengths = self.stops[positions].astype(np.int64) - starts
+        rows = np.repeat(np.arange(len(positions)), lengths)
+        offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return rows, np.repeat(starts, lengths) + offsets
+
+    def neighbors_of_many(self, movie_ids: np.ndarray, per_item: int = 0,
+                          allowed: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Объединение соседей с положительным сходством для набора фильмов.
+
+        :param movie_ids: ID фильмов
+        :param per_item: Максимальное количество соседей от каждого фильма (0 — без ограничения), defaults to 0
+        :param allowed: Булев массив по позициям индекса; соседи вне него пропускаются до отбора
+            per_item (None — все), defaults to None
+        :return: Отсортированный массив уникальных позиций соседей
+        """
+        positions = self.positions_for(movie_ids)
+        rows, flat = self.gather_rows(positions[positions >= 0])
+        keep = self.data[flat] > 0
+        if allowed is not None:
+            keep &= allowed[self.indices[flat]]
+        rows, flat = rows[keep], flat[keep]
+        if per_item > 0:
+            rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+            flat = flat[rank < per_item]
+        return np.unique(self.indices[flat])
+
+    def truncated(self, limit: int) -> "NeighborIndex":
+        """
+        Индекс из первых limit соседей каждого фильма с положительным сходством.
+
+        :param limit: Максимальное количество соседей на фильм
+        :return: Новый индекс с теми же позициями фильмов
+        """
+        rows, flat = self.gather_rows(np.arange(len(self.item_ids)))
+        keep = self.data[flat] > 0
+        rows, flat = rows[keep], flat[keep]
+        selected = np.arange(len(rows)) - np.searchsorted(rows, rows) < max(0, limit)
+        rows, flat = rows[selected], flat[selected]
+        counts = np.bincount(rows, minlength=len(self.item_ids))
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        return NeighborIndex(self.item_ids, indptr, self.indices[flat], self.data[flat])
+
+    def compacted(self) -> "NeighborIndex":
+        """
+        Индекс со строками подряд (с indptr), например для записи в файл.
+
+        :return: Этот же индекс, если строки уже идут подряд, иначе копия
+        """
+        if self.indptr is not None:
+            return self
+        _, flat = self.gather_rows(np.arange(len(self.item_ids)))
+        indptr = np.concatenate([[0], np.cumsum(self.stops - self.starts)])
+        return NeighborIndex(self.item_ids, indptr, self.indices[flat], self.data[flat])
+
+    def neighbors(self, movie_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Соседи фильма по убыванию сходства.
+
+        :param movie_id: ID фильма
+        :return: Кортеж (ID соседей, значения сходства); пустые массивы если фильма нет
+        """
+        pos = self.position(movie_id)
+        if pos is None:
+            return np.zeros(0, np.int32), np.zeros(0, np.float32)
+        start, stop = self.starts[pos], self.stops[pos]
+        return self.item_ids[self.indices[start:stop]], self.data[start:stop]
+
+    def similarity(self, movie_id: int, other_id: int) -> Optional[float]:
+        """
+        Сходство между двумя фильмами, если оно сохранено в индексе.
+
+        :param movie_id: ID фильма
+        :param other_id: ID соседа
+        :return: Значение сходства или None
+        """
+        neighbor_ids, sims = self.neighbors(movie_id)
+        found = np.flatnonzero(neighbor_ids == other_id)
+        return float(sims[found[0]]) if len(found) else None
+
+
+class NeighborRows:
+    """
+    Индекс соседей, строки которого заменяются по одной без копирования остальных.
+
+    Строки лежат в общих буферах по отрезкам [starts[p], stops[p]). Новая версия строки
+    дописывается в свободный конец буферов, а прежняя остаётся на месте: её продолжают читать
+    ранее выданные индексы. Когда место заканчивается, действующие строки переносятся в новые
+    буферы с запасом в половину их объёма, поэтому перенос в среднем стоит O(1) на записанный
+    элемент. Замена строк стоит O(длины новых строк + количества фильмов): новый индекс получает
+    свои массивы starts и stops и подставляется читателям одним присваиванием.
+    """
+
+    def __init__(self, index: NeighborIndex, values: Optional[np.ndarray] = None) -> None:
+        """
+        Инициализация по готовому индексу.
+
+        :param index: Исходный индекс соседей
+        :param values: Сходства в float64 в порядке элементов index.data (None — не хранить), defaults to None
+        """
+        self.index = index
+        self.values = values
+        # Буферы исходного индекса не дописываются (они могут быть открыты через mmap
+        # или общими с другим индексом): первая замена переносит строки в свои буферы
+        self._used = 0
+        self._spare = 0
+
+    def _grow(self, extra: int) -> None:
+        """
+        Перенос действующих строк в новые буферы с местом ещё под extra элементов.
+
+        :param extra: Количество элементов, которые будут дописаны
+        """
+        index = self.index
+        _, flat = index.gather_rows(np.arange(len(index)))
+        used = len(flat)
+        capacity = used + extra + used // 2
+        indices = np.empty(capacity, dtype=np.int32)
+        data = np.empty(capacity, dtype=np.float32)
+        indices[:used], data[:used] = index.indices[flat], index.data[flat]
+        if self.values is not None:
+            values = np.empty(capacity)
+            values[:used] = self.values[flat]
+            self.values = values
+        lengths = index.stops - index.starts
+        stops = np.cumsum(lengths)
+        self.index = NeighborIndex.from_ranges(index.item_ids, stops - lengths, stops, indices, data,
+                                               index._positions)
+        self._used, self._spare = used, capacity - used
+
+    def replace(self, item_ids: np.ndarray, rows: Dict[int, Tuple[np.ndarray, np.ndarray]]) -> NeighborIndex:
+        """
+        Новый индекс с заменёнными строками, остальные строки общие с текущим.
+
+        :param item_ids: ID фильмов по позициям (новые фильмы — в конце, их строки без rows пустые)
+        :param rows: Новые строки {позиция: (позиции соседей, сходства)}
+        :return: Новый индекс
+        """
+        needed = sum(len(cols) for cols, _ in rows.values())
+        if needed > self._spare:
+            self._grow(needed)
+        old = self.index
+        n_old, n = len(old), len(item_ids)
+        starts = np.zeros(n, dtype=np.int64)
+        stops = np.zeros(n, dtype=np.int64)
+        starts[:n_old], stops[:n_old] = old.starts, old.stops
+        at = self._used
+        for item in sorted(rows):
+            cols, vals = rows[item]
+            end = at + len(cols)
+            old.indices[at:end] = cols
+            old.data[at:end] = vals
+            if self.values is not None:
+                self.values[at:end] = vals
+            starts[item], stops[item] = at, end
+            at = end
+        self._spare -= at - self._used
+        self._used = at
+        positions = old._positions if n == n_old else None
+        # Индекс заменяется одним присваиванием: читатели видят либо старый, либо новый
+        self.index = NeighborIndex.from_ranges(item_ids, starts, stops, old.indices, old.data, positions)
+        return self.index
@@ -0,0 +1,158 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from similarity import ItemRatingMatrix
+from neighbor_index import select_top_neighbors
+
+BlockResult = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+# Матрица оценок, подключённая к разделяемой памяти в процессе-обработчике
+_worker_matrix: Optional[ItemRatingMatrix] = None
+_worker_segments: List[shared_memory.SharedMemory] = []
+
+
+def resolve_workers(workers: int) -> int:
+    """
+    Определение количества процессов для построения матрицы сходств.
+
+    :param workers: Значение из конфигурации (0 — по числу ядер)
+    :return: Количество процессов, не меньше 1
+    """
+    if workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def _pool_context() -> multiprocessing.context.BaseContext:
+    """
+    Контекст запуска процессов-обработчиков: forkserver, а где его нет — spawn.
+
+    Построение вызывается из потока исполнителя внутри работающего бота, а fork
+    многопоточного процесса может оставить в дочернем процессе захваченные другими
+    потоками блокировки. Обработчики всё равно подключаются к матрице через разделяемую
+    память, поэтому копирование при записи от fork ничего не даёт.
+
+    :return: Контекст multiprocessing
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class SharedItemMatrix:
+    """
+    Размещение массивов ItemRatingMatrix в разделяемой памяти для процессов-обработчиков.
+    """
+
+    def __init__(self, matrix: ItemRatingMatrix) -> None:
+        """
+        Копирование массивов матрицы в сегменты разделяемой памяти.
+
+        :param matrix: Матрица оценок фильм x пользователь
+        """
+        self.segments: List[shared_memory.SharedMemory] = []
+        self.spec: Dict = {"shape": matrix.R.shape, "arrays": {}}
+        try:
+            for name in ItemRatingMatrix.ARRAY_NAMES:
+                array = np.ascontiguousarray(matrix.arrays[name])
+                segment = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+                self.segments.append(segment)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)[...] = array
+                self.spec["arrays"][name] = (segment.name, array.shape, array.dtype.str)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """
+        Освобождение сегментов разделяемой памяти.
+        """
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+        self.segments = []
+
+    def __enter__(self) -> "SharedItemMatrix":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _init_worker(spec: Dict) -> None:
+    """
+    Подключение процесса-обработчика к матрице в разделяемой памяти.
+
+    :param spec: Описание сегментов из SharedItemMatrix.spec
+    """
+    global _worker_matrix
+    arrays = {}
+    for name, (segment_name, shape, dtype) in spec["arrays"].items():
+        segment = shared_memory.SharedMemory(name=segment_name)
+        _worker_segments.append(segment)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+    _worker_matrix = ItemRatingMatrix.from_arrays(arrays, tuple(spec["shape"]))
+
+
+def _top_block(matrix: ItemRatingMatrix, start: int, stop: int, min_common: int, max_neighbors: int) -> BlockResult:
+    """
+    Расчёт блока строк с отбором ближайших соседей.
+
+    :param matrix: Матрица оценок фильм x пользователь
+    :param start: Первая строка блока
+    :param stop: Строка после последней строки блока
+    :param min_common: Минимальное количество общих пользователей
+    :param max_neighbors: Максимальное количество соседей на фильм (0 — без ограничения)
+    :return: Кортеж (строки, столбцы, значения)
+    """
+    rows, cols, vals = matrix.pearson_block(start, stop, min_common)
+    return select_top_neighbors(rows, cols, vals, max_neighbors)
+
+
+def _pearson_block_task(start: int, stop: int, min_common: int, max_neighbors: int) -> Tuple[int, int, BlockResult]:
+    """
+    Расчёт блока строк в процессе-обработчике.
+
+    :param start: Первая строка блока
+    :param stop: Строка после последней строки блока
+    :param min_common: Минимальное количество общих пользователей
+    :param max_neighbors: Максимальное количество соседей на фильм (0 — без ограничения)
+    :return: Кортеж (start, stop, результат блока)
+    """
+    return start, stop, _top_block(_worker_matrix, start, stop, min_common, max_neighbors)
+
+
+def iter_pearson_blocks(matrix: ItemRatingMatrix, min_common: int, block_size: int,
+                        workers: int = 1, max_neighbors: int = 0,
+                        blocks: Optional[List[Tuple[int, int]]] = None) -> Iterator[Tuple[int, int, BlockResult]]:
+    """
+    Расчёт корреляции Пирсона по блокам строк, последовательно или в пуле процессов.
+
+    Блоки возвращаются в порядке готовности. При workers > 1 матрица один раз копируется
+    в разделяемую память, и процессы-обработчики читают её без сериализации.
+
+    :param matrix: Матрица оценок фильм x пользователь
+    :param min_common: Минимальное количество общих пользователей
+    :param block_size: Количество строк в блоке
+    :param workers: Количество процессов, defaults to 1
+    :param max_neighbors: Максимальное количество соседей на фильм (0 — без ограничения), defaults to 0
+    :param blocks: Считаемые блоки (start, stop) (None — все строки блоками по block_size), defaults to None
+    :return: Итератор кортежей (start, stop, (строки, столбцы, значения)) по строке и убыванию сходства
+    """
+    if blocks is None:
+        n = matrix.n_items
+        blocks = [(start, min(start + block_size, n)) for start in range(0, n, block_size)]
+
+    if workers <= 1 or len(blocks) <= 1:
+        for start, stop in blocks:
+            yield start, stop, _top_block(matrix, start, stop, min_common, max_neighbors)
+        return None
+
+    with SharedItemMatrix(matrix) as shared:
+        with ProcessPoolExecutor(max_workers=min(workers, len(blocks)), mp_context=_pool_context(),
+                                 initializer=_init_worker, initargs=(shared.spec,)) as pool:
+            futures = [pool.submit(_pearson_block_task, start, stop, min_common, max_neighbors) for start, stop in blocks]
+            for future in as_completed(futures):
+                yield future.result()
@@ -0,0 +1,57 @@
+import time
+from typing import Optional
+
+
+class ProgressReporter:
+    """
+    Вывод прогресса длительной операции со скоростью и оценкой оставшегося времени.
+    """
+
+    def __init__(self, total: int, label: str, min_interval: float = 2.0) -> None:
+        """
+        Инициализация счётчика прогресса.
+
+        :param total: Общее количество единиц работы
+        :param label: Название единиц работы для вывода (например, "фильмов")
+        :param min_interval: Минимальный интервал между выводами в секундах, defaults to 2.0
+        """
+        self.total = max(0, total)
+        self.label = label
+        self.min_interval = min_interval
+        self.done = 0
+        self.started = time.perf_counter()
+        self._last_report: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Время с начала операции в секундах.
+        """
+        return time.perf_counter() - self.started
+
+    def advance(self, n: int = 1) -> None:
+        """
+        Учёт выполненной работы и вывод прогресса не чаще min_interval.
+
+        :param n: Количество выполненных единиц работы, defaults to 1
+        """
+        self.done = min(self.total, self.done + n)
+        now = time.perf_counter()
+        if self._last_report is not None and now - self._last_report < self.min_interval and self.done < self.total:
+            return None
+        self._last_report = now
+        print(f"  {self.format()}")
+
+    def format(self) -> str:
+        """
+        Текстовое описание текущего прогресса.
+
+        :return: Строка вида "обработано 100/1682 фильмов (6%), 50.0/с, осталось ~31 с"
+        """
+        elapsed = self.elapsed
+        percent = 100.0 * self.done / self.total if self.total else 100.0
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        text = f"обработано {self.done}/{self.total} {self.label} ({percent:.0f}%), {rate:.1f}/с"
+        if 0 < self.done < self.total and rate > 0:
+            text += f", осталось ~{(self.total - self.done) / rate:.0f} с"
+        return text
@@ -0,0 +1,238 @@
+import asyncio
+import io
+import time
+from collections import deque
+from pathlib import Path
+from typing import Awaitable, Callable, Deque, Dict, Iterable, Optional, Tuple
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from data_handler import CSV_ENGINE, DataProcessor
+
+RATING_COLUMNS = ['user_id', 'movie_id', 'rating', 'timestamp']
+RATING_DTYPES = {'user_id': np.int32, 'movie_id': np.int32, 'rating': np.float32, 'timestamp': np.int64}
+
+
+def parse_rating_lines(data: bytes) -> Tuple[pd.DataFrame, int]:
+    """
+    Разбор строк формата u.data: user_id, movie_id, rating, timestamp через табуляцию.
+
+    Строки с ошибками и оценками вне диапазона 1–5 пропускаются.
+
+    :param data: Целые строки файла
+    :return: Кортеж (DataFrame с колонками RATING_COLUMNS, количество пропущенных строк)
+    """
+    try:
+        df = pd.read_csv(io.BytesIO(data), sep='\t', names=RATING_COLUMNS, dtype=RATING_DTYPES, engine=CSV_ENGINE)
+        bad = 0
+    except Exception:
+        # В пакете есть строки с ошибками: разбор по одной строке
+        rows, bad = [], 0
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            parts = line.split(b'\t')
+            try:
+                if len(parts) != 4:
+                    raise ValueError(line)
+                rows.append((int(parts[0]), int(parts[1]), float(parts[2]), int(parts[3])))
+            except ValueError:
+                bad += 1
+        df = pd.DataFrame(rows, columns=RATING_COLUMNS).astype(RATING_DTYPES)
+    valid = (df['rating'] >= 1.0) & (df['rating'] <= 5.0)
+    return df[valid].reset_index(drop=True), bad + int((~valid).sum())
+
+
+class RatingStreamIngester:
+    """
+    Подгрузка оценок, дописываемых в конец u.data, без перезапуска бота.
+
+    Фоновая задача раз в poll_interval секунд читает целые строки после последнего прочитанного
+    места файла (незаконченная последняя строка ждёт следующего чтения), упорядочивает их по
+    timestamp и применяет пакетами не больше max_batch оценок: DataProcessor.add_ratings обновляет
+    на месте матрицу пользователь x фильм и статистику фильмов (средние и популярность), затем
+    вызывается on_batch, например, для обновления матрицы сходств. Строки из других источников
+    (сокет, очередь) можно передать через feed(). Если файл стал короче прочитанного места, он
+    считается заменённым и читается с начала.
+    """
+
+    def __init__(self, data_processor: DataProcessor, path: str, offset: int = 0, poll_interval: float = 1.0,
+                 max_batch: int = 1000, max_read_bytes: int = 8 << 20,
+                 on_batch: Optional[Callable[[sp.csr_matrix, pd.DataFrame], Awaitable[None]]] = None,
+                 window: int = 100) -> None:
+        """
+        Инициализация.
+
+        :param data_processor: Обработчик данных, в который добавляются оценки
+        :param path: Путь к файлу оценок
+        :param offset: Место файла в байтах, с которого начинается чтение, defaults to 0
+        :param poll_interval: Интервал проверки файла в секундах, defaults to 1.0
+        :param max_batch: Максимальное количество оценок в одном пакете, defaults to 1000
+        :param max_read_bytes: Максимальный объём одного чтения файла, defaults to 8 МБ
+        :param on_batch: Вызывается после добавления пакета с матрицей до добавления и пакетом, defaults to None
+        :param window: Количество последних пакетов для статистики скорости и задержки, defaults to 100
+        """
+        self.dp = data_processor
+        self.path = Path(path)
+        self.offset = offset
+        self.poll_interval = poll_interval
+        self.max_batch = max(1, max_batch)
+        self.max_read_bytes = max_read_bytes
+        self.on_batch = on_batch
+        self._fed: Deque[bytes] = deque()
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # По пакетам: (оценок, секунд на применение, секунд от чтения до применения)
+        self._batches: Deque[Tuple[int, float, float]] = deque(maxlen=window)
+        self._ingested = 0
+        self._batch_count = 0
+        self._bad_lines = 0
+        self._errors = 0
+        self._last_timestamp: Optional[int] = None
+        self._last_applied: Optional[float] = None
+
+    def start(self) -> None:
+        """
+        Запуск фоновой задачи чтения в текущем цикле событий.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Остановка фоновой задачи; начатый пакет дописывается.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def feed(self, lines: Iterable[str]) -> None:
+        """
+        Передача строк формата u.data из другого источника; они применяются при следующей проверке.
+
+        :param lines: Строки user_id, movie_id, rating, timestamp через табуляцию
+        """
+        data = "".join(line if line.endswith("\n") else line + "\n" for line in lines).encode("utf-8")
+        if data:
+            self._fed.append(data)
+            self._wake.set()
+
+    def _read_new(self) -> bytes:
+        """
+        Чтение целых строк, дописанных в файл после offset.
+        """
+        if not self.path.exists():
+            return b""
+        size = self.path.stat().st_size
+        if size < self.offset:
+            print(f"Файл {self.path} стал короче прочитанного ({size} < {self.offset} байт), читаю с начала")
+            self.offset = 0
+        if size == self.offset:
+            return b""
+        with self.path.open("rb") as f:
+            f.seek(self.offset)
+            data = f.read(min(size - self.offset, self.max_read_bytes))
+        end = data.rfind(b"\n") + 1
+        self.offset += end
+        return data[:end]
+
+    async def _run(self) -> None:
+        """
+        Фоновая проверка файла: раз в poll_interval или сразу после feed().
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            # Отмена при закрытии не прерывает начатый пакет
+            await asyncio.shield(self.poll())
+
+    async def poll(self) -> int:
+        """
+        Чтение и применение всех накопившихся оценок.
+
+        :return: Количество применённых оценок
+        """
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            applied = 0
+            while True:
+                chunks = [self._fed.popleft() for _ in range(len(self._fed))]
+                try:
+                    chunks.append(await loop.run_in_executor(None, self._read_new))
+                except OSError as e:
+                    print(f"Ошибка чтения {self.path}: {e}")
+                    self._errors += 1
+                data = b"".join(chunks)
+                if not data:
+                    return applied
+                read_at = time.perf_counter()
+                ratings, bad = await loop.run_in_executor(None, parse_rating_lines, data)
+                self._bad_lines += bad
+                ratings = ratings.sort_values('timestamp', kind='stable', ignore_index=True)
+                for start in range(0, len(ratings), self.max_batch):
+                    applied += await self._apply(ratings.iloc[start:start + self.max_batch], read_at)
+
+    async def _apply(self, batch: pd.DataFrame, read_at: float) -> int:
+        """
+        Добавление пакета оценок в обработчик данных и вызов on_batch.
+
+        :param batch: Оценки, упорядоченные по timestamp
+        :param read_at: Время чтения пакета (time.perf_counter)
+        :return: Количество применённых оценок
+        """
+        started = time.perf_counter()
+        # Данные меняются в цикле событий, чтобы обработчики запросов не видели их наполовину обновлёнными
+        old_matrix = self.dp.user_item_matrix
+        try:
+            self.dp.add_ratings(batch)
+            if self.on_batch is not None:
+                await self.on_batch(old_matrix, batch)
+        except Exception as e:
+            print(f"Ошибка применения пакета из {len(batch)} оценок: {e}")
+            self._errors += 1
+            return 0
+        finished = time.perf_counter()
+        self._batches.append((len(batch), finished - started, finished - read_at))
+        self._ingested += len(batch)
+        self._batch_count += 1
+        self._last_timestamp = int(batch['timestamp'].iloc[-1])
+        self._last_applied = time.time()
+        return len(batch)
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        Метрики загрузки оценок.
+
+        :return: Словарь: количество оценок, пакетов, пропущенных строк и ошибок, непрочитанный объём
+                 файла в байтах, отставание от последней оценки в секундах (по timestamp), скорость
+                 применения в оценках в секунду и задержка от чтения до применения пакета в мс
+        """
+        try:
+            backlog = max(0, self.path.stat().st_size - self.offset)
+        except OSError:
+            backlog = 0
+        sizes = np.array([size for size, _, _ in self._batches], dtype=np.float64)
+        busy = np.array([seconds for _, seconds, _ in self._batches])
+        delays = np.array([delay for _, _, delay in self._batches]) * 1e3 if self._batches else np.zeros(1)
+        return {
+            "ingested": self._ingested,
+            "batches": self._batch_count,
+            "bad_lines": self._bad_lines,
+            "errors": self._errors,
+            "offset": self.offset,
+            "backlog_bytes": backlog,
+            "last_timestamp": self._last_timestamp,
+            "event_lag_s": time.time() - self._last_timestamp if self._last_timestamp is not None else None,
+            "since_last_batch_s": time.time() - self._last_applied if self._last_applied is not None else None,
+            "ratings_per_s": float(sizes.sum() / busy.sum()) if busy.sum() > 0 else 0.0,
+            "delay_ms_p50": float(np.percentile(delays, 50)),
+            "delay_ms_p95": float(np.percentile(delays, 95))
+        }
@@ -0,0 +1,92 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+
+class RecommendationCache:
+    """
+    LRU-кэш рекомендаций со сроком жизни записей.
+
+    Ключ — кортеж, первый элемент которого ID пользователя (остальные — например, фильтры
+    жанров). Вместе со значением хранится версия оценок пользователя: запись с другой
+    версией или старше ttl считается промахом. invalidate_user удаляет все записи пользователя.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 600.0) -> None:
+        """
+        Инициализация кэша.
+
+        :param max_entries: Максимальное количество записей, defaults to 1024
+        :param ttl: Срок жизни записи в секундах (0 — без ограничения), defaults to 600
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple, Tuple[int, float, Any]]" = OrderedDict()
+        self._user_keys: Dict[Hashable, Set[Tuple]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple, version: int) -> Optional[Any]:
+        """
+        Получение значения из кэша.
+
+        :param key: Ключ (ID пользователя, ...)
+        :param version: Текущая версия оценок пользователя
+        :return: Значение или None при промахе
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry_version, created, value = entry
+            if entry_version == version and (self.ttl <= 0 or time.monotonic() - created < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self._remove(key)
+        self.misses += 1
+        return None
+
+    def put(self, key: Tuple, version: int, value: Any) -> None:
+        """
+        Сохранение значения с вытеснением давно не использованных записей.
+
+        :param key: Ключ (ID пользователя, ...)
+        :param version: Версия оценок пользователя, по которым получено значение
+        :param value: Значение
+        """
+        self._entries[key] = (version, time.monotonic(), value)
+        self._entries.move_to_end(key)
+        self._user_keys.setdefault(key[0], set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate_user(self, user_id: Hashable) -> None:
+        """
+        Удаление всех записей пользователя.
+
+        :param user_id: ID пользователя
+        """
+        for key in list(self._user_keys.get(user_id, ())):
+            self._remove(key)
+
+    def _remove(self, key: Tuple) -> None:
+        self._entries.pop(key, None)
+        keys = self._user_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[key[0]]
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Статистика кэша.
+
+        :return: Словарь: попадания, промахи, доля попаданий, вытеснения и размер
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions, "size": len(self._entries)}
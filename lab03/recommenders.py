@@ -0,0 +1,382 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from data_handler import DataProcessor
+from collab_filtering import popular_recommendations
+from progress import ProgressReporter
+
+
+class PopularityRecommender:
+    """
+    Рекомендации самых популярных фильмов, которые пользователь ещё не оценил.
+
+    Предсказанием рейтинга служит средняя оценка фильма. Модель не требует построения.
+    """
+
+    def __init__(self, data_processor: DataProcessor) -> None:
+        """
+        Инициализация модели.
+
+        :param data_processor: Обработчик данных
+        """
+        self.dp = data_processor
+        self.build_progress: Optional[ProgressReporter] = None
+
+    @property
+    def is_built(self) -> bool:
+        """
+        Модель всегда готова.
+        """
+        return True
+
+    async def warm_up(self) -> None:
+        """
+        Построение не требуется.
+        """
+        return None
+
+    def predict_ratings(self, user_ratings: Dict[int, float], item_ids: Sequence[int]) -> np.ndarray:
+        """
+        Средние оценки фильмов.
+
+        :param user_ratings: Оценки пользователя (не используются)
+        :param item_ids: ID целевых фильмов
+        :return: Массив средних оценок (NaN для фильмов без оценок)
+        """
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        predictions = np.full(len(item_ids), np.nan)
+        known = self.dp.item_stats.counts_for(item_ids) > 0
+        predictions[known] = self.dp.item_stats.means_for(item_ids[known])
+        return predictions
+
+    async def generate_recommendations(self, virtual_user_ratings: Dict[int, float],
+                                       num_recommendations: Optional[int] = 5, include_genres: int = 0,
+                                       exclude_genres: int = 0) -> List[Tuple[int, float]]:
+        """
+        Генерация рекомендаций для пользователя.
+
+        :param virtual_user_ratings: Оценки пользователя
+        :param num_recommendations: Количество рекомендаций (None — весь ранжированный список), defaults to 5
+        :param include_genres: Маска жанров, хотя бы один из которых должен быть у фильма (0 — любые), defaults to 0
+        :param exclude_genres: Маска исключаемых жанров, defaults to 0
+        :return: Список кортежей (movie_id, 0.0) по убыванию популярности
+        """
+        return popular_recommendations(self.dp, virtual_user_ratings, num_recommendations,
+                                       include_genres, exclude_genres)
+
+
+class UserBasedRecommender:
+    """
+    User-Based Collaborative Filtering: оценки фильмов похожими реальными пользователями.
+
+    Похожие пользователи ищутся индексом пользователей (точным или LSH) по корреляции Пирсона.
+    Предсказание — средняя оценка пользователя плюс взвешенное сходством среднее отклонений
+    оценок соседей от их средних.
+    """
+
+    def __init__(self, data_processor: DataProcessor, user_index, min_common_users: int,
+                 neighbors: int = 50) -> None:
+        """
+        Инициализация модели.
+
+        :param data_processor: Обработчик данных
+        :param user_index: Индекс похожих пользователей (UserSimilarityIndex или LSHUserIndex)
+        :param min_common_users: Минимальное количество общих фильмов с соседом
+        :param neighbors: Количество похожих пользователей, defaults to 50
+        """
+        self.dp = data_processor
+        self.user_index = user_index
+        self.min_common_users = min_common_users
+        self.neighbors = max(1, neighbors)
+        self.build_progress: Optional[ProgressReporter] = None
+        matrix = data_processor.user_item_matrix
+        counts = np.diff(matrix.indptr)
+        sums = np.bincount(np.repeat(np.arange(len(counts)), counts), weights=matrix.data, minlength=len(counts))
+        self.user_means = sums / np.maximum(counts, 1)
+
+    @property
+    def is_built(self) -> bool:
+        """
+        Модель готова сразу: индекс пользователей строится при загрузке данных.
+        """
+        return True
+
+    async def warm_up(self) -> None:
+        """
+        Построение не требуется.
+        """
+        return None
+
+    def _scores(self, user_ratings: Dict[int, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Предсказания по всем фильмам датасета.
+
+        :param user_ratings: Оценки пользователя
+        :return: Кортеж (предсказания по столбцам матрицы оценок, признак наличия оценки соседа)
+        """
+        n_items = len(self.dp.movie_ids)
+        similar = self.user_index.most_similar(user_ratings, self.min_common_users, self.neighbors)
+        similar = [(user_id, sim) for user_id, sim in similar if sim > 0]
+        if not similar:
+            return np.full(n_items, np.nan), np.zeros(n_items, dtype=bool)
+
+        rows = np.array([self.dp.user_position(user_id) for user_id, _ in similar], dtype=np.int64)
+        sims = np.array([sim for _, sim in similar])
+        neighbors = self.dp.user_item_matrix[rows]
+        rated = neighbors.copy()
+        rated.data = np.ones_like(rated.data, dtype=np.float64)
+        neighbors = neighbors.astype(np.float64)
+        neighbors.data -= np.repeat(self.user_means[rows], np.diff(neighbors.indptr))
+
+        numerator = neighbors.T @ sims
+        denominator = rated.T @ sims
+        has_neighbors = denominator > 0
+        user_mean = float(np.mean(list(user_ratings.values())))
+        scores = np.full(n_items, np.nan)
+        scores[has_neighbors] = np.clip(
+            user_mean + numerator[has_neighbors] / denominator[has_neighbors], 1.0, 5.0)
+        return scores, has_neighbors
+
+    def predict_ratings(self, user_ratings: Dict[int, float], item_ids: Sequence[int]) -> np.ndarray:
+        """
+        Пакетное предсказание рейтингов пользователя для набора фильмов.
+
+        :param user_ratings: Оценки пользователя
+        :param item_ids: ID целевых фильмов
+        :return: Массив предсказаний в порядке item_ids (NaN если предсказание невозможно)
+        """
+        positions = self.dp.movie_positions_for(np.asarray(item_ids, dtype=np.int64))
+        predictions = np.full(len(positions), np.nan)
+        if not user_ratings or len(positions) == 0:
+            return predictions
+        scores, _ = self._scores(user_ratings)
+        known = positions >= 0
+        predictions[known] = scores[positions[known]]
+        return predictions
+
+    async def generate_recommendations(self, virtual_user_ratings: Dict[int, float],
+                                       num_recommendations: Optional[int] = 5, include_genres: int = 0,
+                                       exclude_genres: int = 0) -> List[Tuple[int, float]]:
+        """
+        Генерация рекомендаций для пользователя.
+
+        :param virtual_user_ratings: Оценки пользователя
+        :param num_recommendations: Количество рекомендаций (None — весь ранжированный список), defaults to 5
+        :param include_genres: Маска жанров, хотя бы один из которых должен быть у фильма (0 — любые), defaults to 0
+        :param exclude_genres: Маска исключаемых жанров, defaults to 0
+        :return: Список кортежей (movie_id, predicted_rating)
+        """
+        candidates = np.zeros(0, dtype=np.int64)
+        if virtual_user_ratings:
+            scores, has_neighbors = self._scores(virtual_user_ratings)
+            movie_ids = self.dp.movie_ids
+            allowed = has_neighbors & (scores > 3.0) & self.dp.genre_filter(movie_ids, include_genres, exclude_genres)
+            rated = self.dp.movie_positions_for(np.fromiter(virtual_user_ratings.keys(), dtype=np.int64))
+            allowed[rated[rated >= 0]] = False
+            candidates = np.flatnonzero(allowed)
+        if len(candidates) == 0:
+            # Холодный старт: у пользователя нет похожих реальных пользователей
+            return popular_recommendations(self.dp, virtual_user_ratings, num_recommendations,
+                                           include_genres, exclude_genres)
+        order = np.lexsort((movie_ids[candidates], -scores[candidates]))
+        if num_recommendations is not None:
+            order = order[:num_recommendations]
+        candidates = candidates[order]
+        return list(zip(movie_ids[candidates].tolist(), scores[candidates].tolist()))
+
+
+class RecommenderRegistry:
+    """
+    Реестр стратегий рекомендаций с фоновой загрузкой и атомарной заменой моделей.
+
+    Для каждой стратегии хранится рабочая модель, которой обслуживаются запросы, и, пока идёт
+    загрузка, новая модель. Новая модель создаётся фабрикой и строится в фоне (warm_up), а
+    когда готова, одним присваиванием заменяет рабочую. Запросы, начатые со старой моделью,
+    дорабатывают с ней. Номер версии стратегии растёт при каждой замене и при обновлении
+    модели на месте (mark_current).
+
+    Для каждой рабочей модели запоминается версия данных, по которым она построена. Когда
+    данные меняются, модель считается устаревшей, пока её не перезагрузят или не отметят
+    обновлённой на месте. Модели, которые читают текущие данные при каждом запросе
+    (live), не устаревают.
+    """
+
+    def __init__(self, default: str, data_version: Callable[[], int] = lambda: 0) -> None:
+        """
+        Инициализация реестра.
+
+        :param default: Название стратегии по умолчанию
+        :param data_version: Функция, возвращающая версию данных — счётчик изменённых оценок,
+            defaults to lambda: 0
+        """
+        self.default = default
+        self._data_version = data_version
+        self._factories: Dict[str, Callable[[], object]] = {}
+        self._descriptions: Dict[str, str] = {}
+        self._live: Set[str] = set()
+        self._active: Dict[str, object] = {}
+        self._pending: Dict[str, object] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._versions: Dict[str, int] = {}
+        self._built_from: Dict[str, int] = {}
+        self._timings: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+
+    @property
+    def names(self) -> List[str]:
+        """
+        Названия зарегистрированных стратегий.
+        """
+        return list(self._factories)
+
+    def register(self, name: str, factory: Callable[[], object], description: str = "",
+                 live: bool = False) -> None:
+        """
+        Регистрация стратегии.
+
+        :param name: Название стратегии
+        :param factory: Функция, создающая новую (ещё не построенную) модель
+        :param description: Описание для пользователей, defaults to ""
+        :param live: Модель читает текущие данные при каждом запросе и не устаревает, defaults to False
+        """
+        self._factories[name] = factory
+        self._descriptions[name] = description
+        if live:
+            self._live.add(name)
+
+    def get(self, name: Optional[str] = None):
+        """
+        Рабочая модель стратегии.
+
+        :param name: Название стратегии (None — по умолчанию), defaults to None
+        :return: Модель или None если она ещё не загружена
+        """
+        return self._active.get(name or self.default)
+
+    def pending(self, name: Optional[str] = None):
+        """
+        Загружаемая сейчас модель стратегии.
+
+        :param name: Название стратегии (None — по умолчанию), defaults to None
+        :return: Модель или None если загрузки нет
+        """
+        return self._pending.get(name or self.default)
+
+    def version(self, name: Optional[str] = None) -> int:
+        """
+        Номер версии рабочей модели стратегии.
+
+        :param name: Название стратегии (None — по умолчанию), defaults to None
+        :return: Номер версии (0 — модель ещё не загружалась)
+        """
+        return self._versions.get(name or self.default, 0)
+
+    def is_loading(self, name: Optional[str] = None) -> bool:
+        """
+        Идёт ли загрузка новой модели стратегии.
+
+        :param name: Название стратегии (None — по умолчанию), defaults to None
+        """
+        task = self._loading.get(name or self.default)
+        return task is not None and not task.done()
+
+    def changes_since_build(self, name: Optional[str] = None) -> int:
+        """
+        Количество оценок, изменённых после построения рабочей модели стратегии.
+
+        :param name: Название стратегии (None — по умолчанию), defaults to None
+        :return: Количество изменений (0 — модель не загружена, актуальна или live)
+        """
+        name = name or self.default
+        if name not in self._active or name in self._live:
+            return 0
+        return max(0, self._data_version() - self._built_from[name])
+
+    def stale(self, min_changes: int = 1) -> List[str]:
+        """
+        Названия стратегий, рабочие модели которых устарели.
+
+        :param min_changes: Минимальное количество изменённых оценок после построения, defaults to 1
+        :return: Список названий
+        """
+        return [name for name in self._active if self.changes_since_build(name) >= max(1, min_changes)]
+
+    def mark_current(self, name: Optional[str] = None) -> None:
+        """
+        Отметка, что рабочая модель стратегии обновлена на месте по текущим данным.
+
+        Версия стратегии растёт, поэтому списки, посчитанные до обновления, не берутся из кэша.
+
+        :param name: Название стратегии (None — по умолчанию), defaults to None
+        """
+        name = name or self.default
+        if name in self._active:
+            self._built_from[name] = self._data_version()
+            self._versions[name] += 1
+
+    def load(self, name: Optional[str] = None) -> asyncio.Task:
+        """
+        Запуск фоновой загрузки новой модели стратегии; повторный вызов во время загрузки
+        возвращает ту же задачу.
+
+        :param name: Название стратегии (None — по умолчанию), defaults to None
+        :return: Задача загрузки, результат — True если модель заменена
+        :raises KeyError: Если стратегия не зарегистрирована
+        """
+        name = name or self.default
+        if name not in self._factories:
+            raise KeyError(name)
+        if not self.is_loading(name):
+            self._loading[name] = asyncio.create_task(self._load(name))
+        return self._loading[name]
+
+    async def _load(self, name: str) -> bool:
+        """
+        Создание и построение новой модели с заменой рабочей.
+        """
+        started = time.perf_counter()
+        # Оценки, добавленные во время построения, в модель могут не попасть
+        data_version = self._data_version()
+        try:
+            model = self._factories[name]()
+            self._pending[name] = model
+            await model.warm_up()
+        except Exception as e:
+            self._errors[name] = str(e)
+            print(f"Ошибка загрузки модели {name}: {e}")
+            return False
+        finally:
+            self._pending.pop(name, None)
+        self._active[name] = model
+        self._versions[name] = self._versions.get(name, 0) + 1
+        self._built_from[name] = data_version
+        self._timings[name] = time.perf_counter() - started
+        self._errors.pop(name, None)
+        print(f"Модель {name} версии {self._versions[name]} загружена за {self._timings[name]:.1f} с")
+        return True
+
+    def status(self) -> List[str]:
+        """
+        Текстовое описание состояния стратегий.
+
+        :return: Строки вида "mf (по умолчанию): версия 2, загрузка 3.1 с"
+        """
+        lines = []
+        for name in self._factories:
+            line = name + (" (по умолчанию)" if name == self.default else "")
+            if name in self._active:
+                line += f": версия {self._versions[name]}, загрузка {self._timings[name]:.1f} с"
+                changes = self.changes_since_build(name)
+                if changes:
+                    line += f", устарела (изменено оценок: {changes})"
+            else:
+                line += ": не загружена"
+            if self.is_loading(name):
+                line += ", загружается новая версия"
+            if name in self._errors:
+                line += f", ошибка: {self._errors[name]}"
+            if self._descriptions[name]:
+                line += f" — {self._descriptions[name]}"
+            lines.append(line)
+        return lines
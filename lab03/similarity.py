@@ -1,6 +1,11 @@
 import math
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
+
+# Минимальное по модулю значение сходства, которое сохраняется в матрице
+SIMILARITY_THRESHOLD = 0.1
 
 
 def pearson_item_similarity(item_i: int, item_j: int, ratings_df: pd.DataFrame, min_common: int) -> Optional[float]:
@@ -80,3 +85,161 @@ def user_pearson_similarity(user_ratings: Dict[int, float], other_ratings: Dict[
         return None
 
     return num / denom
+
+
+def pearson_from_stats(n: np.ndarray, s_i: np.ndarray, s_j: np.ndarray, ss_i: np.ndarray, ss_j: np.ndarray,
+                       s_ij: np.ndarray, min_common: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Корреляция Пирсона пар фильмов по достаточным статистикам их общих оценок.
+
+    :param n: Количество общих пользователей
+    :param s_i: Сумма оценок первого фильма по общим пользователям
+    :param s_j: Сумма оценок второго фильма по общим пользователям
+    :param ss_i: Сумма квадратов оценок первого фильма
+    :param ss_j: Сумма квадратов оценок второго фильма
+    :param s_ij: Сумма произведений оценок
+    :param min_common: Минимальное количество общих пользователей
+    :return: Кортеж (признак достаточности данных, сходство; 0 где данных недостаточно)
+    """
+    # Все величины домножены на n, чтобы для целых оценок вычисления были точными
+    num = n * s_ij - s_i * s_j
+    den_i = n * ss_i - s_i * s_i
+    den_j = n * ss_j - s_j * s_j
+
+    valid = (n >= max(min_common, 1)) & (den_i > 1e-9) & (den_j > 1e-9)
+    sim = np.zeros_like(num)
+    np.divide(num, np.sqrt(np.where(valid, den_i * den_j, 1.0)), out=sim, where=valid)
+    return valid, sim
+
+
+class ItemRatingMatrix:
+    """
+    Разреженная матрица оценок фильм x пользователь для векторного расчёта корреляции Пирсона.
+
+    Корреляция считается по общим пользователям пары фильмов, как и в pearson_item_similarity:
+    для всех пар блока сразу вычисляются достаточные статистики (число общих оценок, суммы,
+    суммы квадратов и попарные произведения) через произведения разреженных матриц.
+    """
+
+    # Массивы, из которых собираются все матрицы; их можно разместить в разделяемой памяти
+    ARRAY_NAMES = ("item_ids", "indptr", "indices", "data", "data_sq", "ones",
+                   "t_indptr", "t_indices", "t_data", "t_data_sq", "t_ones")
+
+    def __init__(self, item_ids: np.ndarray, ratings: sp.csr_matrix) -> None:
+        """
+        Инициализация матрицы оценок.
+
+        :param item_ids: ID фильмов в порядке строк матрицы
+        :param ratings: Матрица оценок фильм x пользователь (элемент отсутствует — нет оценки)
+        """
+        ratings = ratings.tocsr().astype(np.float64)
+        ratings.sum_duplicates()
+        ratings.sort_indices()
+        transposed = ratings.tocsc()
+        arrays = {
+            "item_ids": np.asarray(item_ids),
+            "indptr": ratings.indptr,
+            "indices": ratings.indices,
+            "data": ratings.data,
+            "data_sq": ratings.data * ratings.data,
+            "ones": np.ones_like(ratings.data),
+            "t_indptr": transposed.indptr,
+            "t_indices": transposed.indices,
+            "t_data": transposed.data,
+            "t_data_sq": transposed.data * transposed.data,
+            "t_ones": np.ones_like(transposed.data),
+        }
+        self._assemble(arrays, ratings.shape)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], shape: Tuple[int, int]) -> "ItemRatingMatrix":
+        """
+        Сборка матрицы из готовых массивов без копирования (например, из разделяемой памяти).
+
+        :param arrays: Массивы с именами из ARRAY_NAMES
+        :param shape: Размер матрицы (фильмы, пользователи)
+        :return: Матрица оценок фильм x пользователь
+        """
+        matrix = cls.__new__(cls)
+        matrix._assemble(arrays, shape)
+        return matrix
+
+    def _assemble(self, arrays: Dict[str, np.ndarray], shape: Tuple[int, int]) -> None:
+        """
+        Создание матриц-представлений поверх массивов.
+
+        :param arrays: Массивы с именами из ARRAY_NAMES
+        :param shape: Размер матрицы (фильмы, пользователи)
+        """
+        n_items, n_users = shape
+        self.arrays = arrays
+        self.item_ids = arrays["item_ids"]
+
+        def csr(data: str, prefix: str, csr_shape: Tuple[int, int]) -> sp.csr_matrix:
+            return sp.csr_matrix((arrays[data], arrays[prefix + "indices"], arrays[prefix + "indptr"]),
+                                 shape=csr_shape, copy=False)
+
+        self.R = csr("data", "", (n_items, n_users))
+        self.B = csr("ones", "", (n_items, n_users))
+        self.R2 = csr("data_sq", "", (n_items, n_users))
+        # Транспонированные матрицы пользователь x фильм в формате CSR (массивы CSC исходной матрицы)
+        self._Rt = csr("t_data", "t_", (n_users, n_items))
+        self._Bt = csr("t_ones", "t_", (n_users, n_items))
+        self._R2t = csr("t_data_sq", "t_", (n_users, n_items))
+
+    @property
+    def n_items(self) -> int:
+        """
+        Количество фильмов в матрице.
+        """
+        return self.R.shape[0]
+
+    def pair_stats_block(self, start: int, stop: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Достаточные статистики пар (i, j), i из строк [start, stop), j > i, с общими пользователями.
+
+        :param start: Первая строка блока
+        :param stop: Строка после последней строки блока
+        :return: Кортеж (строки, столбцы, статистики shape (k, 6): n, s_i, s_j, ss_i, ss_j, s_ij)
+        """
+        A = self.R[start:stop]
+        Ab = self.B[start:stop]
+        A2 = self.R2[start:stop]
+        products = [Ab @ self._Bt, A @ self._Bt, Ab @ self._Rt, A2 @ self._Bt, Ab @ self._R2t, A @ self._Rt]
+        for product in products:
+            product.sort_indices()
+        # Все произведения имеют одну структуру (оценки положительны), поэтому их data выровнены
+        n = products[0]
+        rows = np.repeat(np.arange(start, stop), np.diff(n.indptr))
+        cols = n.indices
+        upper = cols > rows
+        stats = np.column_stack([product.data[upper] for product in products])
+        return rows[upper], cols[upper].astype(np.int64), stats
+
+    def pearson_block(self, start: int, stop: int, min_common: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Вычисление корреляции Пирсона строк [start, stop) со всеми фильмами.
+
+        :param start: Первая строка блока
+        :param stop: Строка после последней строки блока
+        :param min_common: Минимальное количество общих пользователей
+        :return: Кортеж (строки, столбцы, значения) пар с |сходство| > SIMILARITY_THRESHOLD
+        """
+        A = self.R[start:stop]
+        Ab = self.B[start:stop]
+        A2 = self.R2[start:stop]
+
+        n = (Ab @ self._Bt).toarray()
+        s_ij = (A @ self._Rt).toarray()
+        s_i = (A @ self._Bt).toarray()
+        s_j = (Ab @ self._Rt).toarray()
+        ss_i = (A2 @ self._Bt).toarray()
+        ss_j = (Ab @ self._R2t).toarray()
+
+        valid, sim = pearson_from_stats(n, s_i, s_j, ss_i, ss_j, s_ij, min_common)
+        rows = np.arange(start, stop)
+        valid[rows - start, rows] = False
+        keep = valid & (np.abs(sim) > SIMILARITY_THRESHOLD)
+
+        block_rows, block_cols = np.nonzero(keep)
+        return block_rows + start, block_cols, sim[block_rows, block_cols]
@@ -0,0 +1,34 @@
+from pathlib import Path
+from typing import Dict, Optional
+from array_store import load_arrays, save_arrays
+from neighbor_index import NeighborIndex
+
+# Сигнатура файла кэша индекса соседей, формат описан в array_store
+MAGIC = b"SIMIDX\0\0"
+ARRAY_NAMES = ("item_ids", "indptr", "indices", "data")
+
+
+def save_neighbor_index(path: Path, index: NeighborIndex, meta: Dict) -> None:
+    """
+    Атомарная запись индекса соседей в бинарный файл.
+
+    :param path: Путь к файлу кэша
+    :param index: Индекс соседей
+    :param meta: Параметры построения и отпечаток датасета для проверки при загрузке
+    """
+    index = index.compacted()
+    save_arrays(path, MAGIC, {name: getattr(index, name) for name in ARRAY_NAMES}, meta)
+
+
+def load_neighbor_index(path: Path, expected_meta: Dict) -> Optional[NeighborIndex]:
+    """
+    Открытие индекса соседей через mmap без копирования массивов в память процесса.
+
+    :param path: Путь к файлу кэша
+    :param expected_meta: Ожидаемые параметры построения и отпечаток датасета
+    :return: Индекс соседей или None если кэш отсутствует или устарел
+    """
+    arrays = load_arrays(path, MAGIC, expected_meta)
+    if arrays is None:
+        return None
+    return NeighborIndex(arrays["item_ids"], arrays["indptr"], arrays["indices"], arrays["data"])
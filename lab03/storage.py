@@ -1,71 +1,185 @@
 import json
+import logging
+import sqlite3
+import threading
+import time
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Iterable, Optional, Tuple
+
+# PRAGMA user_version базы: 1 — оценки из JSON-файла прежней версии перенесены
+SCHEMA_VERSION = 1
+
+logger = logging.getLogger(__name__)
 
 
 class Storage:
     """
-    Класс для хранения данных локального пользователя в JSON файле.
+    Хранилище оценок пользователей бота в SQLite, ключ — ID пользователя Telegram.
+
+    База работает в режиме WAL: каждая запись дописывается в журнал (-wal файл), а перенос
+    журнала в основной файл (checkpoint) выполняется не при записи, а отдельным вызовом
+    compact(), который бот запускает в фоне. Пакет оценок записывается одной транзакцией.
+    Чтение идёт через отдельное соединение только для чтения: в режиме WAL оно не ждёт ни
+    фиксации и fsync записи, ни checkpoint, которые выполняются под блокировкой записи.
     """
 
-    def __init__(self, path: str):
+    def __init__(self, path: str, legacy_path: Optional[str] = None, legacy_user_id: Optional[int] = None):
         """
         Инициализация хранилища.
 
-        :param path: Путь к JSON файлу
+        :param path: Путь к файлу базы SQLite
+        :param legacy_path: JSON-файл прежней версии с оценками общего local_user, которые
+            один раз переносятся в базу (None — без переноса), defaults to None
+        :param legacy_user_id: ID пользователя Telegram, которому достаются перенесённые оценки
+            (None — перенос откладывается до запуска с указанным ID), defaults to None
         """
         self.path = Path(path)
-        self._data: Dict[str, Any] = {}
-        self._load()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        # Автоматический checkpoint отключён: журнал переносится в фоне через compact()
+        self._conn.execute("PRAGMA wal_autocheckpoint=0")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ratings ("
+            "user_id INTEGER NOT NULL, movie_id INTEGER NOT NULL, rating REAL NOT NULL, "
+            "updated_at REAL NOT NULL, PRIMARY KEY (user_id, movie_id)) WITHOUT ROWID"
+        )
+        if legacy_path is not None:
+            self._import_legacy(Path(legacy_path), legacy_user_id)
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True,
+                                       check_same_thread=False, isolation_level=None)
 
-    def _load(self) -> None:
+    def _import_legacy(self, legacy_path: Path, user_id: Optional[int]) -> None:
         """
-        Загрузка данных из файла в память.
-        """
-        if self.path.exists():
-            try:
-                with self.path.open("r", encoding="utf-8") as f:
-                    self._data = json.load(f)
-            except Exception:
-                self._data = {}
-        else:
-            self._data = {}
+        Однократный перенос оценок из JSON-файла прежней версии {"local_user": {"ratings": {...}}}.
 
-        if "local_user" not in self._data:
-            self._data["local_user"] = {"ratings": {}}
-            self._save()
+        Перенос выполняется при первом открытии базы этой версией (user_version < SCHEMA_VERSION)
+        одной транзакцией с повышением user_version. Оценки, уже записанные в базу, не заменяются.
+        Файл не удаляется. Если в файле есть оценки, а пользователь не задан, перенос пропускается
+        без повышения user_version и выполнится при запуске с заданным пользователем.
 
-    def _save(self) -> None:
-        """
-        Сохранение данных из памяти в файл.
+        :param legacy_path: Путь к JSON-файлу
+        :param user_id: ID пользователя Telegram, которому достаются оценки (None — не задан)
         """
-        self.path.parent.mkdir(parents=True, exist_ok=True)
-        with self.path.open("w", encoding="utf-8") as f:
-            json.dump(self._data, f, ensure_ascii=False, indent=2)
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return None
+        ratings = []
+        if legacy_path.exists():
+            try:
+                with legacy_path.open("r", encoding="utf-8") as f:
+                    local_user = json.load(f).get("local_user", {})
+                ratings = [(user_id, int(movie_id), float(rating), time.time())
+                           for movie_id, rating in local_user.get("ratings", {}).items()]
+            except (OSError, ValueError, AttributeError) as e:
+                # Версия не повышается: перенос повторится при следующем запуске
+                print(f"Ошибка чтения {legacy_path}, оценки не перенесены: {e}")
+                return None
+        if ratings and user_id is None:
+            logger.warning("Оценки из %s не перенесены: не задан пользователь (LEGACY_USER_ID или ADMIN_IDS)",
+                           legacy_path)
+            return None
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "INSERT INTO ratings (user_id, movie_id, rating, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (user_id, movie_id) DO NOTHING", ratings)
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        if ratings:
+            print(f"Перенесено оценок из {legacy_path}: {len(ratings)} (пользователь {user_id})")
 
-    def get_local_user(self) -> Dict:
+    def get_user_ratings(self, user_id: int) -> Dict[int, float]:
         """
-        Получение данных локального пользователя.
+        Получение оценок пользователя.
 
-        :return: Словарь с данными пользователя
+        :param user_id: ID пользователя Telegram
+        :return: Словарь {movie_id: rating}
         """
-        return self._data.get("local_user", {"ratings": {}})
+        with self._read_lock:
+            rows = self._reader.execute("SELECT movie_id, rating FROM ratings WHERE user_id = ?", (user_id,))
+            return {int(movie_id): float(rating) for movie_id, rating in rows}
 
-    def add_rating(self, movie_id: int, rating: float) -> None:
+    def add_rating(self, user_id: int, movie_id: int, rating: float) -> None:
         """
         Добавление или обновление оценки фильма.
 
+        :param user_id: ID пользователя Telegram
         :param movie_id: ID фильма
         :param rating: Оценка фильма
         """
-        self._data.setdefault(
-            "local_user", {"ratings": {}})
-        self._data["local_user"]["ratings"][str(movie_id)] = float(rating)
-        self._save()
+        self.add_ratings([(user_id, movie_id, rating)])
+
+    def add_ratings(self, ratings: Iterable[Tuple[int, int, float]]) -> int:
+        """
+        Добавление или обновление пакета оценок одной транзакцией.
+
+        :param ratings: Кортежи (user_id, movie_id, rating); для повторной пары сохраняется последняя
+        :return: Количество записанных оценок
+        """
+        rows = list(ratings)
+        self.write_batch([], rows)
+        return len(rows)
+
+    def write_batch(self, cleared_users: Iterable[int], ratings: Iterable[Tuple[int, int, float]]) -> None:
+        """
+        Удаление оценок пользователей и запись новых оценок одной транзакцией.
+
+        Сначала удаляются оценки cleared_users, затем записываются ratings.
+
+        :param cleared_users: ID пользователей, чьи оценки удаляются
+        :param ratings: Кортежи (user_id, movie_id, rating)
+        """
+        now = time.time()
+        cleared = [(int(user_id),) for user_id in cleared_users]
+        rows = [(int(user_id), int(movie_id), float(rating), now) for user_id, movie_id, rating in ratings]
+        if not cleared and not rows:
+            return None
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("DELETE FROM ratings WHERE user_id = ?", cleared)
+                self._conn.executemany(
+                    "INSERT INTO ratings (user_id, movie_id, rating, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (user_id, movie_id) DO UPDATE SET rating = excluded.rating, "
+                    "updated_at = excluded.updated_at", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def clear_user(self, user_id: int) -> None:
+        """
+        Удаление всех оценок пользователя.
+
+        :param user_id: ID пользователя Telegram
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM ratings WHERE user_id = ?", (user_id,))
+
+    def compact(self) -> int:
+        """
+        Перенос журнала WAL в основной файл базы с усечением журнала.
+
+        :return: Размер журнала до переноса в байтах
+        """
+        wal_path = self.path.with_name(self.path.name + "-wal")
+        with self._lock:
+            size = wal_path.stat().st_size if wal_path.exists() else 0
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        return size
 
-    def clear_local_user(self) -> None:
+    def close(self) -> None:
         """
-        Очистка всех данных локального пользователя.
+        Перенос журнала и закрытие соединений.
         """
-        self._data["local_user"] = {"ratings": {}}
-        self._save()
+        with self._read_lock:
+            self._reader.close()
+        self.compact()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,42 @@
+import asyncio
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_handler import DataProcessor  # noqa: E402
+
+
+def make_ratings(n_users: int = 40, n_movies: int = 30, density: float = 0.45, seed: int = 0) -> pd.DataFrame:
+    """
+    Случайные оценки 1..5 в формате u.data.
+
+    :param n_users: Количество пользователей, defaults to 40
+    :param n_movies: Количество фильмов, defaults to 30
+    :param density: Доля заполненных ячеек, defaults to 0.45
+    :param seed: Зерно генератора, defaults to 0
+    :return: DataFrame с колонками user_id, movie_id, rating, timestamp
+    """
+    rng = np.random.default_rng(seed)
+    users, movies = np.nonzero(rng.random((n_users, n_movies)) < density)
+    return pd.DataFrame({
+        'user_id': (users + 1).astype(np.int32),
+        'movie_id': (movies + 1).astype(np.int32),
+        'rating': rng.integers(1, 6, len(users)).astype(np.float32),
+        'timestamp': np.arange(len(users), dtype=np.int64)
+    })
+
+
+@pytest.fixture
+def ratings_df() -> pd.DataFrame:
+    return make_ratings()
+
+
+@pytest.fixture
+def data_processor(ratings_df: pd.DataFrame) -> DataProcessor:
+    dp = DataProcessor()
+    asyncio.run(dp.set_ratings(ratings_df))
+    return dp
@@ -0,0 +1,73 @@
+import asyncio
+import numpy as np
+import pytest
+from ann_index import LSHUserIndex
+from conftest import make_ratings
+from data_handler import DataProcessor
+from user_index import UserSimilarityIndex
+
+MIN_COMMON = 3
+TOP_N = 10
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    dp = DataProcessor()
+    asyncio.run(dp.set_ratings(make_ratings(n_users=300, n_movies=40, density=0.4, seed=2)))
+    return dp
+
+
+@pytest.fixture(scope="module")
+def exact(dataset):
+    return UserSimilarityIndex(dataset.user_ids, dataset.movie_ids, dataset.user_item_matrix)
+
+
+@pytest.fixture(scope="module")
+def profiles(dataset):
+    return [dataset.get_user_ratings(user_id) for user_id in dataset.get_all_users()[:50]]
+
+
+def _recall(exact, lsh, profiles):
+    """
+    Доля найденных пользователей со сходством не ниже десятого сходства точного поиска.
+    """
+    hits = total = 0
+    for ratings in profiles:
+        expected = exact.most_similar(ratings, MIN_COMMON, TOP_N)
+        found = lsh.most_similar(ratings, MIN_COMMON, TOP_N)
+        hits += sum(1 for _, sim in found if sim >= expected[-1][1] - 1e-12)
+        total += len(expected)
+    return hits / total
+
+
+def test_lsh_recall_against_exact_search(exact, profiles):
+    recall = _recall(exact, LSHUserIndex(exact, n_tables=16, n_bits=6, probes=1), profiles)
+    assert recall >= 0.9
+    assert _recall(exact, LSHUserIndex(exact, n_tables=4, n_bits=6, probes=0), profiles) < recall
+
+
+def test_lsh_ranks_candidates_by_exact_similarity(exact, profiles):
+    lsh = LSHUserIndex(exact, n_tables=8, n_bits=6)
+    for ratings in profiles[:10]:
+        rows = lsh.candidates(ratings)
+        assert 0 < len(rows) <= len(exact)
+        sims = exact.similarities(ratings, MIN_COMMON)
+        for user_id, sim in lsh.most_similar(ratings, MIN_COMMON, TOP_N):
+            row = int(np.flatnonzero(exact.user_ids == user_id)[0])
+            assert row in rows
+            assert sim == pytest.approx(sims[row])
+    assert lsh.most_similar({}, MIN_COMMON, TOP_N) == []
+
+
+def test_saved_tables_are_reused_only_for_the_same_data(exact, profiles, tmp_path):
+    lsh = LSHUserIndex(exact, n_tables=8, n_bits=6)
+    meta = {"ratings_sha256": "abc"}
+    lsh.save(tmp_path / "lsh.npz", meta)
+
+    loaded = LSHUserIndex.load(tmp_path / "lsh.npz", exact, meta, 8, 6, 1)
+    np.testing.assert_array_equal(loaded.codes, lsh.codes)
+    np.testing.assert_array_equal(loaded.order, lsh.order)
+    ratings = profiles[0]
+    assert loaded.most_similar(ratings, MIN_COMMON, TOP_N) == lsh.most_similar(ratings, MIN_COMMON, TOP_N)
+    assert LSHUserIndex.load(tmp_path / "lsh.npz", exact, {"ratings_sha256": "def"}, 8, 6, 1) is None
+    assert LSHUserIndex.load(tmp_path / "lsh.npz", exact, meta, 8, 7, 1) is None
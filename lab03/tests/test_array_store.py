@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from array_store import ArrayFileWriter, load_arrays, save_arrays
+
+MAGIC = b"TESTARR\0"
+META = {"source": "test", "n": 3}
+
+
+def _arrays():
+    rng = np.random.default_rng(0)
+    return {
+        "ids": np.arange(1, 101, dtype=np.int32),
+        "scores": rng.random(100).astype(np.float32),
+        "flags": rng.random(7) < 0.5,
+        "empty": np.zeros(0, dtype=np.int64)
+    }
+
+
+def test_saved_arrays_round_trip(tmp_path):
+    arrays = _arrays()
+    save_arrays(tmp_path / "a.bin", MAGIC, arrays, META)
+
+    loaded = load_arrays(tmp_path / "a.bin", MAGIC, META)
+    assert set(loaded) == set(arrays)
+    for name, array in arrays.items():
+        np.testing.assert_array_equal(loaded[name], array)
+        assert loaded[name].dtype == array.dtype
+    assert load_arrays(tmp_path / "a.bin", MAGIC, {**META, "n": 4}) is None
+    assert load_arrays(tmp_path / "a.bin", b"OTHER\0\0\0", META) is None
+
+
+def test_writer_chunks_match_save_arrays(tmp_path):
+    arrays = _arrays()
+    save_arrays(tmp_path / "saved.bin", MAGIC, arrays, META)
+
+    writer = ArrayFileWriter(tmp_path / "written.bin", MAGIC,
+                             {name: (array.dtype, array.size) for name, array in arrays.items()}, META)
+    # Части пишутся не по порядку, как готовые блоки из пула процессов
+    for start in (60, 0, 30, 90):
+        writer.write("ids", start, arrays["ids"][start:start + 30])
+        writer.write("scores", start, arrays["scores"][start:start + 30])
+    writer.write("flags", 0, arrays["flags"])
+    assert not (tmp_path / "written.bin").exists()
+    writer.commit()
+
+    assert (tmp_path / "written.bin").read_bytes() == (tmp_path / "saved.bin").read_bytes()
+    loaded = load_arrays(tmp_path / "written.bin", MAGIC, META)
+    for name, array in arrays.items():
+        np.testing.assert_array_equal(loaded[name], array)
+
+
+def test_writer_rejects_out_of_range_chunks_and_aborts_cleanly(tmp_path):
+    writer = ArrayFileWriter(tmp_path / "a.bin", MAGIC, {"ids": (np.int32, 10)}, META)
+    with pytest.raises(IndexError):
+        writer.write("ids", 8, np.arange(3))
+    writer.abort()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,59 @@
+import json
+import numpy as np
+import pytest
+from array_store import load_arrays
+from batch_recommend import MAGIC, BinaryWriter, JsonlWriter, iter_recommendations
+from collab_filtering import CollaborativeFiltering
+
+N = 4
+
+
+@pytest.fixture
+def model(data_processor, tmp_path):
+    cf = CollaborativeFiltering(data_processor, min_common_users=2, top_k=5, cache_path=str(tmp_path / "cache.bin"))
+    cf.build_item_similarity()
+    return cf
+
+
+def _flatten(chunks):
+    return [entry for chunk in chunks for entry in chunk]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_matches_recommendations_of_each_user(model, data_processor, workers):
+    positions = np.arange(len(data_processor.user_ids))[::-1].copy()
+    results = _flatten(iter_recommendations(model, {}, positions, N, workers=workers, chunk_size=7))
+
+    assert [user_id for user_id, _ in results] == data_processor.user_ids[positions].tolist()
+    for user_id, items in results:
+        assert items == model.recommend(data_processor.get_user_ratings(user_id), N)
+
+
+def test_writers_store_every_user(model, data_processor, tmp_path):
+    positions = np.arange(len(data_processor.user_ids))
+    jsonl = JsonlWriter(tmp_path / "recommendations.jsonl")
+    binary = BinaryWriter(tmp_path / "recommendations.bin", len(positions), N, {"ratings": "u.data"})
+    results = []
+    for chunk in iter_recommendations(model, {}, positions, N, chunk_size=16):
+        for writer in (jsonl, binary):
+            writer.write(len(results), chunk)
+        results.extend(chunk)
+    jsonl.commit()
+    binary.commit()
+
+    lines = (tmp_path / "recommendations.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["user_id"] for line in lines] == [user_id for user_id, _ in results]
+    arrays = load_arrays(tmp_path / "recommendations.bin", MAGIC, {"ratings": "u.data", "n": N})
+    assert arrays["user_ids"].tolist() == [user_id for user_id, _ in results]
+    movie_ids = arrays["movie_ids"].reshape(-1, N)
+    ratings = arrays["ratings"].reshape(-1, N)
+    for row, (_, items) in enumerate(results):
+        assert movie_ids[row].tolist() == [movie_id for movie_id, _ in items] + [-1] * (N - len(items))
+        np.testing.assert_allclose(ratings[row, :len(items)], [score for _, score in items], rtol=1e-6)
+
+
+def test_aborted_writers_leave_no_files(tmp_path):
+    for writer in (JsonlWriter(tmp_path / "out.jsonl"), BinaryWriter(tmp_path / "out.bin", 3, N, {})):
+        writer.write(0, [(1, [(10, 4.5)])])
+        writer.abort()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,101 @@
+import asyncio
+import numpy as np
+import pytest
+from checkpointed_similarity import BYTES_PER_PAIR, CheckpointedSimilarityBuild
+from conftest import make_ratings
+from data_handler import DataProcessor
+from progress import ProgressReporter
+from similarity import ItemRatingMatrix
+
+MIN_COMMON = 3
+BLOCK_SIZE = 7
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class _InterruptingProgress(ProgressReporter):
+    """
+    Счётчик прогресса, прерывающий построение после заданного количества блоков.
+    """
+
+    def __init__(self, total: int, blocks: int) -> None:
+        super().__init__(total, "фильмов", min_interval=3600)
+        self.blocks = blocks
+
+    def advance(self, n: int = 1) -> None:
+        super().advance(n)
+        self.blocks -= 1
+        if self.blocks == 0:
+            raise _Interrupted()
+
+
+def _matrix(ratings_df):
+    dp = DataProcessor()
+    asyncio.run(dp.set_ratings(ratings_df))
+    return ItemRatingMatrix(dp.movie_ids, dp.item_user_matrix())
+
+
+def _builder(directory):
+    return CheckpointedSimilarityBuild(str(directory), MIN_COMMON, max_neighbors=10,
+                                       block_size=BLOCK_SIZE, memory_limit_mb=0)
+
+
+def _assert_same_index(actual, expected):
+    np.testing.assert_array_equal(actual.item_ids, expected.item_ids)
+    np.testing.assert_array_equal(actual.indptr, expected.indptr)
+    np.testing.assert_array_equal(actual.indices, expected.indices)
+    np.testing.assert_array_equal(actual.data, expected.data)
+
+
+def test_block_rows_fit_the_memory_limit():
+    build = CheckpointedSimilarityBuild("unused", MIN_COMMON, 10, block_size=256, memory_limit_mb=1, workers=2)
+    rows = build.block_rows(1000)
+    assert 1 <= rows < 256
+    assert rows * 1000 * 2 * BYTES_PER_PAIR <= 2 ** 20
+
+
+def test_resumed_build_skips_finished_blocks(ratings_df, tmp_path):
+    matrix = _matrix(ratings_df)
+    expected = _builder(tmp_path / "full").build(matrix)
+
+    build = _builder(tmp_path / "resumed")
+    with pytest.raises(_Interrupted):
+        build.build(matrix, _InterruptingProgress(matrix.n_items, blocks=2))
+    finished = sorted(build.directory.glob("block_*.bin"))
+    assert [path.name for path in finished] == ["block_00000000.bin", "block_00000007.bin"]
+    mtimes = {path: path.stat().st_mtime_ns for path in finished}
+
+    progress = ProgressReporter(matrix.n_items, "фильмов", min_interval=3600)
+    _assert_same_index(build.build(matrix, progress), expected)
+    assert progress.done == matrix.n_items
+    assert {path: path.stat().st_mtime_ns for path in finished} == mtimes
+
+
+def test_changed_ratings_restart_the_build(ratings_df, tmp_path):
+    build = _builder(tmp_path / "blocks")
+    build.build(_matrix(ratings_df))
+    orphan = build.directory / "block_99999999.bin"
+    orphan.write_bytes(b"stale")
+
+    changed = make_ratings(seed=1)
+    index = build.build(_matrix(changed))
+    assert not orphan.exists()
+    _assert_same_index(index, _builder(tmp_path / "fresh").build(_matrix(changed)))
+
+
+def test_blocks_without_manifest_are_removed(ratings_df, tmp_path):
+    build = _builder(tmp_path / "blocks")
+    build.directory.mkdir()
+    (build.directory / "block_00000000.bin").write_bytes(b"partial")
+    orphan = build.directory / "block_00000050.bin"
+    orphan.write_bytes(b"partial")
+
+    matrix = _matrix(ratings_df)
+    index = build.build(matrix)
+    assert not orphan.exists()
+    _assert_same_index(index, _builder(tmp_path / "fresh").build(matrix))
+
+    build.cleanup()
+    assert not build.directory.exists()
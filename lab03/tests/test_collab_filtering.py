@@ -0,0 +1,101 @@
+import math
+import numpy as np
+import pytest
+from collab_filtering import CollaborativeFiltering
+from similarity import SIMILARITY_THRESHOLD, pearson_item_similarity
+
+
+@pytest.fixture
+def model(data_processor, tmp_path):
+    cf = CollaborativeFiltering(data_processor, min_common_users=2, top_k=5,
+                                cache_path=str(tmp_path / "cache.bin"), max_neighbors=0)
+    cf.build_item_similarity()
+    return cf
+
+
+@pytest.mark.parametrize("k", [1, 5, 50])
+def test_predict_ratings_matches_predict_rating(model, data_processor, k):
+    movie_ids = data_processor.movie_ids.tolist() + [10_000]
+    compared = 0
+    for user_id in data_processor.get_all_users():
+        user_ratings = data_processor.get_user_ratings(user_id)
+        batch = model.predict_ratings(user_ratings, movie_ids, k).tolist()
+        for movie_id, actual in zip(movie_ids, batch):
+            expected = model.predict_rating(user_ratings, movie_id, k)
+            if expected is None:
+                assert math.isnan(actual), (user_id, movie_id)
+            else:
+                assert actual == pytest.approx(expected, abs=1e-9), (user_id, movie_id)
+                compared += 1
+    assert compared > 0
+
+
+def test_predict_ratings_without_user_ratings(model, data_processor):
+    assert all(math.isnan(value) for value in model.predict_ratings({}, data_processor.movie_ids.tolist()))
+
+
+def _baseline_predict(ratings_df, sim, user_ratings, item_id, k):
+    """
+    Предсказание прежним алгоритмом: перебор всех оценок пользователя по полной матрице сходств.
+    """
+    similarities = [(movie_id, sim[item_id][movie_id], rating) for movie_id, rating in user_ratings.items()
+                    if sim.get(item_id, {}).get(movie_id, 0) > 0]
+    if not similarities or item_id not in set(ratings_df['movie_id']):
+        return None
+    similarities.sort(key=lambda x: x[1], reverse=True)
+    means = ratings_df.groupby('movie_id')['rating'].mean()
+    numerator = sum(similarity * (rating - means[movie_id]) for movie_id, similarity, rating in similarities[:k])
+    denominator = sum(abs(similarity) for _, similarity, _ in similarities[:k])
+    return max(1.0, min(5.0, means[item_id] + numerator / denominator))
+
+
+@pytest.mark.parametrize("k", [3, 20])
+def test_predict_rating_without_truncation_matches_baseline(data_processor, ratings_df, tmp_path, k):
+    cf = CollaborativeFiltering(data_processor, min_common_users=2, top_k=k,
+                                cache_path=str(tmp_path / "cache.bin"), max_neighbors=None)
+    cf.build_item_similarity()
+    movie_ids = sorted(set(ratings_df['movie_id'].tolist()))
+    sim = {movie_id: {} for movie_id in movie_ids}
+    for i, item_i in enumerate(movie_ids):
+        for item_j in movie_ids[i + 1:]:
+            value = pearson_item_similarity(item_i, item_j, ratings_df, 2)
+            if value is not None and abs(value) > SIMILARITY_THRESHOLD:
+                sim[item_i][item_j] = sim[item_j][item_i] = value
+
+    compared = 0
+    for user_id in data_processor.get_all_users()[:10]:
+        user_ratings = data_processor.get_user_ratings(user_id)
+        for movie_id in movie_ids:
+            expected = _baseline_predict(ratings_df, sim, user_ratings, movie_id, k)
+            actual = cf.predict_rating(user_ratings, movie_id, k)
+            if expected is None:
+                assert actual is None, (user_id, movie_id)
+            else:
+                assert actual == pytest.approx(expected, abs=1e-5), (user_id, movie_id)
+                compared += 1
+    assert compared > 0
+
+
+def _expected_candidates(cf, user_ratings, per_item):
+    expected = set()
+    for movie_id in user_ratings:
+        neighbor_ids, sims = cf.sim.neighbors(movie_id)
+        positive = neighbor_ids[sims > 0].tolist()
+        expected.update(positive[:per_item] if per_item else positive)
+    return expected - set(user_ratings)
+
+
+@pytest.mark.parametrize("per_item", [0, 1, 3])
+def test_candidates_are_the_strongest_unrated_neighbors(data_processor, tmp_path, per_item):
+    cf = CollaborativeFiltering(data_processor, min_common_users=2, top_k=5, cache_path=str(tmp_path / "cache.bin"),
+                                max_neighbors=0, candidates_per_item=per_item)
+    cf.build_item_similarity()
+    for user_id in data_processor.get_all_users()[:10]:
+        user_ratings = dict(list(data_processor.get_user_ratings(user_id).items())[:3])
+        candidates = cf.candidate_items(user_ratings)
+
+        assert len(candidates) == len(set(candidates))
+        assert set(candidates) == _expected_candidates(cf, user_ratings, per_item)
+        ranks = data_processor.item_stats.ranks_for(np.array(candidates, dtype=np.int64))
+        assert (np.diff(ranks) >= 0).all()
+    assert cf.candidate_items({}) == []
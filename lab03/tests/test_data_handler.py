@@ -0,0 +1,165 @@
+import asyncio
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from data_handler import DataProcessor
+
+
+def _new_ratings(rows, start=10_000):
+    return pd.DataFrame({
+        'user_id': np.array([row[0] for row in rows], dtype=np.int32),
+        'movie_id': np.array([row[1] for row in rows], dtype=np.int32),
+        'rating': np.array([row[2] for row in rows], dtype=np.float32),
+        'timestamp': np.arange(start, start + len(rows), dtype=np.int64)
+    })
+
+
+def test_add_ratings_keeps_previous_matrix_unchanged(data_processor):
+    old_matrix = data_processor.user_item_matrix
+    old_shape, old_data = old_matrix.shape, old_matrix.data.copy()
+    old_indptr, old_indices = old_matrix.indptr.copy(), old_matrix.indices.copy()
+
+    data_processor.add_ratings(_new_ratings([(1, 1, 5.0), (1, 2, 1.0), (500, 3, 4.0), (2, 700, 2.0)]))
+
+    assert data_processor.user_item_matrix is not old_matrix
+    assert old_matrix.shape == old_shape
+    assert np.array_equal(old_matrix.data, old_data)
+    assert np.array_equal(old_matrix.indptr, old_indptr)
+    assert np.array_equal(old_matrix.indices, old_indices)
+    assert data_processor.get_user_ratings(500) == {3: 4.0}
+    assert data_processor.get_user_ratings(2)[700] == 2.0
+
+
+def test_add_ratings_replaces_rows_of_the_same_pair(data_processor):
+    data_processor.add_ratings(_new_ratings([(1, 1, 5.0), (1, 1, 2.0), (3, 4, 1.0)]))
+    data_processor.add_ratings(_new_ratings([(3, 4, 3.0)], start=20_000))
+
+    df = data_processor.ratings_df
+    assert not df.duplicated(['user_id', 'movie_id']).any()
+    assert df.loc[(df['user_id'] == 1) & (df['movie_id'] == 1), 'rating'].tolist() == [2.0]
+    assert df.loc[(df['user_id'] == 3) & (df['movie_id'] == 4), 'rating'].tolist() == [3.0]
+
+    # Перестроение из ratings_df даёт ту же матрицу, что и добавление оценок
+    rebuilt = DataProcessor()
+    asyncio.run(rebuilt.set_ratings(df))
+    for user_id in data_processor.get_all_users():
+        assert rebuilt.get_user_ratings(user_id) == data_processor.get_user_ratings(user_id)
+
+
+def test_add_ratings_bumps_data_version(data_processor):
+    version = data_processor.version
+    data_processor.add_ratings(_new_ratings([]))
+    assert data_processor.version == version
+
+    data_processor.add_ratings(_new_ratings([(1, 1, 5.0)]))
+    assert data_processor.version == version + 1
+
+
+def test_older_rating_does_not_replace_newer_one(data_processor):
+    data_processor.add_ratings(_new_ratings([(1, 1, 5.0)], start=20_000))
+    data_processor.add_ratings(_new_ratings([(1, 1, 1.0)], start=15_000))
+    assert data_processor.get_user_ratings(1)[1] == 5.0
+
+
+def test_streamed_ratings_match_cold_load_of_the_same_file(ratings_df):
+    rng = np.random.default_rng(1)
+    # Повторные оценки тех же пар, в том числе с более ранним временем и с тем же временем
+    repeats = ratings_df.sample(n=120, random_state=1).copy()
+    repeats['rating'] = rng.integers(1, 6, len(repeats)).astype(np.float32)
+    repeats['timestamp'] = repeats['timestamp'] + rng.integers(-300, 300, len(repeats))
+    newcomers = pd.DataFrame({'user_id': np.array([900, 900, 5], dtype=np.int32),
+                              'movie_id': np.array([1, 800, 800], dtype=np.int32),
+                              'rating': np.array([4, 2, 5], dtype=np.float32),
+                              'timestamp': np.array([7, 7, 3], dtype=np.int64)})
+    rows = pd.concat([ratings_df, repeats, newcomers, repeats.iloc[:10]]).sample(frac=1.0, random_state=2)
+    rows = rows.reset_index(drop=True)
+
+    cold = DataProcessor()
+    asyncio.run(cold.set_ratings(rows))
+    streamed = DataProcessor()
+    asyncio.run(streamed.set_ratings(rows.iloc[:300].reset_index(drop=True)))
+    for start in range(300, len(rows), 37):
+        streamed.add_ratings(rows.iloc[start:start + 37].reset_index(drop=True))
+
+    assert sorted(streamed.get_all_users()) == sorted(cold.get_all_users())
+    for user_id in cold.get_all_users():
+        assert streamed.get_user_ratings(user_id) == cold.get_user_ratings(user_id)
+    columns = ['user_id', 'movie_id', 'rating', 'timestamp']
+    assert (streamed.ratings_df.sort_values(columns).reset_index(drop=True)
+            .equals(cold.ratings_df.sort_values(columns).reset_index(drop=True)))
+    movie_ids = cold.movie_ids
+    assert np.allclose(streamed.item_stats.means_for(movie_ids), cold.item_stats.means_for(movie_ids))
+    assert streamed.item_stats.top_popular(10) == cold.item_stats.top_popular(10)
+
+
+def _dataset_processor(tmp_path, ratings_df):
+    """
+    Обработчик данных с u.data и u.item во временном каталоге и снимком рядом.
+    """
+    ratings_path = tmp_path / "u.data"
+    if not ratings_path.exists():
+        ratings_df.to_csv(ratings_path, sep='\t', header=False, index=False)
+        movie_ids = sorted(set(ratings_df['movie_id'].tolist()))
+        lines = [f"{movie_id}|Movie {movie_id} (1995)|01-Jan-1995||http://x|" + "|".join(
+            "1" if (movie_id + genre) % 5 == 0 else "0" for genre in range(19)) for movie_id in movie_ids]
+        (tmp_path / "u.item").write_text("\n".join(lines) + "\n", encoding="latin-1")
+    dp = DataProcessor()
+    dp.config = {"dataset_users_path": str(ratings_path), "dataset_films_path": str(tmp_path / "u.item"),
+                 "snapshot_path": str(tmp_path / "snapshot.bin")}
+    asyncio.run(dp.load_data())
+    return dp
+
+
+def test_snapshot_gives_the_same_data_as_parsing(tmp_path, ratings_df):
+    parsed = _dataset_processor(tmp_path, ratings_df)
+    assert (tmp_path / "snapshot.bin").exists()
+    loaded = _dataset_processor(tmp_path, ratings_df)
+
+    assert loaded.ratings_offset == parsed.ratings_offset == (tmp_path / "u.data").stat().st_size
+    assert np.array_equal(loaded.user_ids, parsed.user_ids)
+    assert np.array_equal(loaded.movie_ids, parsed.movie_ids)
+    assert (loaded.user_item_matrix != parsed.user_item_matrix).nnz == 0
+    assert loaded.ratings_df.equals(parsed.ratings_df)
+    assert loaded.get_movie_title(1) == parsed.get_movie_title(1) == "Movie 1 (1995)"
+
+
+def test_snapshot_is_rebuilt_after_an_edit_with_the_same_size_and_mtime(tmp_path, ratings_df):
+    _dataset_processor(tmp_path, ratings_df)
+    ratings_path = tmp_path / "u.data"
+    stat = ratings_path.stat()
+    first = ratings_df.iloc[0]
+    text = ratings_path.read_text()
+    line = f"{first['user_id']}\t{first['movie_id']}\t{first['rating']}\t{first['timestamp']}"
+    edited = line.replace(f"\t{first['rating']}\t", f"\t{6.0 - first['rating']}\t")
+    ratings_path.write_text(text.replace(line, edited, 1))
+    os.utime(ratings_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert ratings_path.stat().st_size == stat.st_size
+
+    reloaded = _dataset_processor(tmp_path, ratings_df)
+    assert reloaded.get_user_ratings(int(first['user_id']))[int(first['movie_id'])] == 6.0 - first['rating']
+
+
+def test_genre_masks_and_filters(tmp_path, ratings_df):
+    dp = _dataset_processor(tmp_path, ratings_df)
+    genres_of = {movie_id: {bit for bit in range(19) if (movie_id + bit) % 5 == 0}
+                 for movie_id in dp.movie_ids.tolist()}
+    assert dp.get_movie_genres(3) == [dp.genre_names[bit] for bit in sorted(genres_of[3])]
+    assert dp.get_movie_genres(10_000) == []
+
+    action, drama = dp.genre_names.index("Action"), dp.genre_names.index("Drama")
+    include = dp.genre_mask(["action", " Drama"])
+    assert include == (1 << action) | (1 << drama)
+    exclude = dp.genre_mask(["Comedy"])
+    comedy = dp.genre_names.index("Comedy")
+    with pytest.raises(ValueError):
+        dp.genre_mask(["Action", "Space Opera"])
+
+    allowed = dp.genre_filter(dp.movie_ids, include, exclude)
+    expected = [bool(genres_of[m] & {action, drama}) and comedy not in genres_of[m] for m in dp.movie_ids.tolist()]
+    assert allowed.tolist() == expected
+
+    popular = dp.get_top_popular_movies(len(dp.movie_ids))
+    filtered = dp.get_top_popular_movies(3, include, exclude)
+    assert len(filtered) == 3
+    assert filtered == [m for m in popular if genres_of[m] & {action, drama} and comedy not in genres_of[m]][:3]
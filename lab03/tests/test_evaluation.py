@@ -0,0 +1,77 @@
+import asyncio
+import math
+import numpy as np
+import pytest
+from evaluation import evaluate_recommender, ranking_metrics, rating_metrics, split_ratings
+
+
+def _rows(df):
+    return set(zip(df['user_id'].tolist(), df['movie_id'].tolist()))
+
+
+@pytest.mark.parametrize("method", ["random", "temporal"])
+def test_split_is_a_reproducible_partition(ratings_df, method):
+    train, test = split_ratings(ratings_df, method, test_fraction=0.25, seed=7)
+    again_train, again_test = split_ratings(ratings_df, method, test_fraction=0.25, seed=7)
+
+    assert train.equals(again_train) and test.equals(again_test)
+    assert len(train) + len(test) == len(ratings_df)
+    assert _rows(train) | _rows(test) == _rows(ratings_df)
+    assert not _rows(train) & _rows(test)
+    if method == "random":
+        assert len(test) == int(len(ratings_df) * 0.25)
+    with pytest.raises(ValueError):
+        split_ratings(ratings_df, "by_genre")
+
+
+def test_temporal_split_holds_out_the_latest_ratings_of_each_user(ratings_df):
+    train, test = split_ratings(ratings_df, "temporal", test_fraction=0.25)
+    for user_id, user_ratings in ratings_df.groupby('user_id'):
+        held_out = test[test['user_id'] == user_id]
+        assert len(held_out) == int(len(user_ratings) * 0.25)
+        if len(held_out):
+            kept = train[train['user_id'] == user_id]
+            assert kept['timestamp'].max() <= held_out['timestamp'].min()
+
+
+def test_metrics_on_known_values():
+    metrics = rating_metrics(np.array([4.0, np.nan, 2.0, 5.0]), np.array([3.0, 4.0, 2.0, 3.0]))
+    assert metrics["rmse"] == pytest.approx(math.sqrt(5 / 3))
+    assert metrics["mae"] == pytest.approx(1.0)
+    assert (metrics["coverage"], metrics["predictions"]) == (0.75, 4)
+
+    precision, recall, ndcg = ranking_metrics([1, 2, 3, 4], {2, 4, 9}, k=4)
+    assert (precision, recall) == (0.5, 2 / 3)
+    ideal = 1 + 1 / math.log2(3) + 1 / math.log2(4)
+    assert ndcg == pytest.approx((1 / math.log2(3) + 1 / math.log2(5)) / ideal)
+
+
+class _Oracle:
+    """
+    Модель, знающая тестовые оценки: предсказывает их точно и рекомендует лучшие тестовые фильмы.
+    """
+
+    def __init__(self, train_df, test_df):
+        self.users = {frozenset(zip(group['movie_id'], group['rating'])): user_id
+                      for user_id, group in train_df.groupby('user_id')}
+        self.test = {user_id: dict(zip(group['movie_id'], group['rating']))
+                     for user_id, group in test_df.groupby('user_id')}
+
+    def predict_ratings(self, ratings, item_ids):
+        test = self.test[self.users[frozenset(ratings.items())]]
+        return np.array([test[item_id] for item_id in item_ids], dtype=np.float64)
+
+    async def generate_recommendations(self, ratings, n):
+        test = self.test[self.users[frozenset(ratings.items())]]
+        return sorted(test.items(), key=lambda x: (-x[1], x[0]))[:n]
+
+
+def test_evaluate_recommender_scores_a_perfect_model(ratings_df):
+    train, test = split_ratings(ratings_df, "temporal", test_fraction=0.3)
+    result = asyncio.run(evaluate_recommender(_Oracle(train, test), train, test, k=3))
+
+    assert result["rmse"] == 0.0 and result["coverage"] == 1.0
+    assert result["users"] == test['user_id'].nunique()
+    assert result["ranked_users"] > 0
+    assert result["ndcg@3"] == pytest.approx(1.0)
+    assert set(result["latency"]) == {"p50_ms", "p95_ms", "p99_ms"}
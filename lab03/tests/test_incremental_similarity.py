@@ -0,0 +1,57 @@
+import asyncio
+import numpy as np
+import pandas as pd
+import pytest
+from collab_filtering import CollaborativeFiltering
+
+
+def _rows(index):
+    return {int(movie_id): index.neighbors(int(movie_id)) for movie_id in index.item_ids}
+
+
+def _events(ratings_df, seed):
+    """
+    Новые оценки (в том числе новых пользователей и фильмов) и изменения части прежних.
+    """
+    rng = np.random.default_rng(seed)
+    initial = ratings_df.sample(frac=0.8, random_state=seed)
+    added = ratings_df.drop(initial.index)
+    changed = initial.iloc[rng.choice(len(initial), 60, replace=False)].copy()
+    changed['rating'] = rng.integers(1, 6, len(changed)).astype(np.float32)
+    extra = pd.DataFrame({
+        'user_id': np.array([900, 900, 900, 1, 2, 3], dtype=np.int32),
+        'movie_id': np.array([1, 2, 500, 500, 500, 500], dtype=np.int32),
+        'rating': np.array([5, 4, 3, 4, 2, 5], dtype=np.float32),
+        'timestamp': np.zeros(6, dtype=np.int64)
+    })
+    events = pd.concat([added, changed, extra]).sample(frac=1.0, random_state=seed).reset_index(drop=True)
+    # Новые оценки позже всех прежних, поэтому заменяют их
+    events['timestamp'] = ratings_df['timestamp'].max() + 1 + np.arange(len(events))
+    return initial.reset_index(drop=True), events
+
+
+@pytest.mark.parametrize("max_neighbors", [0, 4])
+@pytest.mark.parametrize("batch", [1, 25])
+def test_incremental_updates_match_full_rebuild(data_processor, ratings_df, tmp_path, max_neighbors, batch):
+    initial, events = _events(ratings_df, seed=max_neighbors + batch)
+    asyncio.run(data_processor.set_ratings(initial))
+    params = dict(min_common_users=2, top_k=5, cache_path=str(tmp_path / "cache.bin"),
+                  max_neighbors=max_neighbors, similar_items=3)
+    cf = CollaborativeFiltering(data_processor, incremental=True, **params)
+    cf.build_item_similarity()
+    for start in range(0, len(events), batch):
+        cf.update_ratings(events.iloc[start:start + batch])
+
+    full = CollaborativeFiltering(data_processor, **params)
+    full.build_item_similarity()
+
+    assert np.array_equal(cf.sim.item_ids, full.sim.item_ids)
+    for index, expected_index in ((cf.sim, full.sim), (cf.similar, full.similar)):
+        updated, expected = _rows(index), _rows(expected_index)
+        for movie_id, (neighbor_ids, sims) in expected.items():
+            assert np.array_equal(updated[movie_id][0], neighbor_ids), movie_id
+            assert np.allclose(updated[movie_id][1], sims, atol=1e-6), movie_id
+    # Сохранение в кэш собирает строки индекса подряд
+    compact = cf.sim.compacted()
+    assert compact.indptr is not None
+    assert all(np.array_equal(compact.neighbors(m)[0], full.sim.neighbors(m)[0]) for m in full.sim.item_ids.tolist())
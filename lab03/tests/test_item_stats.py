@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from item_stats import DEFAULT_MEAN, ItemStatistics
+
+
+def _matrix(rows):
+    return sp.csr_matrix(np.array(rows, dtype=np.float32))
+
+
+def test_statistics_match_ratings_table(ratings_df):
+    grouped = ratings_df.groupby('movie_id')['rating']
+    movie_ids = np.array(sorted(grouped.groups), dtype=np.int32)
+    users, cols = ratings_df['user_id'].to_numpy() - 1, np.searchsorted(movie_ids, ratings_df['movie_id'].to_numpy())
+    matrix = sp.csr_matrix((ratings_df['rating'].to_numpy(), (users, cols)))
+    stats = ItemStatistics.from_matrix(movie_ids, matrix)
+
+    assert np.allclose(stats.means_for(movie_ids), grouped.mean().loc[movie_ids].to_numpy())
+    assert stats.counts_for(movie_ids).tolist() == grouped.size().loc[movie_ids].tolist()
+    by_count = sorted(movie_ids.tolist(), key=lambda movie_id: (-stats.count(movie_id), movie_id))
+    assert stats.top_popular(5) == by_count[:5]
+    assert stats.popularity_rank(by_count[0]) == 1
+    assert stats.mean(10_000) == DEFAULT_MEAN and 10_000 not in stats
+
+
+def test_apply_changes_matches_rebuild_and_keeps_previous_arrays():
+    stats = ItemStatistics.from_matrix(np.array([10, 20, 30]), _matrix([[5, 0, 3], [4, 2, 0]]))
+    old_counts, old_means = stats.counts, stats.means
+
+    # Оценка фильма 20 изменена с 2 на 4, добавлены две оценки нового фильма 40
+    stats.apply_changes(np.array([20, 40, 40]), np.array([2.0, np.nan, np.nan]), np.array([4.0, 1.0, 5.0]))
+    rebuilt = ItemStatistics.from_matrix(np.array([10, 20, 30, 40]), _matrix([[5, 0, 3, 1], [4, 4, 0, 5]]))
+
+    ids = np.array([10, 20, 30, 40])
+    assert np.allclose(stats.means_for(ids), rebuilt.means_for(ids))
+    assert stats.counts_for(ids).tolist() == rebuilt.counts_for(ids).tolist()
+    assert stats.top_popular(4) == rebuilt.top_popular(4)
+    assert stats.describe(40) == pytest.approx(rebuilt.describe(40))
+    # Массивы, которые уже читает другой поток, не меняются
+    assert old_counts.tolist() == [2, 1, 1]
+    assert old_means.tolist() == [4.5, 2.0, 3.0]
+    assert len(stats.counts) == len(stats.means) == len(stats.movie_ids) == 4
@@ -0,0 +1,30 @@
+import asyncio
+import numpy as np
+import pytest
+from collab_filtering import popular_recommendations
+from matrix_factorization import MatrixFactorization
+
+
+@pytest.fixture
+def model(data_processor):
+    mf = MatrixFactorization(data_processor, factors=4, iterations=2)
+    mf.train()
+    return mf
+
+
+def test_recommendations_fall_back_to_popular_without_candidates(model, data_processor, monkeypatch):
+    user_ratings = data_processor.get_user_ratings(1)
+    # Модель «сложилась» по оценкам, но ни один фильм не получил оценку выше 3
+    monkeypatch.setattr(model, "_scores", lambda ratings, positions=None: np.full(len(model.movie_ids), 2.0))
+
+    result = asyncio.run(model.generate_recommendations(user_ratings, 5))
+
+    assert result == popular_recommendations(data_processor, user_ratings, 5)
+    assert result and not set(movie_id for movie_id, _ in result) & set(user_ratings)
+
+
+def test_recommendations_exclude_rated_movies(model, data_processor):
+    user_ratings = data_processor.get_user_ratings(1)
+    result = asyncio.run(model.generate_recommendations(user_ratings, None))
+    assert result
+    assert not set(movie_id for movie_id, _ in result) & set(user_ratings)
@@ -0,0 +1,40 @@
+from multiprocessing import shared_memory
+import numpy as np
+import pytest
+from parallel_similarity import SharedItemMatrix, iter_pearson_blocks, resolve_workers
+from similarity import ItemRatingMatrix
+
+MIN_COMMON = 3
+
+
+def _blocks(matrix, workers, max_neighbors=0):
+    return {start: (stop, result) for start, stop, result in
+            iter_pearson_blocks(matrix, MIN_COMMON, 7, workers=workers, max_neighbors=max_neighbors)}
+
+
+@pytest.mark.parametrize("max_neighbors", [0, 4])
+def test_process_pool_gives_the_same_blocks_as_serial_build(data_processor, max_neighbors):
+    matrix = ItemRatingMatrix(data_processor.movie_ids, data_processor.item_user_matrix())
+    serial = _blocks(matrix, 1, max_neighbors)
+    parallel = _blocks(matrix, 2, max_neighbors)
+
+    assert sorted(parallel) == sorted(serial) == list(range(0, matrix.n_items, 7))
+    for start, (stop, result) in serial.items():
+        assert parallel[start][0] == stop
+        for expected, actual in zip(result, parallel[start][1]):
+            np.testing.assert_array_equal(actual, expected)
+
+
+def test_shared_matrix_is_released(data_processor):
+    matrix = ItemRatingMatrix(data_processor.movie_ids, data_processor.item_user_matrix())
+    with SharedItemMatrix(matrix) as shared:
+        names = [segment.name for segment in shared.segments]
+        assert len(names) == len(ItemRatingMatrix.ARRAY_NAMES)
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+def test_zero_workers_means_all_cores():
+    assert resolve_workers(0) >= 1
+    assert resolve_workers(3) == 3
@@ -0,0 +1,78 @@
+import asyncio
+import pandas as pd
+from rating_stream import RatingStreamIngester, parse_rating_lines
+
+
+def _line(user_id, movie_id, rating, timestamp):
+    return f"{user_id}\t{movie_id}\t{rating}\t{timestamp}\n"
+
+
+def _append(path, text):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_bad_lines_and_out_of_range_ratings_are_skipped():
+    ratings, bad = parse_rating_lines(b"1\t2\t4\t100\n1\tx\t3\t101\n2\t3\t7\t102\n2\t4\n3\t5\t1\t103\n")
+    assert ratings[['user_id', 'movie_id']].values.tolist() == [[1, 2], [3, 5]]
+    assert bad == 3
+
+
+def test_appended_lines_are_read_from_the_offset(data_processor, tmp_path):
+    path = tmp_path / "u.data"
+    path.write_text(_line(1, 1, 5, 1), encoding="utf-8")
+    batches = []
+
+    async def on_batch(old_matrix, batch):
+        batches.append((old_matrix.nnz, batch['timestamp'].tolist()))
+
+    async def scenario():
+        ingester = RatingStreamIngester(data_processor, str(path), offset=path.stat().st_size, max_batch=2,
+                                        on_batch=on_batch)
+        nnz = data_processor.user_item_matrix.nnz
+        _append(path, _line(1, 10_001, 4, 30) + _line(2, 10_001, 3, 20) + _line(3, 10_001, 5, 10) + "4\t10_0")
+        assert await ingester.poll() == 3
+        # Незаконченная строка остаётся непрочитанной до следующей проверки
+        assert ingester.offset == path.stat().st_size - len("4\t10_0")
+        assert batches == [(nnz, [10, 20]), (nnz + 2, [30])]
+        assert data_processor.get_user_ratings(2)[10_001] == 3.0
+
+        _append(path, "01\t2\t40\n")
+        ingester.feed(["5\t10001\t1\t50"])
+        assert await ingester.poll() == 2
+        assert data_processor.get_user_ratings(4)[10_001] == 2.0
+        assert data_processor.get_user_ratings(5)[10_001] == 1.0
+        metrics = ingester.metrics()
+        assert (metrics["ingested"], metrics["batches"], metrics["backlog_bytes"]) == (5, 3, 0)
+        assert await ingester.poll() == 0
+
+    asyncio.run(scenario())
+
+
+def test_truncated_file_is_read_from_the_start(data_processor, tmp_path):
+    path = tmp_path / "u.data"
+    path.write_text(_line(1, 10_001, 4, 30) * 3, encoding="utf-8")
+
+    async def scenario():
+        ingester = RatingStreamIngester(data_processor, str(path), offset=path.stat().st_size)
+        path.write_text(_line(1007, 10_002, 2, 40), encoding="utf-8")
+        assert await ingester.poll() == 1
+        assert ingester.offset == path.stat().st_size
+        assert data_processor.get_user_ratings(1007) == {10_002: 2.0}
+
+    asyncio.run(scenario())
+
+
+def test_background_task_applies_fed_lines(data_processor, tmp_path):
+    async def scenario():
+        ingester = RatingStreamIngester(data_processor, str(tmp_path / "missing.data"), poll_interval=60)
+        ingester.start()
+        ingester.feed([_line(1008, 10_003, 4, 60)])
+        for _ in range(200):
+            if ingester.metrics()["ingested"]:
+                break
+            await asyncio.sleep(0.005)
+        await ingester.close()
+        assert data_processor.get_user_ratings(1008) == {10_003: 4.0}
+
+    asyncio.run(scenario())
@@ -0,0 +1,38 @@
+import time
+from recommendation_cache import RecommendationCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = RecommendationCache(max_entries=2, ttl=0)
+    cache.put((1, 0), 1, "a")
+    cache.put((2, 0), 1, "b")
+    assert cache.get((1, 0), 1) == "a"
+    cache.put((3, 0), 1, "c")
+
+    assert cache.get((2, 0), 1) is None
+    assert cache.get((1, 0), 1) == "a"
+    assert cache.get((3, 0), 1) == "c"
+    assert cache.stats() == {"hits": 3, "misses": 1, "hit_rate": 0.75, "evictions": 1, "size": 2}
+
+
+def test_entries_expire_after_ttl():
+    cache = RecommendationCache(ttl=0.05)
+    cache.put((1, 0), 1, "a")
+    assert cache.get((1, 0), 1) == "a"
+    time.sleep(0.06)
+    assert cache.get((1, 0), 1) is None
+    assert len(cache) == 0
+
+
+def test_other_version_misses_and_user_entries_are_invalidated():
+    cache = RecommendationCache()
+    cache.put((1, 0), 1, "all")
+    cache.put((1, 4), 1, "action")
+    cache.put((2, 0), 1, "other user")
+
+    assert cache.get((1, 0), 2) is None
+    assert cache.get((1, 4), 1) == "action"
+    cache.invalidate_user(1)
+    assert cache.get((1, 4), 1) is None
+    assert cache.get((2, 0), 1) == "other user"
+    assert len(cache) == 1
@@ -0,0 +1,142 @@
+import asyncio
+import numpy as np
+import pandas as pd
+import pytest
+from recommendation_cache import RecommendationCache
+from recommenders import PopularityRecommender, RecommenderRegistry, UserBasedRecommender
+from user_index import UserSimilarityIndex
+
+
+def _add_rating(data_processor, user_id, movie_id, rating):
+    data_processor.add_ratings(pd.DataFrame({'user_id': [user_id], 'movie_id': [movie_id],
+                                             'rating': [rating], 'timestamp': [10_000]}))
+
+
+def _registry(data_processor):
+    registry = RecommenderRegistry("popular", lambda: data_processor.version)
+    registry.register("popular", lambda: PopularityRecommender(data_processor), live=True)
+    registry.register("other", lambda: PopularityRecommender(data_processor))
+    registry.register("updated", lambda: PopularityRecommender(data_processor))
+    return registry
+
+
+def test_models_become_stale_after_enough_new_ratings(data_processor):
+    registry = _registry(data_processor)
+
+    async def scenario():
+        for name in registry.names:
+            assert await registry.load(name)
+        assert registry.stale() == []
+
+        _add_rating(data_processor, 1, 1, 5.0)
+        _add_rating(data_processor, 2, 1, 4.0)
+        assert registry.stale() == ["other", "updated"]
+        assert registry.stale(min_changes=3) == []
+        assert registry.changes_since_build("other") == 2
+        assert registry.changes_since_build("popular") == 0
+
+        registry.mark_current("updated")
+        assert registry.version("updated") == 2
+        assert registry.stale() == ["other"]
+        assert await registry.load("other")
+        assert registry.stale() == []
+        assert registry.version("other") == 2
+
+    asyncio.run(scenario())
+
+
+def test_cached_list_survives_an_ingested_batch_until_the_model_changes(data_processor):
+    registry = _registry(data_processor)
+    cache = RecommendationCache(max_entries=8, ttl=0)
+
+    def key(strategy):
+        return 7, 0, 0, strategy, registry.version(strategy)
+
+    async def scenario():
+        for name in registry.names:
+            await registry.load(name)
+        for name in registry.names:
+            cache.put(key(name), 0, f"{name} list")
+
+        _add_rating(data_processor, 1, 1, 5.0)
+        # Модели не менялись: списки остаются в кэше, в том числе для постраничного вывода
+        assert [cache.get(key(name), 0) for name in registry.names] == ["popular list", "other list", "updated list"]
+
+        registry.mark_current("updated")
+        assert cache.get(key("updated"), 0) is None
+        await registry.load("other")
+        assert cache.get(key("other"), 0) is None
+        assert cache.get(key("popular"), 0) == "popular list"
+
+    asyncio.run(scenario())
+
+
+class _GatedModel:
+    """
+    Модель, построение которой завершается по сигналу теста.
+    """
+
+    def __init__(self, name, gate, fail=False):
+        self.name = name
+        self.gate = gate
+        self.fail = fail
+
+    async def warm_up(self):
+        await self.gate.wait()
+        if self.fail:
+            raise RuntimeError("не хватило памяти")
+
+
+def test_new_model_replaces_the_working_one_only_when_built():
+    async def scenario():
+        gate = asyncio.Event()
+        models = iter([_GatedModel("v1", gate), _GatedModel("v2", gate), _GatedModel("v3", gate, fail=True)])
+        registry = RecommenderRegistry("cf")
+        registry.register("cf", lambda: next(models), "item-based")
+
+        gate.set()
+        assert await registry.load()
+        assert (registry.get().name, registry.version()) == ("v1", 1)
+
+        gate.clear()
+        task = registry.load("cf")
+        assert registry.load("cf") is task
+        await asyncio.sleep(0)
+        assert registry.is_loading() and registry.pending().name == "v2"
+        assert registry.get().name == "v1"
+        gate.set()
+        assert await task
+        assert (registry.get().name, registry.version(), registry.pending()) == ("v2", 2, None)
+
+        # Ошибка построения оставляет рабочую модель
+        assert not await registry.load()
+        assert (registry.get().name, registry.version()) == ("v2", 2)
+        assert "ошибка: не хватило памяти" in registry.status()[0]
+        with pytest.raises(KeyError):
+            registry.load("mf")
+
+    asyncio.run(scenario())
+
+
+def test_user_based_predictions_follow_similar_users(data_processor):
+    index = UserSimilarityIndex(data_processor.user_ids, data_processor.movie_ids, data_processor.user_item_matrix)
+    model = UserBasedRecommender(data_processor, index, min_common_users=3, neighbors=5)
+    user_ratings = dict(list(data_processor.get_user_ratings(1).items())[:6])
+    movie_ids = data_processor.movie_ids.tolist()
+
+    similar = [(user_id, sim) for user_id, sim in index.most_similar(user_ratings, 3, 5) if sim > 0]
+    assert similar
+    user_mean = np.mean(list(user_ratings.values()))
+    predictions = model.predict_ratings(user_ratings, movie_ids)
+    for movie_id, actual in zip(movie_ids, predictions.tolist()):
+        rated = [(sim, data_processor.get_user_ratings(user_id), user_id) for user_id, sim in similar
+                 if movie_id in data_processor.get_user_ratings(user_id)]
+        if not rated:
+            assert np.isnan(actual)
+            continue
+        deviations = [sim * (ratings[movie_id] - np.mean(list(ratings.values()))) for sim, ratings, _ in rated]
+        expected = user_mean + sum(deviations) / sum(sim for sim, _, _ in rated)
+        assert actual == pytest.approx(min(5.0, max(1.0, expected)))
+
+    recommended = asyncio.run(model.generate_recommendations(user_ratings, 5))
+    assert all(movie_id not in user_ratings and score > 3.0 for movie_id, score in recommended)
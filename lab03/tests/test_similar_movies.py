@@ -0,0 +1,50 @@
+import asyncio
+import numpy as np
+import pandas as pd
+from collab_filtering import CollaborativeFiltering
+
+SIMILAR_ITEMS = 4
+
+
+def _model(data_processor, tmp_path, **kwargs):
+    data_processor.config = {"dataset_users_path": str(tmp_path / "u.data")}
+    return CollaborativeFiltering(data_processor, min_common_users=2, top_k=5, cache_path=str(tmp_path / "cache.bin"),
+                                  max_neighbors=0, similar_items=SIMILAR_ITEMS,
+                                  similar_path=str(tmp_path / "similar.bin"), **kwargs)
+
+
+def _expected(cf, movie_id, n):
+    neighbor_ids, sims = cf.sim.neighbors(movie_id)
+    positive = sims > 0
+    return list(zip(neighbor_ids[positive].tolist(), sims[positive].tolist()))[:min(n, SIMILAR_ITEMS)]
+
+
+def test_similar_movies_are_the_strongest_positive_neighbors(data_processor, tmp_path):
+    cf = _model(data_processor, tmp_path)
+    asyncio.run(cf.warm_up())
+    for movie_id in data_processor.movie_ids.tolist():
+        assert cf.similar_movies(movie_id, 3) == _expected(cf, movie_id, 3)
+        assert cf.similar_movies(movie_id, 100) == _expected(cf, movie_id, 100)
+    assert cf.similar_movies(10_000) == []
+
+    reloaded = _model(data_processor, tmp_path)
+    asyncio.run(reloaded.warm_up())
+    assert (tmp_path / "similar.bin").exists()
+    for name in ("item_ids", "indptr", "indices", "data"):
+        np.testing.assert_array_equal(getattr(reloaded.similar, name), getattr(cf.similar, name))
+
+
+def test_incremental_update_refreshes_similar_lists(data_processor, ratings_df, tmp_path):
+    cf = _model(data_processor, tmp_path, incremental=True)
+    cf.build_item_similarity()
+    rng = np.random.default_rng(3)
+    new_ratings = pd.DataFrame({
+        'user_id': rng.integers(1, 41, 60).astype(np.int32),
+        'movie_id': rng.integers(1, 31, 60).astype(np.int32),
+        'rating': rng.integers(1, 6, 60).astype(np.float32),
+        'timestamp': ratings_df['timestamp'].max() + 1 + np.arange(60, dtype=np.int64)
+    })
+    for start in range(0, 60, 20):
+        cf.update_ratings(new_ratings.iloc[start:start + 20])
+        for movie_id in data_processor.movie_ids.tolist():
+            assert cf.similar_movies(movie_id, SIMILAR_ITEMS) == _expected(cf, movie_id, SIMILAR_ITEMS)
@@ -0,0 +1,32 @@
+import itertools
+import pytest
+from collab_filtering import CollaborativeFiltering
+from similarity import SIMILARITY_THRESHOLD, pearson_item_similarity
+
+MIN_COMMON = 3
+
+
+def _as_dict(index):
+    result = {}
+    for movie_id in index.item_ids.tolist():
+        neighbor_ids, sims = index.neighbors(movie_id)
+        result[movie_id] = dict(zip(neighbor_ids.tolist(), sims.tolist()))
+    return result
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 256])
+def test_sparse_build_matches_pearson_item_similarity(data_processor, ratings_df, tmp_path, block_size):
+    cf = CollaborativeFiltering(data_processor, min_common_users=MIN_COMMON, top_k=20,
+                                cache_path=str(tmp_path / "cache.bin"), block_size=block_size, max_neighbors=0)
+    cf.build_item_similarity()
+    sparse = _as_dict(cf.sim)
+
+    movie_ids = sorted(ratings_df['movie_id'].unique().tolist())
+    for item_i, item_j in itertools.combinations(movie_ids, 2):
+        expected = pearson_item_similarity(item_i, item_j, ratings_df, MIN_COMMON)
+        if expected is None or abs(expected) <= SIMILARITY_THRESHOLD:
+            assert item_j not in sparse.get(item_i, {})
+            assert item_i not in sparse.get(item_j, {})
+        else:
+            assert sparse[item_i][item_j] == pytest.approx(expected, abs=1e-5)
+            assert sparse[item_j][item_i] == pytest.approx(expected, abs=1e-5)
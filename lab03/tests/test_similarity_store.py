@@ -0,0 +1,32 @@
+import numpy as np
+from neighbor_index import NeighborIndex
+from similarity_store import load_neighbor_index, save_neighbor_index
+
+META = {"ratings_sha256": "abc", "min_common_users": 3, "max_neighbors": 2}
+
+
+def _index():
+    sim = {1: {2: 0.9, 3: -0.4, 5: 0.2}, 2: {1: 0.9}, 3: {1: -0.4, 5: 0.7}, 5: {3: 0.7, 1: 0.2}}
+    return NeighborIndex.from_dict(sim, max_neighbors=2)
+
+
+def test_saved_index_is_loaded_unchanged(tmp_path):
+    index = _index()
+    save_neighbor_index(tmp_path / "cache.bin", index, META)
+
+    loaded = load_neighbor_index(tmp_path / "cache.bin", META)
+    for name in ("item_ids", "indptr", "indices", "data"):
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(index, name))
+    for movie_id in (1, 2, 3, 5):
+        np.testing.assert_array_equal(loaded.neighbors(movie_id)[0], index.neighbors(movie_id)[0])
+    assert loaded.similarity(1, 2) == index.similarity(1, 2)
+
+
+def test_cache_built_with_other_parameters_is_ignored(tmp_path):
+    save_neighbor_index(tmp_path / "cache.bin", _index(), META)
+
+    assert load_neighbor_index(tmp_path / "cache.bin", {**META, "ratings_sha256": "def"}) is None
+    assert load_neighbor_index(tmp_path / "cache.bin", {**META, "max_neighbors": 3}) is None
+    assert load_neighbor_index(tmp_path / "missing.bin", META) is None
+    (tmp_path / "garbage.bin").write_bytes(b"not a cache")
+    assert load_neighbor_index(tmp_path / "garbage.bin", META) is None
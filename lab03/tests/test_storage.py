@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+from storage import Storage
+
+
+def test_reads_do_not_wait_for_the_writer_lock(tmp_path):
+    storage = Storage(str(tmp_path / "ratings.db"))
+    storage.add_ratings([(1, 10, 4.0), (1, 20, 3.0)])
+    # Запись с fsync и checkpoint выполняются под этой блокировкой
+    with storage._lock:
+        result = {}
+        reader = threading.Thread(target=lambda: result.update(storage.get_user_ratings(1)))
+        started = time.perf_counter()
+        reader.start()
+        reader.join(timeout=2)
+        assert not reader.is_alive()
+        assert time.perf_counter() - started < 2
+    assert result == {10: 4.0, 20: 3.0}
+    storage.close()
+
+
+def test_reads_see_committed_writes(tmp_path):
+    storage = Storage(str(tmp_path / "ratings.db"))
+    assert storage.get_user_ratings(1) == {}
+    storage.add_rating(1, 10, 5.0)
+    storage.write_batch([1], [(1, 30, 2.0)])
+    assert storage.get_user_ratings(1) == {30: 2.0}
+    storage.compact()
+    storage.add_rating(1, 31, 1.0)
+    assert storage.get_user_ratings(1) == {30: 2.0, 31: 1.0}
+    storage.close()
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / "local_user_storage.json"
+    legacy.write_text(json.dumps({"local_user": {"ratings": {"10": 4.0, "20": 2.5}}}), encoding="utf-8")
+    db = str(tmp_path / "ratings.db")
+
+    storage = Storage(db, str(legacy), legacy_user_id=42)
+    assert storage.get_user_ratings(42) == {10: 4.0, 20: 2.5}
+    storage.clear_user(42)
+    storage.close()
+
+    # Повторное открытие не переносит оценки снова
+    storage = Storage(db, str(legacy), legacy_user_id=42)
+    assert storage.get_user_ratings(42) == {}
+    storage.close()
+    assert legacy.exists()
+
+
+def test_legacy_import_keeps_existing_ratings(tmp_path):
+    db = str(tmp_path / "ratings.db")
+    storage = Storage(db)
+    storage.add_rating(42, 10, 5.0)
+    storage.close()
+    legacy = tmp_path / "local_user_storage.json"
+    legacy.write_text(json.dumps({"local_user": {"ratings": {"10": 1.0, "30": 3.0}}}), encoding="utf-8")
+
+    storage = Storage(db, str(legacy), legacy_user_id=42)
+    assert storage.get_user_ratings(42) == {10: 5.0, 30: 3.0}
+    storage.close()
+
+
+def test_missing_or_broken_legacy_file(tmp_path):
+    storage = Storage(str(tmp_path / "a.db"), str(tmp_path / "missing.json"))
+    assert storage.get_user_ratings(0) == {}
+    storage.close()
+    broken = tmp_path / "broken.json"
+    broken.write_text("{", encoding="utf-8")
+    storage = Storage(str(tmp_path / "b.db"), str(broken))
+    assert storage.get_user_ratings(0) == {}
+    storage.close()
+
+
+def test_legacy_import_waits_for_a_user_id(tmp_path, caplog):
+    legacy = tmp_path / "local_user_storage.json"
+    legacy.write_text(json.dumps({"local_user": {"ratings": {"10": 4.0}}}), encoding="utf-8")
+    db = str(tmp_path / "ratings.db")
+
+    storage = Storage(db, str(legacy))
+    assert storage.get_user_ratings(0) == {}
+    assert storage._conn.execute("PRAGMA user_version").fetchone()[0] == 0
+    storage.close()
+    assert "не перенесены" in caplog.text
+
+    storage = Storage(db, str(legacy), legacy_user_id=42)
+    assert storage.get_user_ratings(42) == {10: 4.0}
+    storage.close()
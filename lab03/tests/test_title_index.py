@@ -0,0 +1,41 @@
+import numpy as np
+from title_index import TitleIndex, tokenize, trigrams
+
+TITLES = {
+    1: "Toy Story (1995)",
+    2: "GoldenEye (1995)",
+    3: "Star Wars (1977)",
+    4: "Star Trek: The Wrath of Khan (1982)",
+    5: "Star Trek: First Contact (1996)",
+    6: "Wars of the Roses, The (1989)",
+    7: "Toy Soldiers (1991)",
+}
+
+
+def _index():
+    return TitleIndex(np.array(list(TITLES), dtype=np.int32), list(TITLES.values()))
+
+
+def test_tokens_and_trigrams():
+    assert tokenize("Star Trek: The Wrath of Khan (1982)") == ["star", "trek", "the", "wrath", "of", "khan", "1982"]
+    assert trigrams(["ab"]) == {"  a", " ab", "ab "}
+
+
+def test_titles_with_all_query_words_rank_first():
+    found = [movie_id for movie_id, _ in _index().search("star wars")]
+    assert found[0] == 3
+    assert set(found[1:]) >= {4, 5, 6}
+    assert _index().search("toy story", limit=1) == [(1, "Toy Story (1995)")]
+
+
+def test_prefixes_and_typos_are_found():
+    assert [movie_id for movie_id, _ in _index().search("golden")] == [2]
+    assert [movie_id for movie_id, _ in _index().search("goldneye")] == [2]
+    assert [movie_id for movie_id, _ in _index().search("toy storry")] == [1, 7]
+    assert [movie_id for movie_id, _ in _index().search("khan")] == [4]
+
+
+def test_no_match_and_empty_queries():
+    assert _index().search("zzzz qqqq") == []
+    assert _index().search("  ,.") == []
+    assert TitleIndex(np.zeros(0, np.int32), []).search("star") == []
@@ -0,0 +1,32 @@
+import pytest
+from similarity import user_pearson_similarity
+from user_index import UserSimilarityIndex
+
+MIN_COMMON = 3
+
+
+def _brute_force(data_processor, ratings, top_n):
+    found = []
+    for user_id in data_processor.get_all_users():
+        sim = user_pearson_similarity(ratings, data_processor.get_user_ratings(user_id), MIN_COMMON)
+        if sim is not None:
+            found.append((user_id, sim))
+    found.sort(key=lambda x: (-round(x[1], 12), x[0]))
+    return found[:top_n]
+
+
+@pytest.mark.parametrize("profile_size", [3, 8, 30])
+def test_most_similar_matches_brute_force(data_processor, profile_size):
+    index = UserSimilarityIndex(data_processor.user_ids, data_processor.movie_ids, data_processor.user_item_matrix)
+    for user_id in data_processor.get_all_users()[:10]:
+        ratings = dict(list(data_processor.get_user_ratings(user_id).items())[:profile_size])
+        expected = _brute_force(data_processor, ratings, 5)
+        actual = index.most_similar(ratings, MIN_COMMON, 5)
+        assert [uid for uid, _ in actual] == [uid for uid, _ in expected]
+        assert [sim for _, sim in actual] == pytest.approx([sim for _, sim in expected], abs=1e-9)
+
+
+def test_unknown_movies_and_empty_profiles(data_processor):
+    index = UserSimilarityIndex(data_processor.user_ids, data_processor.movie_ids, data_processor.user_item_matrix)
+    assert index.most_similar({}, MIN_COMMON, 5) == []
+    assert index.most_similar({10_000: 5.0, 10_001: 1.0, 10_002: 3.0}, MIN_COMMON, 5) == []
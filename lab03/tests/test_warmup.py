@@ -0,0 +1,51 @@
+import json
+import pytest
+from progress import ProgressReporter
+from warmup import WarmupTracker
+
+STAGES = ["Данные", "Матрица сходства"]
+
+
+def test_stages_are_timed_and_saved_for_the_next_start(tmp_path):
+    history = tmp_path / "warmup_timings.json"
+    tracker = WarmupTracker(STAGES, str(history))
+    assert tracker.eta() is None
+    assert tracker.status() == ["Данные: ожидает", "Матрица сходства: ожидает"]
+
+    with tracker.stage("Данные"):
+        assert tracker.status()[0].startswith("Данные: выполняется")
+    assert tracker.is_done("Данные") and not tracker.ready
+    assert not history.exists()
+    with tracker.stage("Матрица сходства"):
+        pass
+    assert tracker.ready
+    assert json.loads(history.read_text(encoding="utf-8")) == pytest.approx(tracker.timings)
+
+    history.write_text(json.dumps({"Данные": 2.0, "Матрица сходства": 30.0}), encoding="utf-8")
+    restarted = WarmupTracker(STAGES, str(history))
+    assert restarted.eta() == pytest.approx(32.0)
+    with restarted.stage("Данные"):
+        pass
+    assert restarted.eta() == pytest.approx(30.0)
+
+
+def test_eta_of_the_current_stage_follows_its_progress(tmp_path):
+    tracker = WarmupTracker(STAGES)
+    progress = ProgressReporter(100, "фильмов", min_interval=3600)
+    with tracker.stage("Данные"):
+        pass
+    with tracker.stage("Матрица сходства", lambda: progress):
+        progress.advance(25)
+        eta = tracker.eta()
+        assert eta == pytest.approx(3 * progress.elapsed, rel=0.5)
+        assert "обработано 25/100 фильмов" in tracker.status()[1]
+
+
+def test_failed_stage_is_reported(tmp_path):
+    tracker = WarmupTracker(STAGES, str(tmp_path / "warmup_timings.json"))
+    with pytest.raises(RuntimeError):
+        with tracker.stage("Данные"):
+            raise RuntimeError("u.data не найден")
+    assert tracker.error == "Данные: u.data не найден"
+    assert not tracker.is_done("Данные") and tracker.current is None
+    assert not (tmp_path / "warmup_timings.json").exists()
@@ -0,0 +1,110 @@
+import asyncio
+from recommendation_cache import RecommendationCache
+from storage import Storage
+from write_behind import WriteBehindStorage
+
+
+class _FailingStorage(Storage):
+    """
+    Хранилище, в котором первые failures записей завершаются ошибкой.
+    """
+
+    def __init__(self, path: str, failures: int) -> None:
+        super().__init__(path)
+        self.failures = failures
+        self.batches = []
+
+    def write_batch(self, cleared_users, ratings):
+        cleared_users, ratings = list(cleared_users), list(ratings)
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("disk is full")
+        self.batches.append((cleared_users, ratings))
+        super().write_batch(cleared_users, ratings)
+
+
+def test_pending_ratings_are_visible_and_written_in_one_batch(tmp_path):
+    async def scenario():
+        storage = _FailingStorage(str(tmp_path / "ratings.db"), failures=0)
+        storage.add_rating(1, 5, 1.0)
+        storage.batches.clear()
+        layer = WriteBehindStorage(storage)
+        layer.add_rating(1, 10, 3.0)
+        layer.add_rating(1, 10, 4.0)
+        layer.add_ratings([(1, 20, 2.0), (2, 10, 5.0)])
+        assert layer.get_user_ratings(1) == {5: 1.0, 10: 4.0, 20: 2.0}
+        assert storage.get_user_ratings(1) == {5: 1.0}
+
+        assert await layer.flush()
+        assert storage.batches == [([], [(1, 10, 4.0), (1, 20, 2.0), (2, 10, 5.0)])]
+        layer.clear_user(1)
+        layer.add_rating(1, 30, 5.0)
+        assert layer.get_user_ratings(1) == {30: 5.0}
+        assert await layer.flush()
+        assert storage.get_user_ratings(1) == {30: 5.0}
+        assert layer.metrics()["events_flushed"] == 6
+        storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_failed_flush_is_requeued_behind_newer_changes(tmp_path):
+    async def scenario():
+        storage = _FailingStorage(str(tmp_path / "ratings.db"), failures=1)
+        layer = WriteBehindStorage(storage)
+        layer.add_ratings([(1, 10, 3.0), (1, 20, 2.0), (2, 10, 5.0)])
+        assert not await layer.flush()
+        assert layer.metrics()["queue_depth"] == 3
+        assert layer.get_user_ratings(1) == {10: 3.0, 20: 2.0}
+
+        layer.add_rating(1, 10, 1.0)
+        layer.clear_user(2)
+        assert await layer.flush()
+        assert storage.get_user_ratings(1) == {10: 1.0, 20: 2.0}
+        assert storage.get_user_ratings(2) == {}
+        metrics = layer.metrics()
+        assert (metrics["failed_flushes"], metrics["flushes"], metrics["queue_depth"]) == (1, 1, 0)
+        storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_background_task_flushes_and_close_writes_the_rest(tmp_path):
+    async def scenario():
+        storage = _FailingStorage(str(tmp_path / "ratings.db"), failures=0)
+        layer = WriteBehindStorage(storage, flush_interval=0.01, max_batch=3)
+        layer.start()
+        layer.add_ratings([(1, 10, 3.0), (1, 20, 2.0), (1, 30, 4.0)])
+        # Полный пакет записывается без ожидания flush_interval
+        for _ in range(100):
+            if storage.batches:
+                break
+            await asyncio.sleep(0.001)
+        assert len(storage.batches) == 1
+
+        layer.flush_interval = 60
+        layer.add_rating(2, 10, 5.0)
+        await asyncio.sleep(0)
+        await layer.close()
+        assert storage.get_user_ratings(2) == {10: 5.0}
+        assert layer.metrics()["queue_depth"] == 0
+        storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_rating_changes_bump_versions_and_notify_subscribers(tmp_path):
+    storage = Storage(str(tmp_path / "ratings.db"))
+    layer = WriteBehindStorage(storage)
+    cache = RecommendationCache()
+    layer.subscribe(cache.invalidate_user)
+    cache.put((1, 0), layer.version(1), "cached")
+    cache.put((2, 0), layer.version(2), "other user")
+
+    layer.add_rating(1, 10, 4.0)
+    layer.add_ratings([(1, 20, 3.0), (1, 30, 2.0)])
+    layer.clear_user(1)
+    assert (layer.version(1), layer.version(2)) == (3, 0)
+    assert cache.get((1, 0), 0) is None
+    assert cache.get((2, 0), layer.version(2)) == "other user"
+    storage.close()
@@ -0,0 +1,155 @@
+import re
+from typing import Dict, List, Set, Tuple
+import numpy as np
+import pandas as pd
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Разбиение текста на слова в нижнем регистре.
+
+    :param text: Текст
+    :return: Список слов
+    """
+    return _TOKEN_RE.findall(text.lower())
+
+
+def trigrams(tokens: List[str]) -> Set[str]:
+    """
+    Триграммы слов с границами: слово дополняется двумя пробелами в начале и одним в конце.
+
+    :param tokens: Слова
+    :return: Множество триграмм
+    """
+    result = set()
+    for token in tokens:
+        padded = f"  {token} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def _group(codes: np.ndarray, n_rows: int, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Группировка пар (номер строки, позиция) в инвертированные списки формата CSR.
+
+    :param codes: Номер строки для каждой пары
+    :param n_rows: Количество строк
+    :param positions: Позиция для каждой пары
+    :return: Кортеж (границы строк, позиции)
+    """
+    order = np.argsort(codes, kind='stable')
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=n_rows))]).astype(np.int32)
+    return indptr, np.asarray(positions, dtype=np.int32)[order]
+
+
+class TitleIndex:
+    """
+    Поисковый индекс по названиям фильмов.
+
+    Инвертированный индекс слов хранит для каждого слова словаря названия, в которых оно
+    встречается, а индекс триграмм — слова словаря, в которых встречается триграмма. Слово
+    запроса сопоставляется со словами словаря, содержащими не меньше MIN_TRIGRAM_SHARE его
+    триграмм (это находит начала слов и слова с опечатками). Название оценивается средней по
+    словам запроса долей совпавших триграмм; при равенстве выше названия со всеми словами
+    запроса и более короткие.
+    """
+
+    # Минимальная доля триграмм слова запроса, найденных в слове названия
+    MIN_TRIGRAM_SHARE = 0.5
+
+    def __init__(self, movie_ids: np.ndarray, titles: List[str]) -> None:
+        """
+        Построение индекса.
+
+        :param movie_ids: ID фильмов
+        :param titles: Названия фильмов в том же порядке
+        """
+        self.movie_ids = np.asarray(movie_ids, dtype=np.int32)
+        self.titles = list(titles)
+        title_tokens = [set(tokenize(title)) for title in self.titles]
+        self.title_lengths = np.array([len(tokens) for tokens in title_tokens], dtype=np.int32)
+        occurrences = [token for tokens in title_tokens for token in tokens]
+        codes, vocabulary = pd.factorize(np.array(occurrences, dtype=object), sort=False)
+        self.vocabulary: List[str] = vocabulary.tolist()
+        self.tokens: Dict[str, int] = {token: row for row, token in enumerate(self.vocabulary)}
+        self.token_indptr, self.token_positions = _group(
+            codes, len(self.vocabulary), np.repeat(np.arange(len(self.titles)), self.title_lengths))
+
+        gram_keys, gram_tokens = [], []
+        self.token_gram_counts = np.zeros(len(self.vocabulary), dtype=np.int32)
+        for row, token in enumerate(self.vocabulary):
+            grams = trigrams([token])
+            gram_keys.extend(grams)
+            gram_tokens.extend([row] * len(grams))
+            self.token_gram_counts[row] = len(grams)
+        gram_codes, grams = pd.factorize(np.array(gram_keys, dtype=object), sort=False)
+        self.trigrams: Dict[str, int] = {gram: row for row, gram in enumerate(grams.tolist())}
+        self.trigram_indptr, self.trigram_tokens = _group(gram_codes, len(self.trigrams), np.array(gram_tokens))
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Объём массивов инвертированных списков в байтах.
+        """
+        return (self.token_indptr.nbytes + self.token_positions.nbytes + self.trigram_indptr.nbytes
+                + self.trigram_tokens.nbytes + self.token_gram_counts.nbytes + self.title_lengths.nbytes)
+
+    def _rows(self, indptr: np.ndarray, values: np.ndarray, rows: List[int]) -> np.ndarray:
+        """
+        Объединение строк инвертированного списка.
+        """
+        if not rows:
+            return np.zeros(0, dtype=np.int32)
+        return np.concatenate([values[indptr[row]:indptr[row + 1]] for row in rows])
+
+    def _token_scores(self, token: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Лучшая доля совпавших триграмм слова запроса для каждого подходящего названия.
+
+        :param token: Слово запроса
+        :return: Кортеж (позиции названий, доли триграмм)
+        """
+        grams = trigrams([token])
+        rows = [self.trigrams[gram] for gram in grams if gram in self.trigrams]
+        words, shared = np.unique(self._rows(self.trigram_indptr, self.trigram_tokens, rows), return_counts=True)
+        share = shared / len(grams)
+        keep = share >= self.MIN_TRIGRAM_SHARE
+        words, share = words[keep], share[keep]
+        positions = self._rows(self.token_indptr, self.token_positions, words.tolist())
+        shares = np.repeat(share, self.token_indptr[words + 1] - self.token_indptr[words])
+        # После сортировки по убыванию доли первое вхождение названия несёт лучшую долю
+        order = np.argsort(-shares, kind='stable')
+        found, first = np.unique(positions[order], return_index=True)
+        return found, shares[order][first]
+
+    def search(self, text: str, limit: int = 10) -> List[Tuple[int, str]]:
+        """
+        Поиск фильмов по названию.
+
+        :param text: Строка запроса
+        :param limit: Максимальное количество результатов, defaults to 10
+        :return: Список кортежей (movie_id, title) по убыванию соответствия
+        """
+        tokens = set(tokenize(text))
+        if not tokens or not self.titles:
+            return []
+
+        score = np.zeros(len(self.titles))
+        exact = np.zeros(len(self.titles), dtype=np.int32)
+        for token in tokens:
+            positions, shares = self._token_scores(token)
+            score[positions] += shares
+            if token in self.tokens:
+                row = self.tokens[token]
+                exact[self.token_positions[self.token_indptr[row]:self.token_indptr[row + 1]]] += 1
+        score /= len(tokens)
+
+        matches = np.flatnonzero(score > 0)
+        order = np.lexsort((self.movie_ids[matches], self.title_lengths[matches],
+                            exact[matches] < len(tokens), -score[matches]))[:max(0, limit)]
+        return [(int(self.movie_ids[pos]), self.titles[pos]) for pos in matches[order]]
@@ -0,0 +1,107 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import scipy.sparse as sp
+
+
+class UserSimilarityIndex:
+    """
+    Индекс для поиска реальных пользователей, похожих на локального, по корреляции Пирсона.
+
+    Как и user_pearson_similarity, корреляция считается по общим фильмам со средними по ним.
+    Для этого по разреженным матрицам оценок, индикаторов оценок и квадратов оценок
+    (пользователь x фильм) несколькими произведениями матрицы на вектор вычисляются число
+    общих фильмов, суммы, суммы квадратов и попарные произведения сразу для всех пользователей.
+    """
+
+    def __init__(self, user_ids: np.ndarray, movie_ids: np.ndarray, ratings: sp.csr_matrix) -> None:
+        """
+        Инициализация индекса.
+
+        :param user_ids: ID пользователей в порядке строк матрицы
+        :param movie_ids: ID фильмов в порядке столбцов матрицы
+        :param ratings: Матрица оценок пользователь x фильм (элемент отсутствует — нет оценки)
+        """
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        self.R = ratings.tocsr().astype(np.float64)
+        self.B = self.R.copy()
+        self.B.data = np.ones_like(self.B.data)
+        self.R2 = self.R.multiply(self.R).tocsr()
+        self._movie_positions = {int(movie_id): pos for pos, movie_id in enumerate(self.movie_ids)}
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def query_vector(self, ratings: Dict[int, float]) -> np.ndarray:
+        """
+        Плотный вектор оценок локального пользователя по столбцам индекса.
+
+        :param ratings: Оценки локального пользователя {movie_id: rating}
+        :return: Вектор оценок (0 — нет оценки или фильма нет в датасете)
+        """
+        query = np.zeros(len(self.movie_ids))
+        for movie_id, rating in ratings.items():
+            pos = self._movie_positions.get(int(movie_id))
+            if pos is not None:
+                query[pos] = float(rating)
+        return query
+
+    def similarities(self, ratings: Dict[int, float], min_common: int,
+                     rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Корреляция Пирсона локального пользователя с пользователями индекса.
+
+        :param ratings: Оценки локального пользователя {movie_id: rating}
+        :param min_common: Минимальное количество общих фильмов
+        :param rows: Строки индекса для расчёта (None — все пользователи), defaults to None
+        :return: Массив сходств по строкам (NaN если данных недостаточно)
+        """
+        query = self.query_vector(ratings)
+        mask = (query != 0).astype(np.float64)
+        R, B, R2 = (self.R, self.B, self.R2) if rows is None else (self.R[rows], self.B[rows], self.R2[rows])
+
+        n = B @ mask
+        s_other = R @ mask
+        ss_other = R2 @ mask
+        s_query = B @ query
+        ss_query = B @ (query * query)
+        s_cross = R @ query
+
+        # Все величины домножены на n, как и при расчёте сходства фильмов
+        num = n * s_cross - s_query * s_other
+        den_query = n * ss_query - s_query * s_query
+        den_other = n * ss_other - s_other * s_other
+        valid = (n >= max(min_common, 1)) & (den_query > 1e-9) & (den_other > 1e-9)
+
+        sims = np.full(len(n), np.nan)
+        sims[valid] = num[valid] / np.sqrt(den_query[valid] * den_other[valid])
+        return sims
+
+    def rank(self, sims: np.ndarray, rows: np.ndarray, top_n: int) -> List[Tuple[int, float]]:
+        """
+        Отбор top_n пользователей по убыванию сходства.
+
+        :param sims: Сходства для строк rows
+        :param rows: Строки индекса
+        :param top_n: Количество пользователей в результате
+        :return: Список кортежей (user_id, similarity)
+        """
+        found = np.flatnonzero(~np.isnan(sims))
+        user_ids = self.user_ids[rows[found]]
+        # Округление убирает шум последнего разряда, чтобы равные сходства упорядочивались по ID
+        order = np.lexsort((user_ids, -np.round(sims[found], 12)))[:max(0, top_n)]
+        return [(int(uid), float(sim)) for uid, sim in zip(user_ids[order], sims[found][order])]
+
+    def most_similar(self, ratings: Dict[int, float], min_common: int, top_n: int) -> List[Tuple[int, float]]:
+        """
+        Поиск наиболее похожих пользователей.
+
+        :param ratings: Оценки локального пользователя {movie_id: rating}
+        :param min_common: Минимальное количество общих фильмов
+        :param top_n: Количество пользователей в результате
+        :return: Список кортежей (user_id, similarity) по убыванию сходства
+        """
+        if not ratings or len(self.user_ids) == 0:
+            return []
+        sims = self.similarities(ratings, min_common)
+        return self.rank(sims, np.arange(len(self.user_ids)), top_n)
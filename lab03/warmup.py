@@ -0,0 +1,148 @@
+import json
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+from progress import ProgressReporter
+
+
+class WarmupTracker:
+    """
+    Состояние прогрева бота при запуске: этапы, их длительность и оценка оставшегося времени.
+
+    Длительности этапов сохраняются в JSON-файл и используются для оценки оставшегося
+    времени при следующем запуске. Для текущего этапа оценка уточняется по его счётчику
+    прогресса, если он есть.
+    """
+
+    def __init__(self, stages: List[str], history_path: Optional[str] = None) -> None:
+        """
+        Инициализация состояния прогрева.
+
+        :param stages: Названия этапов в порядке выполнения
+        :param history_path: Путь к файлу с длительностями этапов прошлого запуска, defaults to None
+        """
+        self.stages = list(stages)
+        self.history_path = Path(history_path) if history_path else None
+        self.history: Dict[str, float] = self._load_history()
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.current: Optional[str] = None
+        self.current_started = 0.0
+        self._progress: Optional[Callable[[], Optional[ProgressReporter]]] = None
+        self.error: Optional[str] = None
+
+    def _load_history(self) -> Dict[str, float]:
+        """
+        Чтение длительностей этапов прошлого запуска.
+        """
+        if self.history_path is None or not self.history_path.exists():
+            return {}
+        try:
+            with open(self.history_path, 'r', encoding='utf-8') as f:
+                return {str(name): float(seconds) for name, seconds in json.load(f).items()}
+        except Exception as e:
+            print(f"Ошибка чтения длительностей прогрева: {e}")
+            return {}
+
+    def _save_history(self) -> None:
+        """
+        Сохранение длительностей этапов для оценки времени следующего запуска.
+        """
+        if self.history_path is None:
+            return None
+        try:
+            self.history_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.history_path, 'w', encoding='utf-8') as f:
+                json.dump(self.timings, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"Ошибка сохранения длительностей прогрева: {e}")
+
+    @property
+    def ready(self) -> bool:
+        """
+        Все этапы завершены.
+        """
+        return all(stage in self.timings for stage in self.stages)
+
+    def is_done(self, stage: str) -> bool:
+        """
+        Проверка завершения этапа.
+
+        :param stage: Название этапа
+        :return: True если этап завершён
+        """
+        return stage in self.timings
+
+    @property
+    def progress(self) -> Optional[ProgressReporter]:
+        """
+        Счётчик прогресса текущего этапа, если этап его ведёт.
+        """
+        return self._progress() if self._progress is not None else None
+
+    @contextmanager
+    def stage(self, name: str, progress: Optional[Callable[[], Optional[ProgressReporter]]] = None) -> Iterator[None]:
+        """
+        Выполнение этапа с замером длительности; ошибка этапа сохраняется и пробрасывается дальше.
+
+        :param name: Название этапа
+        :param progress: Функция, возвращающая счётчик прогресса этапа (он может появиться позже), defaults to None
+        """
+        self.current, self.current_started, self._progress = name, time.perf_counter(), progress
+        print(f"Прогрев: {name}...")
+        try:
+            yield None
+        except Exception as e:
+            self.error = f"{name}: {e}"
+            raise
+        finally:
+            self.current, self._progress = None, None
+        self.timings[name] = time.perf_counter() - self.current_started
+        print(f"Прогрев: {name} — {self.timings[name]:.1f} с")
+        if self.ready:
+            self._save_history()
+
+    def eta(self) -> Optional[float]:
+        """
+        Оценка оставшегося времени прогрева.
+
+        :return: Секунды до готовности или None если оценить нельзя (нет данных прошлого запуска)
+        """
+        remaining = 0.0
+        for stage in self.stages:
+            if stage in self.timings:
+                continue
+            if stage == self.current:
+                elapsed = time.perf_counter() - self.current_started
+                progress = self.progress
+                if progress is not None and 0 < progress.done < progress.total:
+                    remaining += progress.elapsed * (progress.total - progress.done) / progress.done
+                elif stage in self.history:
+                    remaining += max(0.0, self.history[stage] - elapsed)
+                else:
+                    return None
+            elif stage in self.history:
+                remaining += self.history[stage]
+            else:
+                return None
+        return remaining
+
+    def status(self) -> List[str]:
+        """
+        Текстовое описание состояния прогрева по этапам.
+
+        :return: Строки вида "Матрица сходства: 12.3 с"
+        """
+        lines = []
+        for stage in self.stages:
+            if stage in self.timings:
+                lines.append(f"{stage}: {self.timings[stage]:.1f} с")
+            elif stage == self.current:
+                line = f"{stage}: выполняется {time.perf_counter() - self.current_started:.1f} с"
+                if self.progress is not None:
+                    line += f" ({self.progress.format()})"
+                lines.append(line)
+            else:
+                lines.append(f"{stage}: ожидает")
+        return lines
@@ -0,0 +1,262 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from storage import Storage
+
+
+class _PendingUser:
+    """
+    Изменения оценок одного пользователя, ещё не записанные в хранилище.
+    """
+
+    __slots__ = ("cleared", "ratings")
+
+    def __init__(self) -> None:
+        self.cleared = False
+        self.ratings: Dict[int, float] = {}
+
+
+class WriteBehindStorage:
+    """
+    Отложенная запись оценок в Storage с групповой фиксацией.
+
+    Оценки сразу попадают в память и видны при чтении, а фоновая задача записывает
+    накопленные изменения одной транзакцией через flush_interval секунд после первого
+    изменения или сразу при накоплении max_batch событий. Повторные оценки одного фильма
+    до записи схлопываются. При закрытии все изменения записываются.
+    """
+
+    # Пауза перед повтором после неудачной записи, секунды
+    RETRY_DELAY = 1.0
+
+    def __init__(self, storage: Storage, flush_interval: float = 0.005, max_batch: int = 256,
+                 latency_window: int = 1000) -> None:
+        """
+        Инициализация слоя отложенной записи.
+
+        :param storage: Хранилище оценок
+        :param flush_interval: Максимальная задержка записи в секундах, defaults to 0.005
+        :param max_batch: Количество событий, при котором запись начинается сразу, defaults to 256
+        :param latency_window: Количество последних записей для статистики задержки, defaults to 1000
+        """
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending: Dict[int, _PendingUser] = {}
+        self._inflight: Dict[int, _PendingUser] = {}
+        self._depth = 0
+        self._has_events = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+        self._max_depth = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._events_flushed = 0
+        self._versions: Dict[int, int] = {}
+        self._listeners: List[Callable[[int], None]] = []
+
+    def start(self) -> None:
+        """
+        Запуск фоновой задачи записи в текущем цикле событий.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Остановка фоновой задачи и запись всех накопленных изменений.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if not await self.flush():
+            # Повтор, чтобы не потерять оценки при остановке
+            await asyncio.sleep(self.RETRY_DELAY)
+            await self.flush()
+
+    def _user(self, user_id: int) -> _PendingUser:
+        entry = self._pending.get(user_id)
+        if entry is None:
+            entry = self._pending[user_id] = _PendingUser()
+        return entry
+
+    def subscribe(self, listener: Callable[[int], None]) -> None:
+        """
+        Подписка на изменения оценок: listener вызывается с ID пользователя после каждого изменения.
+
+        :param listener: Функция от ID пользователя
+        """
+        self._listeners.append(listener)
+
+    def version(self, user_id: int) -> int:
+        """
+        Номер версии оценок пользователя, увеличивается при каждом изменении.
+
+        :param user_id: ID пользователя Telegram
+        :return: Номер версии (0 — изменений с запуска не было)
+        """
+        return self._versions.get(user_id, 0)
+
+    def _changed(self, user_ids: Iterable[int]) -> None:
+        """
+        Увеличение версий оценок пользователей и уведомление подписчиков.
+        """
+        for user_id in user_ids:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            for listener in self._listeners:
+                listener(user_id)
+
+    def _added(self, events: int) -> None:
+        """
+        Учёт новых событий и пробуждение фоновой задачи.
+        """
+        self._depth += events
+        self._max_depth = max(self._max_depth, self._depth)
+        self._has_events.set()
+        if self._depth >= self.max_batch:
+            self._batch_full.set()
+
+    def add_rating(self, user_id: int, movie_id: int, rating: float) -> None:
+        """
+        Добавление или обновление оценки фильма.
+
+        :param user_id: ID пользователя Telegram
+        :param movie_id: ID фильма
+        :param rating: Оценка фильма
+        """
+        self._user(user_id).ratings[int(movie_id)] = float(rating)
+        self._added(1)
+        self._changed([user_id])
+
+    def add_ratings(self, ratings: Iterable[Tuple[int, int, float]]) -> int:
+        """
+        Добавление или обновление пакета оценок; пакет записывается одной транзакцией.
+
+        :param ratings: Кортежи (user_id, movie_id, rating)
+        :return: Количество принятых оценок
+        """
+        count = 0
+        users = set()
+        for user_id, movie_id, rating in ratings:
+            self._user(user_id).ratings[int(movie_id)] = float(rating)
+            users.add(user_id)
+            count += 1
+        if count:
+            self._added(count)
+            self._changed(users)
+        return count
+
+    def clear_user(self, user_id: int) -> None:
+        """
+        Удаление всех оценок пользователя.
+
+        :param user_id: ID пользователя Telegram
+        """
+        entry = self._user(user_id)
+        entry.cleared = True
+        entry.ratings.clear()
+        self._added(1)
+        self._changed([user_id])
+
+    def get_user_ratings(self, user_id: int) -> Dict[int, float]:
+        """
+        Оценки пользователя с учётом ещё не записанных изменений.
+
+        Записанные оценки читаются соединением Storage только для чтения, которое не ждёт
+        выполняемую в исполнителе запись и перенос журнала.
+
+        :param user_id: ID пользователя Telegram
+        :return: Словарь {movie_id: rating}
+        """
+        layers = [layer[user_id] for layer in (self._inflight, self._pending) if user_id in layer]
+        ratings = {} if any(layer.cleared for layer in layers) else self.storage.get_user_ratings(user_id)
+        for layer in layers:
+            if layer.cleared:
+                ratings = {}
+            ratings.update(layer.ratings)
+        return ratings
+
+    async def _run(self) -> None:
+        """
+        Фоновая запись: ожидание первого события, затем не дольше flush_interval или до max_batch.
+        """
+        while True:
+            await self._has_events.wait()
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            # Отмена при закрытии не прерывает начатую запись: close() дождётся её на блокировке
+            if not await asyncio.shield(self.flush()):
+                await asyncio.sleep(self.RETRY_DELAY)
+
+    async def flush(self) -> bool:
+        """
+        Запись накопленных изменений одной транзакцией.
+
+        :return: False если запись не удалась и изменения возвращены в очередь
+        """
+        async with self._flush_lock:
+            self._has_events.clear()
+            self._batch_full.clear()
+            if not self._pending:
+                return True
+            batch, self._pending = self._pending, {}
+            events, self._depth = self._depth, 0
+            self._inflight = batch
+            cleared = [user_id for user_id, entry in batch.items() if entry.cleared]
+            ratings = [(user_id, movie_id, rating) for user_id, entry in batch.items()
+                       for movie_id, rating in entry.ratings.items()]
+
+            started = time.perf_counter()
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.storage.write_batch, cleared, ratings)
+            except Exception as e:
+                print(f"Ошибка записи оценок ({events} событий), повтор при следующей записи: {e}")
+                self._failed_flushes += 1
+                self._requeue(batch, events)
+                return False
+            finally:
+                self._inflight = {}
+            self._latencies.append(time.perf_counter() - started)
+            self._flushes += 1
+            self._events_flushed += events
+            return True
+
+    def _requeue(self, batch: Dict[int, _PendingUser], events: int) -> None:
+        """
+        Возврат незаписанных изменений в очередь перед более новыми.
+        """
+        for user_id, older in batch.items():
+            newer = self._pending.get(user_id)
+            if newer is not None and not newer.cleared:
+                older.ratings.update(newer.ratings)
+            if newer is None or not newer.cleared:
+                self._pending[user_id] = older
+        self._added(events)
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        Метрики отложенной записи.
+
+        :return: Словарь: глубина очереди, число записей и событий, задержка записи в мс (p50, p95, max)
+        """
+        latencies = np.array(self._latencies) * 1e3 if self._latencies else np.zeros(1)
+        return {
+            "queue_depth": self._depth,
+            "max_queue_depth": self._max_depth,
+            "flushes": self._flushes,
+            "failed_flushes": self._failed_flushes,
+            "events_flushed": self._events_flushed,
+            "flush_ms_p50": float(np.percentile(latencies, 50)),
+            "flush_ms_p95": float(np.percentile(latencies, 95)),
+            "flush_ms_max": float(latencies.max())
+        }